@@ -0,0 +1,409 @@
+# %%
+"""
+Benchmark del reporte con datos sintéticos.
+
+Genera exportaciones falsas con el mismo formato que espera report.py (existencias por
+sucursal, movimientos con la hoja "Detalle de movimientos", ventas por ticket y piezas
+consumidas), ejecuta cada etapa del reporte por separado y registra su tiempo,
+rendimiento (filas por segundo) y memoria máxima. Los resultados se agregan a un archivo
+JSON Lines para comparar ejecuciones.
+
+Uso:
+    python benchmark.py --sucursales 11 --skus 5000 --filas-ventas 20000
+    python benchmark.py --comparar
+"""
+import os
+import sys
+import io
+import time
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import report
+import consolidacion
+
+# Las primeras sucursales conservan los nombres reales porque el reporte concentrado los espera
+ALMACENES = [
+    "Central Cell 20 de noviembre",
+    "Central Cell Almacén general",
+    "Central Cell Abastos",
+    "Central Cell Fortín",
+    "Central Cell Labotienda",
+    "Central Cell Nuño del Mercado",
+    "Central Cell Plaza Bella",
+    "Central Cell Plaza Bonn",
+    "Central Cell Reforma",
+    "Central Cell Revistería",
+    "Central Cell Violetas",
+]
+
+MARCAS = ["Samsung", "Apple", "Motorola", "Xiaomi", "Huawei", "Oppo", "Genérico", None]
+TIPOS_PRODUCTO = ["Accesorio", "Equipo", "Refacción", "Servicio"]
+
+ARCHIVO_RESULTADOS = "benchmark_resultados.jsonl"
+
+
+def nombres_almacenes(sucursales):
+    """
+    Devuelve los nombres de almacén para el número de sucursales indicado.
+
+    :param sucursales: Número de sucursales.
+    :return: Lista de nombres de almacén.
+    """
+    nombres = ALMACENES[:sucursales]
+    nombres += [f"Central Cell Sucursal {numero}" for numero in range(len(nombres) + 1, sucursales + 1)]
+    return nombres
+
+
+def generar_datos_sinteticos(directorio, sucursales=11, skus=5000, filas_ventas=20000, filas_movimientos=5000, filas_piezas=2000, semilla=0):
+    """
+    Genera exportaciones sintéticas con el formato de columnas que espera el reporte.
+
+    :param directorio: Carpeta donde se escribirán los archivos.
+    :param sucursales: Número de sucursales; se genera un archivo de existencias por sucursal.
+    :param skus: Número de productos del catálogo.
+    :param filas_ventas: Filas de ventas por ticket por sucursal.
+    :param filas_movimientos: Filas de movimientos de compra por sucursal.
+    :param filas_piezas: Filas de piezas consumidas en total.
+    :param semilla: Semilla del generador aleatorio.
+    :return: Diccionario {familia: número de filas generadas}.
+    """
+    rng = np.random.default_rng(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    almacenes = nombres_almacenes(sucursales)
+
+    # Catálogo de productos; las claves llegan con mayúsculas y minúsculas mezcladas
+    claves = np.array([f"CC-{numero:06d}-{rng.choice(['a', 'B', 'c'])}" for numero in range(skus)], dtype=object)
+    marcas = rng.choice(np.array(MARCAS, dtype=object), skus)
+    modelos = np.array([f"Modelo {numero % 97}" for numero in range(skus)], dtype=object)
+    nombres = np.array([f"Producto {numero}" for numero in range(skus)], dtype=object)
+    tipos = rng.choice(np.array(TIPOS_PRODUCTO, dtype=object), skus)
+    precios = rng.integers(50, 20000, skus).astype(float)
+
+    filas = {"Existencias": 0, "Compras": 0, "Ventas": 0, "PiezasConsumidas": 0}
+
+    for numero, almacen in enumerate(almacenes):
+        # Existencias: cada sucursal tiene una parte del catálogo
+        productos = rng.choice(skus, size=max(1, int(skus * 0.6)), replace=False)
+        claves_sucursal = claves[productos].copy()
+        minusculas = rng.random(len(productos)) < 0.3
+        claves_sucursal[minusculas] = [clave.lower() for clave in claves_sucursal[minusculas]]
+        pd.DataFrame({
+            "Clave": productos,
+            "Almacen": almacen,
+            "ProdConcat": claves_sucursal,
+            "Existencia": rng.integers(0, 15, len(productos)),
+            "Nombre": nombres[productos],
+            "TipoProducto": tipos[productos],
+            "Marca": marcas[productos],
+            "Modelo": modelos[productos],
+            "Publico General": precios[productos],
+            "Costo Promedio": (precios[productos] * 0.6).round(2),
+            "Unidad": "PZA",
+        }).to_excel(os.path.join(directorio, f"Existencia {almacen}.xlsx"), index=False)
+        filas["Existencias"] += len(productos)
+
+        # Movimientos de compra, con una hoja de resumen antes del detalle
+        productos = rng.integers(0, skus, filas_movimientos)
+        fechas = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, filas_movimientos), unit="h")
+        with pd.ExcelWriter(os.path.join(directorio, f"Excel_Movimientos {almacen}.xlsx")) as writer:
+            pd.DataFrame({"Almacen": [almacen], "Movimientos": [filas_movimientos]}).to_excel(writer, sheet_name="Resumen", index=False)
+            pd.DataFrame({
+                "Folio": np.arange(filas_movimientos),
+                "Tipo Movimiento": "Entrada por compra",
+                "Almacen": almacen,
+                "Fecha": fechas,
+                "Producto": claves[productos],
+                "Costo": (precios[productos] * rng.uniform(0.4, 0.8, filas_movimientos)).round(2),
+                "Cantidad": rng.integers(1, 50, filas_movimientos),
+            }).to_excel(writer, sheet_name="Detalle de movimientos", index=False)
+        filas["Compras"] += filas_movimientos
+
+        # Ventas por ticket
+        productos = rng.integers(0, skus, filas_ventas)
+        cantidades = rng.integers(1, 4, filas_ventas).astype(float)
+        cantidades[rng.random(filas_ventas) < 0.01] = np.nan
+        pd.DataFrame({
+            "Ticket": np.arange(filas_ventas),
+            "Fecha": pd.Timestamp("2024-12-01") + pd.to_timedelta(rng.integers(0, 30 * 24, filas_ventas), unit="h"),
+            "Almacen": almacen,
+            "ProdConcat": claves[productos],
+            "Cantidad": cantidades,
+            "Precio": precios[productos],
+            "Importe": precios[productos] * np.nan_to_num(cantidades),
+            "Vendedor": rng.choice(["Ana", "Luis", "Karla", "Jorge"], filas_ventas),
+        }).to_excel(os.path.join(directorio, f"Analisis de Ventas por Tickets {almacen}.xlsx"), index=False)
+        filas["Ventas"] += filas_ventas
+
+    # Piezas consumidas en reparaciones de todas las sucursales
+    productos = rng.integers(0, skus, filas_piezas)
+    pd.DataFrame({
+        "Orden": np.arange(filas_piezas),
+        "Almacén Salida Reparación": rng.choice(np.array(almacenes, dtype=object), filas_piezas),
+        "Producto": [clave.lower() for clave in claves[productos]],
+        "Cantidad": rng.integers(1, 3, filas_piezas),
+        "Nombre": nombres[productos],
+    }).to_excel(os.path.join(directorio, "Excel_Reparaciones_Refacciones_Consumidas.xlsx"), index=False)
+    filas["PiezasConsumidas"] += filas_piezas
+
+    return filas
+
+
+def medir_etapa(resultados, nombre, funcion, *args, filas=None, memoria=True, **kwargs):
+    """
+    Ejecuta una etapa y registra su tiempo, rendimiento y memoria máxima.
+
+    :param resultados: Lista donde se agrega la medición de la etapa.
+    :param nombre: Nombre de la etapa.
+    :param funcion: Función a ejecutar.
+    :param filas: Filas de la etapa, para calcular el rendimiento, o función que las calcula a partir del
+        resultado (cuando solo se conocen después de ejecutarla, como en la lectura de los archivos).
+    :param memoria: Si es True, se mide la memoria máxima con tracemalloc (agrega sobrecosto al tiempo).
+    :return: Resultado de la función, o None si falló.
+    """
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    error = None
+    resultado = None
+    try:
+        # Los mensajes del reporte no forman parte de la medición
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado = funcion(*args, **kwargs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    segundos = time.perf_counter() - inicio
+    memoria_maxima = None
+    if memoria:
+        memoria_maxima = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if callable(filas):
+        filas = filas(resultado) if error is None else None
+
+    medicion = {
+        "etapa": nombre,
+        "segundos": round(segundos, 4),
+        "filas": filas,
+        "filas_por_segundo": round(filas / segundos, 1) if filas and segundos > 0 else None,
+        "memoria_maxima_mb": round(memoria_maxima / 1024 ** 2, 2) if memoria_maxima is not None else None,
+    }
+    if error:
+        medicion["error"] = error
+    resultados.append(medicion)
+
+    estado = f"ERROR {error}" if error else f"{medicion['filas_por_segundo'] or '-'} filas/s"
+    memoria_texto = f"{medicion['memoria_maxima_mb']} MB" if memoria_maxima is not None else "-"
+    print(f"  {nombre:<45} {segundos:>9.3f} s  {memoria_texto:>10}  {estado}")
+    return resultado
+
+
+def ejecutar_benchmark(directorio_datos, formato=consolidacion.FORMATO_SALIDA, procesos=consolidacion.PROCESOS_LECTURA, memoria=True):
+    """
+    Ejecuta cada etapa del reporte sobre un directorio de exportaciones.
+
+    La caché de lecturas y el historial de compras se desactivan para medir siempre el
+    costo completo de cada etapa. La memoria de la fusión solo incluye el proceso principal.
+
+    :param directorio_datos: Carpeta con las exportaciones de origen.
+    :param formato: Formato de salida de los reportes.
+    :param procesos: Número de procesos de lectura.
+    :param memoria: Si es True, se mide la memoria máxima de cada etapa.
+    :return: Lista de mediciones por etapa.
+    """
+    def archivos(cadena):
+        return [os.path.join(directorio_datos, archivo) for archivo in report.listar_archivos_excel_por_cadena(directorio_datos, cadena)]
+
+    mediciones = []
+    # Los reportes se escriben en una carpeta temporal aparte de los datos de origen
+    directorio_anterior = os.getcwd()
+    directorio_salida = tempfile.mkdtemp(prefix="benchmark_salida_")
+    try:
+        familias = {
+            "Existencias": (archivos("Existencia"), None, report.columnasExistencias),
+            "Compras": (archivos("Excel_Movimientos"), "Detalle de movimientos", report.columnasCompras),
+            "Ventas": (archivos("Analisis de Ventas por Tickets"), None, report.columnasVentas),
+            "PiezasConsumidas": (archivos("Excel_Reparaciones_Refacciones_Consumidas"), None, report.columnasPiezasConsumidas),
+        }
+        def filas_leidas(leidos):
+            return sum(len(df) for df in leidos.values() if df is not None)
+
+        leidos = medir_etapa(mediciones, "fusion", consolidacion.fusionar_familias_excel, familias, procesos=procesos, directorio_cache=None, filas=filas_leidas, memoria=memoria)
+        if leidos is None or any(df is None for df in leidos.values()):
+            print("No se pudieron leer las exportaciones sintéticas.")
+            return mediciones
+
+        dfExistencias, dfCompras = leidos["Existencias"], leidos["Compras"]
+        dfVentas, dfPiezasConsumidas = leidos["Ventas"], leidos["PiezasConsumidas"]
+        filas_totales = filas_leidas(leidos)
+
+        def cargar():
+            consolidacion.codificar_claves_compartidas(
+                [dfExistencias, dfVentas, dfPiezasConsumidas, dfCompras],
+                ["ProdConcat", "ProdConcat", "Producto", "Producto"],
+                mayusculas=True
+            )
+            consolidacion.codificar_claves_compartidas(
+                [dfExistencias, dfVentas, dfPiezasConsumidas],
+                ["Almacen", "Almacen", "Almacén Salida Reparación"]
+            )
+            consolidacion.reemplazar_ceros_con_nan(dfExistencias, ["Existencia"])
+            dfPiezasConsumidas.rename(columns={"Almacén Salida Reparación": "Almacen", "Producto": "ProdConcat"}, inplace=True)
+            return consolidacion.actualizar_ultimas_compras(None, dfCompras)
+
+        dfUltimasCompras = medir_etapa(mediciones, "carga", cargar, filas=filas_totales, memoria=memoria)
+
+        dfExistenciasFinal = medir_etapa(mediciones, "crearDataframeExistenciaFinal", consolidacion.crearDataframeExistenciaFinal, dfExistencias, filas=len(dfExistencias), memoria=memoria)
+        dfConcentrado = medir_etapa(mediciones, "creaReporteExistenciaConcentrada", consolidacion.creaReporteExistenciaConcentrada, dfExistenciasFinal, filas=len(dfExistenciasFinal), memoria=memoria)
+        dfExistenciasComprasFinal = medir_etapa(mediciones, "creaDataFrameExistenciasComprasFinal", consolidacion.creaDataFrameExistenciasComprasFinal, dfExistenciasFinal, dfUltimasCompras, filas=len(dfExistenciasFinal) + len(dfUltimasCompras), memoria=memoria)
+        dfVentasFinal = medir_etapa(mediciones, "creaDataFrameVentasFinal", consolidacion.creaDataFrameVentasFinal, dfVentas, dfPiezasConsumidas, filas=len(dfVentas) + len(dfPiezasConsumidas), memoria=memoria)
+        dfResultado = medir_etapa(mediciones, "creaReporteExistenciasComprasVentasCC", consolidacion.creaReporteExistenciasComprasVentasCC, dfExistenciasComprasFinal, dfVentasFinal, filas=len(dfExistenciasComprasFinal), memoria=memoria)
+        dfResultado = medir_etapa(mediciones, "creaReporteVelocidadInventario", consolidacion.creaReporteVelocidadInventario, dfResultado, ruta=os.path.join(directorio_salida, "velocidad.parquet"), filas=len(dfResultado), memoria=memoria)
+
+        reportes = {
+            "BI-CONCENTRADO-EXISTENCIAS-BY-MODELO-MARCA": dfConcentrado,
+            "BI-EXISTENCIA-CC": dfExistenciasComprasFinal,
+            "BI-VENTAS-CC": dfVentasFinal,
+            "BI-EXISTENCIAS-COMPRAS-VENTAS-CC": dfResultado,
+        }
+        os.chdir(directorio_salida)
+        for nombre, df in reportes.items():
+            if df is not None:
+                medir_etapa(mediciones, f"escritura {nombre}", consolidacion.generar_archivo_by_df, df, nombre, formato, filas=len(df), memoria=memoria)
+    finally:
+        os.chdir(directorio_anterior)
+        shutil.rmtree(directorio_salida, ignore_errors=True)
+
+    return mediciones
+
+
+def version_codigo():
+    """
+    Devuelve el commit actual del repositorio, si está disponible.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def guardar_resultados(resultado, archivo=ARCHIVO_RESULTADOS):
+    """
+    Agrega el resultado de una ejecución al archivo de resultados.
+
+    :param resultado: Diccionario con los parámetros y mediciones de la ejecución.
+    :param archivo: Archivo JSON Lines de resultados.
+    """
+    with open(archivo, "a", encoding="utf-8") as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+    print(f"Resultados guardados en {archivo}")
+
+
+def comparar_resultados(archivo=ARCHIVO_RESULTADOS):
+    """
+    Compara la última ejecución con la anterior que usó los mismos parámetros.
+
+    :param archivo: Archivo JSON Lines de resultados.
+    """
+    if not os.path.isfile(archivo):
+        print(f"No existe el archivo de resultados {archivo}.")
+        return
+
+    with open(archivo, encoding="utf-8") as f:
+        ejecuciones = [json.loads(linea) for linea in f if linea.strip()]
+    if not ejecuciones:
+        print("No hay ejecuciones registradas.")
+        return
+
+    actual = ejecuciones[-1]
+    anteriores = [e for e in ejecuciones[:-1] if e["parametros"] == actual["parametros"]]
+    if not anteriores:
+        print("No hay una ejecución anterior con los mismos parámetros.")
+        return
+    anterior = anteriores[-1]
+
+    print(f"Comparando {anterior['fecha']} ({anterior.get('version')}) -> {actual['fecha']} ({actual.get('version')})")
+    tiempos_anteriores = {m["etapa"]: m for m in anterior["etapas"]}
+    for medicion in actual["etapas"]:
+        previa = tiempos_anteriores.get(medicion["etapa"])
+        if previa is None:
+            print(f"  {medicion['etapa']:<45} {medicion['segundos']:>9.3f} s  (nueva)")
+            continue
+        cambio = (medicion["segundos"] - previa["segundos"]) / previa["segundos"] * 100 if previa["segundos"] else 0
+        print(f"  {medicion['etapa']:<45} {previa['segundos']:>9.3f} s -> {medicion['segundos']:>9.3f} s  ({cambio:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del reporte con datos sintéticos.")
+    parser.add_argument("--sucursales", type=int, default=11, help="Número de sucursales (archivos por familia).")
+    parser.add_argument("--skus", type=int, default=5000, help="Número de productos del catálogo.")
+    parser.add_argument("--filas-ventas", type=int, default=20000, help="Filas de ventas por ticket por sucursal.")
+    parser.add_argument("--filas-movimientos", type=int, default=5000, help="Filas de movimientos de compra por sucursal.")
+    parser.add_argument("--filas-piezas", type=int, default=2000, help="Filas de piezas consumidas en total.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla del generador de datos.")
+    parser.add_argument("--formato", default=consolidacion.FORMATO_SALIDA, choices=sorted(consolidacion.EXTENSIONES_SALIDA), help="Formato de salida de los reportes.")
+    parser.add_argument("--procesos", type=int, default=consolidacion.PROCESOS_LECTURA, help="Procesos de lectura (por defecto todos los núcleos).")
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir la memoria (evita el sobrecosto de tracemalloc).")
+    parser.add_argument("--datos", help="Carpeta de datos sintéticos a reutilizar o conservar.")
+    parser.add_argument("--resultados", default=ARCHIVO_RESULTADOS, help="Archivo JSON Lines de resultados.")
+    parser.add_argument("--comparar", action="store_true", help="Solo comparar las dos últimas ejecuciones equivalentes.")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar_resultados(args.resultados)
+        return
+
+    parametros = {
+        "sucursales": args.sucursales,
+        "skus": args.skus,
+        "filas_ventas": args.filas_ventas,
+        "filas_movimientos": args.filas_movimientos,
+        "filas_piezas": args.filas_piezas,
+        "semilla": args.semilla,
+        "formato": args.formato,
+        "procesos": args.procesos,
+        "memoria": not args.sin_memoria,
+    }
+
+    directorio = args.datos or tempfile.mkdtemp(prefix="benchmark_reporte_")
+    try:
+        datos_existentes = os.path.isdir(directorio) and report.listar_archivos_excel_por_cadena(directorio, "Existencia")
+        if not datos_existentes:
+            print(f"Generando datos sintéticos en {directorio}...")
+            inicio = time.perf_counter()
+            filas = generar_datos_sinteticos(
+                directorio, args.sucursales, args.skus, args.filas_ventas,
+                args.filas_movimientos, args.filas_piezas, args.semilla
+            )
+            print(f"Datos generados en {time.perf_counter() - inicio:.1f} s: {filas}")
+
+        print("Etapa                                          Tiempo      Memoria  Rendimiento")
+        mediciones = ejecutar_benchmark(directorio, args.formato, args.procesos, memoria=not args.sin_memoria)
+    finally:
+        if args.datos is None:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    guardar_resultados({
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "version": version_codigo(),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "parametros": parametros,
+        "etapas": mediciones,
+    }, args.resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2183 @@
+# %%
+import os
+import pandas as pd
+import numpy as np
+import openpyxl
+from operator import itemgetter
+from datetime import datetime
+import shutil
+import sys
+import io
+import contextlib
+import contextvars
+import hashlib
+import glob
+import codecs
+import json
+import time
+import platform
+import fnmatch
+import functools
+import cProfile
+import pstats
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from especificaciones import ESPECIFICACIONES, IVA
+from encabezados import SEPARADORES_TEXTO, CODIFICACIONES_TEXTO
+
+# Formato de la copia de archivo de los consolidados (ExistenciasCC, ComprasCC, ...).
+# 'parquet' genera una instantánea columnar, 'xlsx' el libro de Excel y None ninguna.
+FORMATO_CONSOLIDADO = "parquet"
+
+# Número de procesos para leer los archivos de origen. None usa todos los núcleos
+# disponibles y 1 lee los archivos uno tras otro en el proceso principal.
+PROCESOS_LECTURA = None
+
+# Caché de lecturas: cada archivo de origen leído se guarda en Parquet, identificado por
+# el contenido del archivo, la hoja y las columnas leídas. None desactiva la caché.
+DIRECTORIO_CACHE = ".cache_lecturas"
+# Tamaño máximo de la caché en bytes; al excederse se eliminan las lecturas usadas hace más tiempo.
+TAMANO_MAXIMO_CACHE = 2 * 1024 ** 3
+# Se incrementa cuando cambia la forma de leer los archivos, para no reutilizar lecturas anteriores.
+VERSION_CACHE = 1
+
+# Carpeta con el estado que se conserva entre ejecuciones del reporte.
+DIRECTORIO_HISTORIAL = ".historial"
+# Historial con la última compra de cada producto; los movimientos nuevos se integran
+# a él en cada ejecución. None lo desactiva y se usan solo los movimientos presentes.
+ARCHIVO_ULTIMAS_COMPRAS = os.path.join(DIRECTORIO_HISTORIAL, "ultimas_compras.parquet")
+
+# Métricas de velocidad del inventario: ventas y existencias por producto y almacén de las
+# últimas VENTANA_VELOCIDAD ejecuciones, que se actualizan en cada ejecución. None las desactiva.
+ARCHIVO_VELOCIDAD = os.path.join(DIRECTORIO_HISTORIAL, "velocidad.parquet")
+VENTANA_VELOCIDAD = 4
+# Días de ventas que cubre una ejecución (el periodo del análisis de ventas por tickets) cuando la ventana
+# solo tiene una; con más ejecuciones, los días de la ventana se calculan a partir de sus fechas
+DIAS_PERIODO_VENTAS = 30
+# Se marca para reorden un producto cuya existencia cubre menos de estos días de venta
+DIAS_REORDEN = 15
+
+# Lectura por bloques de las familias que solo se suman (ventas y piezas consumidas): número de
+# filas por bloque. De cada bloque se conservan solo las sumas por almacén y producto, por lo que
+# la memoria depende del número de claves distintas y no del número de filas. None lee cada archivo completo.
+FILAS_POR_BLOQUE_VENTAS = None
+
+# Archivos de origen en texto (CSV/TSV) y Parquet, además de Excel; el separador de cada extensión de texto
+# y las codificaciones que se prueban (SEPARADORES_TEXTO y CODIFICACIONES_TEXTO) se definen en `encabezados`.
+# Formato de las fechas en los archivos de texto (p. ej. '%d/%m/%Y %H:%M'). None lo detecta automáticamente.
+FORMATO_FECHA_TEXTO = None
+# Tipos explícitos de las columnas numéricas y de fecha en los archivos de texto y Parquet; el resto se lee como texto.
+# Como en las lecturas de Excel, las columnas numéricas con solo enteros y sin vacíos quedan como int64.
+TIPOS_COLUMNAS = {"Existencia": "float64", "Cantidad": "float64", "Costo": "float64", "Publico General": "float64", "Fecha": "datetime64[ns]"}
+
+# Columna que agregan las lecturas con el nombre del archivo del que proviene cada fila
+# cuando se incluye en la lista de columnas solicitadas.
+COLUMNA_ARCHIVO_ORIGEN = "Archivo Origen"
+
+# Deduplicación de filas entre exportaciones que se traslapan (p. ej. análisis de ventas con rangos de fechas
+# que se enciman): familia -> columnas clave que identifican una fila. Cada fila se identifica por una huella
+# de 64 bits de sus columnas clave y se descarta, antes de agregar, si la huella ya pertenece a otro archivo
+# de esta ejecución o de una anterior. Un archivo se identifica por su contenido, no por su nombre: las
+# exportaciones del ERP repiten el nombre por sucursal y por periodo, y la misma exportación procesada de nuevo
+# (otro día, en una reconstrucción) conserva sus filas. Las columnas clave deben distinguir las filas que sí se repiten
+# (p. ej. incluir el folio del ticket); las que no se leen para el reporte se leen solo para la huella.
+# Vacío desactiva la deduplicación.
+DEDUPLICAR_FAMILIAS = {}
+# Huellas de las filas ya contadas con el archivo (por su contenido) al que pertenecen. None las conserva solo durante la ejecución.
+ARCHIVO_HUELLAS_FILAS = os.path.join(DIRECTORIO_HISTORIAL, "huellas_filas.parquet")
+# Días que se conserva una huella desde la ejecución en que apareció por primera vez
+DIAS_HUELLAS_FILAS = 365
+
+# Formato de los reportes BI: 'xlsx' (openpyxl), 'xlsx-streaming' (xlsxwriter en memoria
+# constante), 'parquet' o 'csv' para herramientas de BI.
+FORMATO_SALIDA = "xlsx"
+# Nombre base de un libro único con todos los reportes como hojas. None genera un archivo por reporte.
+LIBRO_UNICO = None
+# Número de procesos para escribir los reportes. None usa todos los núcleos disponibles
+# y 1 escribe los reportes uno tras otro en el proceso principal.
+PROCESOS_ESCRITURA = None
+
+# Extensión de archivo de cada formato de salida
+EXTENSIONES_SALIDA = {"xlsx": ".xlsx", "xlsx-streaming": ".xlsx", "parquet": ".parquet", "csv": ".csv"}
+
+# Perfilado de las etapas del reporte: None solo mide tiempos y memoria, 'cprofile' agrega
+# al manifiesto las funciones más costosas de cada etapa y 'tracemalloc' las líneas que más memoria reservan.
+MODO_PERFILADO = None
+# Número de funciones o líneas que se guardan por etapa al perfilar.
+LIMITE_PERFILADO = 15
+
+# Modo de memoria acotada: memoria residente máxima (en MB) que puede alcanzar cada proceso del reporte.
+# Activa la copia en escritura de pandas, con la que las etapas comparten las columnas que no modifican
+# en lugar de copiarlas, y detiene la ejecución con ErrorLimiteMemoria antes de una etapa que no cabría
+# en el límite o al terminar la que lo superó. None no impone límite. Cada ejecución del pipeline
+# puede indicar su propio límite con `limite_memoria`, sin cambiar este valor.
+LIMITE_MEMORIA_MB = None
+# Memoria adicional que se estima para una etapa, como proporción del tamaño de sus DataFrames de entrada.
+# 0 solo revisa la memoria alcanzada al terminar cada etapa.
+FACTOR_MEMORIA_ETAPA = 1.0
+
+# Mediciones de las etapas instrumentadas durante la ejecución actual
+REGISTRO_ETAPAS = []
+
+# Límite de memoria de la ejecución en curso (ver `limite_memoria`); sin valor se usa LIMITE_MEMORIA_MB
+_LIMITE_MEMORIA_EJECUCION = contextvars.ContextVar("limite_memoria_mb")
+
+class ErrorLimiteMemoria(MemoryError):
+    """
+    Una etapa alcanzó, o se estima que alcanzaría, más memoria que el límite de la ejecución.
+
+    :param etapa: Nombre de la etapa.
+    :param memoria_mb: Memoria alcanzada o estimada, en MB.
+    :param limite_mb: Límite de memoria, en MB.
+    :param estimada: Si es True, la etapa no se ejecutó porque la memoria estimada superaba el límite.
+    """
+
+    def __init__(self, etapa, memoria_mb, limite_mb, estimada=False):
+        if estimada:
+            mensaje = f"la etapa {etapa} requeriría unos {memoria_mb:.0f} MB de memoria y el límite es de {limite_mb:.0f} MB; no se ejecutó"
+        else:
+            mensaje = f"la etapa {etapa} alcanzó {memoria_mb:.0f} MB de memoria y el límite es de {limite_mb:.0f} MB"
+        super().__init__(mensaje)
+        self.etapa = etapa
+        self.memoria_mb = memoria_mb
+        self.limite_mb = limite_mb
+        self.estimada = estimada
+
+def activar_copia_en_escritura():
+    """
+    Activa la copia en escritura de pandas: seleccionar, renombrar o quitar columnas devuelve
+    DataFrames que comparten los datos hasta que alguno se modifica. Desde pandas 3 siempre está activa.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+@contextlib.contextmanager
+def limite_memoria(limite_mb):
+    """
+    Aplica un límite de memoria solo mientras dura el bloque, sin cambiar LIMITE_MEMORIA_MB:
+    una ejecución no hereda el límite de la anterior (p. ej. en el modo de vigilancia o en un lote).
+
+    :param limite_mb: Memoria máxima en MB, o None para no imponer límite.
+    """
+    token = _LIMITE_MEMORIA_EJECUCION.set(limite_mb)
+    try:
+        yield
+    finally:
+        _LIMITE_MEMORIA_EJECUCION.reset(token)
+
+def limite_memoria_actual():
+    """
+    Devuelve el límite de memoria (en MB) de la ejecución en curso, o None si no hay límite.
+    """
+    return _LIMITE_MEMORIA_EJECUCION.get(LIMITE_MEMORIA_MB)
+
+def _memoria_maxima_proceso():
+    """
+    Devuelve la memoria residente máxima (en MB) que ha alcanzado el proceso, o None si no se puede medir.
+    """
+    try:
+        import resource
+        maxima = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta KB y macOS bytes
+        return maxima / 1024 ** 2 if sys.platform == "darwin" else maxima / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memoria = psutil.Process().memory_info()
+        return getattr(memoria, "peak_wset", memoria.rss) / 1024 ** 2
+    except ImportError:
+        return None
+
+def _memoria_maxima_procesos_hijos():
+    """
+    Devuelve la memoria residente máxima (en MB) que alcanzó el mayor de los procesos de trabajo
+    ya terminados (p. ej. los de lectura), o None si no se puede medir.
+    """
+    try:
+        import resource
+        maxima = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return maxima / 1024 ** 2 if sys.platform == "darwin" else maxima / 1024
+    except ImportError:
+        return None
+
+def _memoria_actual_proceso():
+    """
+    Devuelve la memoria residente actual (en MB) del proceso, o None si no se puede medir.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        return None
+
+def _tamano_mb(objeto):
+    """
+    Devuelve el tamaño en memoria (en MB) de un DataFrame, o de los DataFrames de una lista o diccionario.
+    Es una estimación sin recorrer los valores de texto, para no leer cada columna antes de cada etapa.
+    """
+    if isinstance(objeto, pd.DataFrame):
+        return objeto.memory_usage(index=True, deep=False).sum() / 1024 ** 2
+    if isinstance(objeto, (list, tuple)):
+        return sum(_tamano_mb(elemento) for elemento in objeto)
+    if isinstance(objeto, dict):
+        return sum(_tamano_mb(elemento) for elemento in objeto.values())
+    return 0
+
+def _memorias_maximas():
+    # Memoria máxima de este proceso y de los procesos de trabajo terminados
+    return _memoria_maxima_proceso(), _memoria_maxima_procesos_hijos()
+
+def revisar_limite_memoria(etapa, entradas=(), maximas_iniciales=None):
+    """
+    Revisa la memoria contra el límite de la ejecución (`limite_memoria_actual`). Con entradas, antes de
+    una etapa: estima la memoria actual más FACTOR_MEMORIA_ETAPA veces el tamaño de sus DataFrames de
+    entrada. Sin entradas, después de una etapa: la memoria actual del proceso y la máxima alcanzada por
+    este proceso o por los procesos de trabajo, esta última solo si aumentó durante la etapa; la máxima
+    nunca baja, por lo que de otro modo se culparía a todas las etapas siguientes.
+
+    :param etapa: Nombre de la etapa, para el mensaje de error.
+    :param entradas: Argumentos de la etapa que está por ejecutarse.
+    :param maximas_iniciales: Memorias máximas (`_memorias_maximas`) al empezar la etapa. Si es None,
+        se revisan las máximas sin importar cuándo se alcanzaron.
+    :raises ErrorLimiteMemoria: Si la memoria estimada o alcanzada supera el límite.
+    """
+    limite = limite_memoria_actual()
+    if limite is None:
+        return
+    if entradas:
+        actual = _memoria_actual_proceso()
+        if actual is None or not FACTOR_MEMORIA_ETAPA:
+            return
+        estimada = actual + FACTOR_MEMORIA_ETAPA * _tamano_mb(list(entradas))
+        if estimada > limite:
+            raise ErrorLimiteMemoria(etapa, estimada, limite, estimada=True)
+        return
+
+    memorias = [_memoria_actual_proceso()]
+    for inicial, final in zip(maximas_iniciales or (None, None), _memorias_maximas()):
+        if final is not None and (inicial is None or final > inicial):
+            memorias.append(final)
+    memoria = max((memoria for memoria in memorias if memoria is not None), default=None)
+    if memoria is not None and memoria > limite:
+        raise ErrorLimiteMemoria(etapa, memoria, limite)
+
+def etapas_en_secuencia():
+    """
+    Indica si las etapas deben ejecutarse una tras otra: el perfilado (cProfile, tracemalloc), el tiempo
+    de CPU, la memoria máxima y el límite de memoria se miden para todo el proceso, por lo que con etapas
+    en paralelo cada una contaría el trabajo de las demás.
+    """
+    return MODO_PERFILADO is not None or limite_memoria_actual() is not None
+
+def _tiempo_cpu():
+    # Incluye el tiempo de los procesos de trabajo que ya terminaron
+    tiempos = os.times()
+    return tiempos.user + tiempos.system + tiempos.children_user + tiempos.children_system
+
+def _dimensiones(objeto):
+    """
+    Devuelve [filas, columnas] de un DataFrame, o las dimensiones de cada DataFrame de una lista o diccionario.
+    """
+    if isinstance(objeto, pd.DataFrame):
+        return list(objeto.shape)
+    if isinstance(objeto, (list, tuple)):
+        return [d for d in map(_dimensiones, objeto) if d is not None] or None
+    if isinstance(objeto, dict):
+        dimensiones = {str(clave): _dimensiones(valor) for clave, valor in objeto.items()}
+        return {clave: valor for clave, valor in dimensiones.items() if valor is not None} or None
+    return None
+
+def instrumentar(funcion):
+    """
+    Registra en REGISTRO_ETAPAS el tiempo, el tiempo de CPU, el aumento de la memoria máxima
+    y las dimensiones de entrada y salida de una etapa del reporte. Con límite de memoria
+    (`limite_memoria_actual`), lo revisa antes y después de la etapa.
+    """
+    @functools.wraps(funcion)
+    def etapa(*args, **kwargs):
+        medicion = {
+            "etapa": funcion.__name__,
+            "entrada": [d for d in (_dimensiones(arg) for arg in list(args) + list(kwargs.values())) if d is not None],
+        }
+        maximas_iniciales = _memorias_maximas()
+        memoria_inicial = maximas_iniciales[0]
+        perfil = cProfile.Profile() if MODO_PERFILADO == "cprofile" else None
+        trazar_memoria = MODO_PERFILADO == "tracemalloc" and not tracemalloc.is_tracing()
+        if trazar_memoria:
+            tracemalloc.start()
+        inicio, cpu_inicial = time.perf_counter(), _tiempo_cpu()
+
+        try:
+            revisar_limite_memoria(funcion.__name__, list(args) + list(kwargs.values()))
+            if perfil is not None:
+                resultado = perfil.runcall(funcion, *args, **kwargs)
+            else:
+                resultado = funcion(*args, **kwargs)
+            medicion["salida"] = _dimensiones(resultado)
+            revisar_limite_memoria(funcion.__name__, maximas_iniciales=maximas_iniciales)
+            return resultado
+        except BaseException as e:
+            medicion["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            medicion["segundos"] = round(time.perf_counter() - inicio, 4)
+            medicion["cpu_segundos"] = round(_tiempo_cpu() - cpu_inicial, 4)
+            memoria_final = _memoria_maxima_proceso()
+            if memoria_inicial is not None and memoria_final is not None:
+                medicion["memoria_maxima_mb"] = round(memoria_final, 1)
+                medicion["aumento_memoria_maxima_mb"] = round(memoria_final - memoria_inicial, 1)
+            if perfil is not None:
+                salida = io.StringIO()
+                pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(LIMITE_PERFILADO)
+                medicion["perfil"] = [linea for linea in salida.getvalue().splitlines() if linea.strip()]
+            if trazar_memoria:
+                medicion["memoria_trazada_maxima_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+                estadisticas = tracemalloc.take_snapshot().statistics("lineno")[:LIMITE_PERFILADO]
+                medicion["memoria_por_linea"] = [str(estadistica) for estadistica in estadisticas]
+                tracemalloc.stop()
+            REGISTRO_ETAPAS.append(medicion)
+
+    return etapa
+
+def escribir_manifiesto(ruta, inicio, archivos_entrada=None, etapas=None, configuracion=None, deduplicacion=None):
+    """
+    Escribe un manifiesto JSON con la configuración y las mediciones de cada etapa de la ejecución.
+
+    :param ruta: Ruta del manifiesto.
+    :param inicio: Fecha y hora (datetime) de inicio de la ejecución.
+    :param archivos_entrada: Lista de archivos de origen procesados.
+    :param etapas: Mediciones de las etapas. Si es None, se usa REGISTRO_ETAPAS.
+    :param configuracion: Configuración de la ejecución. Si es None, se usan las constantes del módulo.
+    :param deduplicacion: Diccionario {familia: DataFrame de conteo por archivo} de `deduplicar_familias`.
+    :return: Ruta del manifiesto, o None si no se pudo escribir.
+    """
+    etapas = REGISTRO_ETAPAS if etapas is None else etapas
+    fin = datetime.now()
+    manifiesto = {
+        "inicio": inicio.isoformat(timespec="seconds"),
+        "fin": fin.isoformat(timespec="seconds"),
+        "segundos": round((fin - inicio).total_seconds(), 3),
+        "entorno": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "nucleos": os.cpu_count(),
+        },
+        "configuracion": configuracion or {
+            "formato_consolidado": FORMATO_CONSOLIDADO,
+            "formato_salida": FORMATO_SALIDA,
+            "libro_unico": LIBRO_UNICO,
+            "procesos_lectura": PROCESOS_LECTURA,
+            "procesos_escritura": PROCESOS_ESCRITURA,
+            "cache_lecturas": DIRECTORIO_CACHE,
+            "modo_perfilado": MODO_PERFILADO,
+        },
+        "archivos_entrada": archivos_entrada or [],
+        "etapas": etapas,
+    }
+    if deduplicacion:
+        manifiesto["deduplicacion"] = {
+            familia: [{columna: (valor if isinstance(valor, str) else int(valor)) for columna, valor in fila.items()} for fila in dfConteo.to_dict("records")]
+            for familia, dfConteo in deduplicacion.items()
+        }
+    try:
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+        print(f"Manifiesto de ejecución generado: {ruta}")
+        return ruta
+    except Exception as e:
+        print(f"Error al generar el manifiesto de ejecución: {e}")
+        return None
+ 
+def generar_excel_by_df(df, nombre_base, fecha_hora=None):
+    """
+    Genera un archivo Excel a partir de un DataFrame, añadiendo la fecha y hora actual al nombre del archivo.
+
+    :param df: DataFrame a exportar.
+    :param nombre_base: Nombre base del archivo (sin extensión).
+    :param fecha_hora: Fecha y hora a añadir al nombre. Si es None, se usa la actual.
+    :return: Ruta completa del archivo generado.
+    """
+    try:
+        # Obtener la fecha y hora actuales en formato 'YYYYMMDD_HHMMSS'
+        fecha_hora = fecha_hora or datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        
+        # Construir el nombre del archivo
+        nombre_archivo = f"{nombre_base}_{fecha_hora}.xlsx"
+        
+        # Exportar el DataFrame a Excel
+        df.to_excel(nombre_archivo, index=False, engine="openpyxl")
+        
+        print(f"Archivo Excel generado exitosamente: {nombre_archivo}")
+        return nombre_archivo
+    except Exception as e:
+        print(f"Error al generar el archivo Excel: {e}")
+        return None
+
+def _escribir_hoja_streaming(libro, nombre_hoja, df, filas_por_bloque=10000):
+    """
+    Escribe un DataFrame en una hoja de xlsxwriter fila por fila, en bloques de filas,
+    para que el libro pueda escribirse en modo de memoria constante.
+    """
+    hoja = libro.add_worksheet(nombre_hoja)
+    hoja.write_row(0, 0, [str(col) for col in df.columns])
+
+    for inicio in range(0, len(df), filas_por_bloque):
+        # Convertir los valores vacíos de cada bloque en celdas vacías
+        bloque = df.iloc[inicio:inicio + filas_por_bloque].astype(object)
+        bloque = bloque.where(bloque.notna(), None)
+        for numero, fila in enumerate(bloque.itertuples(index=False, name=None), start=inicio + 1):
+            hoja.write_row(numero, 0, fila)
+
+def _nombres_hojas(nombres):
+    # Excel limita los nombres de hoja a 31 caracteres y no permite repetirlos
+    hojas = []
+    for nombre in map(os.path.basename, nombres):
+        hoja = nombre[:31]
+        consecutivo = 1
+        while hoja in hojas:
+            sufijo = f"~{consecutivo}"
+            hoja = nombre[:31 - len(sufijo)] + sufijo
+            consecutivo += 1
+        hojas.append(hoja)
+    return hojas
+
+def generar_xlsx_streaming(reportes, nombre_archivo):
+    """
+    Genera un libro de Excel con xlsxwriter en modo de memoria constante.
+
+    :param reportes: Diccionario {nombre: DataFrame}; cada reporte se escribe en su propia hoja.
+    :param nombre_archivo: Nombre del archivo a generar.
+    :return: Nombre del archivo generado.
+    """
+    import xlsxwriter
+
+    libro = xlsxwriter.Workbook(nombre_archivo, {
+        "constant_memory": True,
+        "default_date_format": "yyyy-mm-dd",
+    })
+    try:
+        for nombre_hoja, df in zip(_nombres_hojas(list(reportes)), reportes.values()):
+            _escribir_hoja_streaming(libro, nombre_hoja, df)
+    finally:
+        libro.close()
+    return nombre_archivo
+
+def generar_archivo_by_df(df, nombre_base, formato=FORMATO_SALIDA, fecha_hora=None):
+    """
+    Genera un archivo de reporte a partir de un DataFrame en el formato indicado,
+    añadiendo la fecha y hora actual al nombre del archivo.
+
+    :param df: DataFrame a exportar.
+    :param nombre_base: Nombre base del archivo (sin extensión).
+    :param formato: 'xlsx', 'xlsx-streaming', 'parquet' o 'csv'.
+    :param fecha_hora: Fecha y hora a añadir al nombre. Si es None, se usa la actual.
+    :return: Ruta completa del archivo generado, o None si no se pudo generar.
+    """
+    if formato == "xlsx":
+        return generar_excel_by_df(df, nombre_base, fecha_hora)
+
+    try:
+        fecha_hora = fecha_hora or datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        nombre_archivo = f"{nombre_base}_{fecha_hora}{EXTENSIONES_SALIDA[formato]}"
+
+        if formato == "xlsx-streaming":
+            try:
+                generar_xlsx_streaming({nombre_base: df}, nombre_archivo)
+            except ImportError:
+                print("xlsxwriter no está instalado, se usará openpyxl.")
+                return generar_excel_by_df(df, nombre_base, fecha_hora)
+        elif formato == "parquet":
+            df.to_parquet(nombre_archivo, index=False)
+        else:
+            # utf-8-sig para que Excel reconozca los acentos al abrir el CSV
+            df.to_csv(nombre_archivo, index=False, encoding="utf-8-sig")
+
+        print(f"Archivo generado exitosamente: {nombre_archivo}")
+        return nombre_archivo
+    except KeyError:
+        print(f"Formato de salida no soportado: {formato}")
+    except Exception as e:
+        print(f"Error al generar el archivo {nombre_base}: {e}")
+    return None
+
+def generar_libro_unico(reportes, nombre_base, formato=FORMATO_SALIDA, fecha_hora=None):
+    """
+    Genera un solo libro de Excel con cada reporte en su propia hoja.
+
+    :param reportes: Diccionario {nombre: DataFrame}.
+    :param nombre_base: Nombre base del libro (sin extensión).
+    :param formato: 'xlsx-streaming' escribe en memoria constante; cualquier otro valor usa openpyxl.
+    :param fecha_hora: Fecha y hora a añadir al nombre. Si es None, se usa la actual.
+    :return: Ruta completa del archivo generado, o None si no se pudo generar.
+    """
+    try:
+        fecha_hora = fecha_hora or datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        nombre_archivo = f"{nombre_base}_{fecha_hora}.xlsx"
+
+        if formato == "xlsx-streaming":
+            try:
+                generar_xlsx_streaming(reportes, nombre_archivo)
+                print(f"Archivo Excel generado exitosamente: {nombre_archivo}")
+                return nombre_archivo
+            except ImportError:
+                print("xlsxwriter no está instalado, se usará openpyxl.")
+
+        with pd.ExcelWriter(nombre_archivo, engine="openpyxl") as writer:
+            for nombre_hoja, df in zip(_nombres_hojas(list(reportes)), reportes.values()):
+                df.to_excel(writer, sheet_name=nombre_hoja, index=False)
+
+        print(f"Archivo Excel generado exitosamente: {nombre_archivo}")
+        return nombre_archivo
+    except Exception as e:
+        print(f"Error al generar el libro {nombre_base}: {e}")
+        return None
+
+def _generar_archivo_en_proceso(df, nombre_base, formato, fecha_hora):
+    """
+    Genera un reporte dentro de un proceso de trabajo, capturando sus mensajes para
+    que el proceso principal los imprima en orden.
+
+    :return: Tupla (archivo generado o None, mensajes impresos durante la escritura).
+    """
+    mensajes = io.StringIO()
+    with contextlib.redirect_stdout(mensajes):
+        archivo = generar_archivo_by_df(df, nombre_base, formato, fecha_hora)
+    return archivo, mensajes.getvalue()
+
+@instrumentar
+def generar_reportes(reportes, formato=FORMATO_SALIDA, libro_unico=LIBRO_UNICO, procesos=PROCESOS_ESCRITURA):
+    """
+    Escribe los reportes BI una vez que todos los DataFrames están construidos,
+    cada uno en su propio proceso.
+
+    :param reportes: Diccionario {nombre_base: DataFrame}.
+    :param formato: 'xlsx', 'xlsx-streaming', 'parquet' o 'csv'.
+    :param libro_unico: Nombre base de un libro único con todos los reportes como hojas. Si es None, se genera un archivo por reporte.
+    :param procesos: Número de procesos de escritura. None usa todos los núcleos; 1 escribe en secuencia.
+    :return: Diccionario {nombre_base: archivo generado} sin los reportes que no se pudieron generar;
+        con libro único, todos los reportes apuntan al mismo libro.
+    """
+    # Todos los reportes de una ejecución llevan la misma fecha y hora
+    fecha_hora = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+
+    if libro_unico is not None:
+        archivo = generar_libro_unico(reportes, libro_unico, formato, fecha_hora)
+        return {nombre: archivo for nombre in reportes} if archivo else {}
+
+    if procesos == 1 or len(reportes) <= 1:
+        resultados = [_generar_archivo_en_proceso(df, nombre, formato, fecha_hora) for nombre, df in reportes.items()]
+    else:
+        resultados = []
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            futuros = [executor.submit(_generar_archivo_en_proceso, df, nombre, formato, fecha_hora) for nombre, df in reportes.items()]
+            for nombre, futuro in zip(reportes, futuros):
+                try:
+                    resultados.append(futuro.result())
+                except Exception as e:
+                    resultados.append((None, f"Error al generar el archivo {nombre}: {e}\n"))
+
+    archivos = {}
+    for nombre, (archivo, mensajes) in zip(reportes, resultados):
+        if mensajes:
+            print(mensajes, end="")
+        if archivo:
+            archivos[nombre] = archivo
+    return archivos
+
+def _avisar_columnas_faltantes(archivo, columnas, columnas_encontradas):
+    # Las columnas que faltan se informan con el archivo en que se detectan; la familia falla después al fusionarse
+    faltantes = [col for col in columnas if col not in columnas_encontradas]
+    if faltantes:
+        print(f"Una o más columnas no se encuentran en el archivo {archivo}: {faltantes}")
+
+def _leer_bloques_columnas_excel(archivo, columnas, hoja=None, filas_por_bloque=None):
+    """
+    Recorre una hoja de Excel en modo de solo lectura y entrega las columnas solicitadas
+    en bloques de filas.
+
+    :param archivo: Ruta del archivo Excel a leer.
+    :param columnas: Lista de columnas a conservar, en el orden deseado.
+    :param hoja: Nombre de la hoja a leer. Si es None, se usará la primera hoja.
+    :param filas_por_bloque: Número máximo de filas por bloque. Si es None, se entrega un solo bloque.
+    :return: Generador de DataFrames con las columnas encontradas.
+    :raises ValueError: Si la hoja no existe en el archivo.
+    """
+    libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        if hoja is None:
+            hoja_excel = libro.worksheets[0]
+        elif hoja in libro.sheetnames:
+            hoja_excel = libro[hoja]
+        else:
+            raise ValueError(f"Worksheet named '{hoja}' not found")
+
+        filas = hoja_excel.iter_rows(values_only=True)
+
+        # Localizar la posición de cada columna solicitada en la fila de encabezados
+        posiciones = {}
+        for posicion, encabezado in enumerate(next(filas, ())):
+            if encabezado in columnas and encabezado not in posiciones:
+                posiciones[encabezado] = posicion
+        columnas_encontradas = [col for col in columnas if col in posiciones]
+        indices = [posiciones[col] for col in columnas_encontradas]
+        _avisar_columnas_faltantes(archivo, columnas, columnas_encontradas)
+
+        if not indices:
+            yield pd.DataFrame(columns=columnas_encontradas)
+            return
+
+        def bloque(valores):
+            # Construir un arreglo tipado por columna
+            columnas_valores = zip(*valores) if valores else [() for _ in indices]
+            return pd.DataFrame({col: list(datos) for col, datos in zip(columnas_encontradas, columnas_valores)})
+
+        # Recorrer las filas conservando solo los valores de las columnas solicitadas
+        extraer = itemgetter(*indices) if len(indices) > 1 else lambda fila: (fila[indices[0]],)
+        valores = []
+        filas_con_datos = 0
+        bloques_entregados = 0
+        for fila in filas:
+            try:
+                seleccion = extraer(fila)
+            except IndexError:
+                # Filas más cortas que el encabezado
+                seleccion = tuple(fila[i] if i < len(fila) else None for i in indices)
+            valores.append(seleccion)
+            if any(valor is not None for valor in seleccion):
+                filas_con_datos = len(valores)
+                if filas_por_bloque is not None and filas_con_datos >= filas_por_bloque:
+                    yield bloque(valores)
+                    bloques_entregados += 1
+                    valores, filas_con_datos = [], 0
+
+        # Descartar las filas vacías al final de la hoja
+        if filas_con_datos or not bloques_entregados:
+            yield bloque(valores[:filas_con_datos])
+    finally:
+        libro.close()
+
+def leer_columnas_excel(archivo, columnas, hoja=None):
+    """
+    Lee solo las columnas solicitadas de una hoja de Excel en modo de solo lectura.
+
+    Primero se localizan las columnas en la fila de encabezados y después se recorren las
+    filas conservando únicamente esos valores, sin cargar la hoja completa en memoria.
+    Las columnas que no existan en la hoja se omiten del resultado y se informan con el nombre del archivo.
+
+    :param archivo: Ruta del archivo Excel a leer.
+    :param columnas: Lista de columnas a conservar, en el orden deseado.
+    :param hoja: Nombre de la hoja a leer. Si es None, se usará la primera hoja.
+    :return: DataFrame con las columnas encontradas.
+    :raises ValueError: Si la hoja no existe en el archivo.
+    """
+    bloques = _leer_bloques_columnas_excel(archivo, columnas, hoja=hoja)
+    try:
+        return next(bloques)
+    finally:
+        bloques.close()
+
+def _extension(archivo):
+    return os.path.splitext(archivo)[1].lower()
+
+def _ajustar_tipos(df):
+    """
+    Convierte las columnas de TIPOS_COLUMNAS de una lectura de texto o Parquet a su tipo explícito;
+    los valores que no se pueden convertir quedan vacíos.
+    """
+    for columna, tipo in TIPOS_COLUMNAS.items():
+        if columna not in df.columns:
+            continue
+        if tipo.startswith("datetime"):
+            df[columna] = pd.to_datetime(df[columna], format=FORMATO_FECHA_TEXTO, errors="coerce")
+            continue
+        valores = pd.to_numeric(df[columna], errors="coerce").astype(tipo)
+        if valores.notna().all() and (valores == np.floor(valores)).all():
+            valores = valores.astype("int64")
+        df[columna] = valores
+    return df
+
+def _codificacion_texto(archivo):
+    # Primera codificación de CODIFICACIONES_TEXTO con la que se puede decodificar todo el archivo
+    for codificacion in CODIFICACIONES_TEXTO[:-1]:
+        decodificador = codecs.getincrementaldecoder(codificacion)()
+        try:
+            with open(archivo, "rb") as f:
+                for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                    decodificador.decode(bloque)
+                decodificador.decode(b"", final=True)
+            return codificacion
+        except UnicodeDecodeError:
+            continue
+    return CODIFICACIONES_TEXTO[-1]
+
+def _leer_bloques_columnas_texto(archivo, columnas, filas_por_bloque=None):
+    """
+    Lee las columnas solicitadas de un archivo CSV/TSV con tipos explícitos.
+
+    Sin bloques se usa el lector multihilo de PyArrow si está instalado, con las columnas numéricas
+    ya tipadas desde el lector. Por bloques se usa el lector de pandas y los tipos se aplican a cada bloque.
+
+    :param archivo: Ruta del archivo de texto.
+    :param columnas: Lista de columnas a conservar, en el orden deseado.
+    :param filas_por_bloque: Número máximo de filas por bloque. Si es None, se entrega un solo bloque.
+    :return: Generador de DataFrames con las columnas encontradas.
+    """
+    separador = SEPARADORES_TEXTO[_extension(archivo)]
+    codificacion = _codificacion_texto(archivo)
+    encabezados = pd.read_csv(archivo, sep=separador, encoding=codificacion, nrows=0).columns
+    columnas_encontradas = [col for col in columnas if col in encabezados]
+    _avisar_columnas_faltantes(archivo, columnas, columnas_encontradas)
+    if not columnas_encontradas:
+        yield pd.DataFrame(columns=columnas_encontradas)
+        return
+
+    parametros = {"sep": separador, "encoding": codificacion, "usecols": columnas_encontradas}
+    textos = {col: str for col in columnas_encontradas}
+
+    if filas_por_bloque is not None:
+        for bloque in pd.read_csv(archivo, dtype=textos, chunksize=filas_por_bloque, **parametros):
+            yield _ajustar_tipos(bloque[columnas_encontradas])
+        return
+
+    try:
+        import pyarrow  # noqa: F401
+        motor = "pyarrow"
+    except ImportError:
+        motor = "c"
+    # Números como float64 desde el lector; fechas y textos como texto
+    tipos = {
+        col: TIPOS_COLUMNAS[col] if col in TIPOS_COLUMNAS and not TIPOS_COLUMNAS[col].startswith("datetime") else str
+        for col in columnas_encontradas
+    }
+    try:
+        df = pd.read_csv(archivo, engine=motor, dtype=tipos, **parametros)
+    except (ValueError, TypeError):
+        # Valores no numéricos en una columna numérica: se leen como texto y se convierten después
+        df = pd.read_csv(archivo, engine=motor, dtype=textos, **parametros)
+    yield _ajustar_tipos(df[columnas_encontradas])
+
+def _leer_bloques_columnas_parquet(archivo, columnas, filas_por_bloque=None):
+    """
+    Lee las columnas solicitadas de un archivo Parquet, por grupos de filas si se indican bloques.
+
+    :param archivo: Ruta del archivo Parquet.
+    :param columnas: Lista de columnas a conservar, en el orden deseado.
+    :param filas_por_bloque: Número máximo de filas por bloque. Si es None, se entrega un solo bloque.
+    :return: Generador de DataFrames con las columnas encontradas.
+    """
+    import pyarrow.parquet as pq
+
+    archivo_parquet = pq.ParquetFile(archivo)
+    columnas_encontradas = [col for col in columnas if col in archivo_parquet.schema_arrow.names]
+    _avisar_columnas_faltantes(archivo, columnas, columnas_encontradas)
+    if filas_por_bloque is None:
+        yield _ajustar_tipos(archivo_parquet.read(columns=columnas_encontradas).to_pandas())
+        return
+
+    entregados = 0
+    for lote in archivo_parquet.iter_batches(batch_size=filas_por_bloque, columns=columnas_encontradas):
+        entregados += 1
+        yield _ajustar_tipos(lote.to_pandas())
+    if not entregados:
+        yield _ajustar_tipos(archivo_parquet.schema_arrow.empty_table().select(columnas_encontradas).to_pandas())
+
+def _leer_bloques_columnas(archivo, columnas, hoja=None, filas_por_bloque=None):
+    """
+    Lee las columnas solicitadas de un archivo de origen en bloques, según su extensión:
+    Excel (.xlsx), texto (.csv, .tsv) o Parquet. Los archivos de texto y Parquet tienen una
+    sola tabla, por lo que en ellos no se usa la hoja.
+    """
+    extension = _extension(archivo)
+    if extension in SEPARADORES_TEXTO:
+        return _leer_bloques_columnas_texto(archivo, columnas, filas_por_bloque)
+    if extension == ".parquet":
+        return _leer_bloques_columnas_parquet(archivo, columnas, filas_por_bloque)
+    return _leer_bloques_columnas_excel(archivo, columnas, hoja=hoja, filas_por_bloque=filas_por_bloque)
+
+def leer_columnas_archivo(archivo, columnas, hoja=None):
+    """
+    Lee solo las columnas solicitadas de un archivo Excel, CSV/TSV o Parquet.
+    Las columnas que no existan en el archivo se omiten del resultado y se informan con el nombre del archivo.
+
+    :param archivo: Ruta del archivo a leer.
+    :param columnas: Lista de columnas a conservar, en el orden deseado.
+    :param hoja: Nombre de la hoja a leer en archivos Excel. Si es None, se usará la primera hoja.
+    :return: DataFrame con las columnas encontradas.
+    :raises ValueError: Si la hoja no existe en el archivo Excel.
+    """
+    bloques = _leer_bloques_columnas(archivo, columnas, hoja=hoja)
+    try:
+        return next(bloques)
+    finally:
+        bloques.close()
+
+def sumar_columnas_excel_por_bloques(archivo, columnas, valor, hoja=None, filas_por_bloque=FILAS_POR_BLOQUE_VENTAS):
+    """
+    Lee una hoja de Excel (o un archivo CSV/TSV o Parquet) en bloques de filas y conserva
+    solo la suma de `valor` por cada combinación de las demás columnas (las claves).
+
+    Las filas con alguna clave vacía se descartan y los valores vacíos suman 0. Las sumas
+    conservan el tipo entero solo si todos los valores leídos son enteros.
+
+    :param archivo: Ruta del archivo Excel a leer.
+    :param columnas: Lista de columnas a leer (claves y valor), en el orden deseado.
+    :param valor: Columna a sumar.
+    :param hoja: Nombre de la hoja a leer. Si es None, se usará la primera hoja.
+    :param filas_por_bloque: Número máximo de filas por bloque.
+    :return: DataFrame con una fila por combinación de claves, o None si faltan columnas.
+    :raises ValueError: Si la hoja no existe en el archivo.
+    """
+    claves = [col for col in columnas if col != valor]
+    acumulado = None
+    for bloque in _leer_bloques_columnas(archivo, columnas, hoja=hoja, filas_por_bloque=filas_por_bloque):
+        if any(col not in bloque.columns for col in columnas):
+            # El lector ya informó las columnas faltantes con el nombre del archivo
+            return None
+
+        if not pd.api.types.is_integer_dtype(bloque[valor]):
+            bloque[valor] = bloque[valor].to_numpy(dtype="float64", na_value=np.nan)
+        sumas = bloque.groupby(claves, sort=False, dropna=True)[valor].sum()
+        # Integrar el bloque a las sumas acumuladas; la memoria depende de las claves distintas
+        acumulado = sumas if acumulado is None else pd.concat([acumulado, sumas]).groupby(level=claves, sort=False).sum()
+
+    return acumulado.reset_index()[columnas]
+
+def leer_archivo_excel(archivo, hoja=None, columnas=None, suma=None, filas_por_bloque=FILAS_POR_BLOQUE_VENTAS):
+    """
+    Lee un archivo de origen (Excel, CSV/TSV o Parquet) en un DataFrame, conservando solo las columnas solicitadas.
+
+    :param archivo: Ruta del archivo a leer.
+    :param hoja: Nombre de la hoja a leer en archivos Excel. Si es None, se usará la primera hoja.
+    :param columnas: Lista de columnas a conservar. Si es None, se leen todas.
+    :param suma: Columna a sumar. Si se indica, el archivo se lee en bloques y solo se conserva
+        la suma por cada combinación de las demás columnas (ver `sumar_columnas_excel_por_bloques`).
+    :param filas_por_bloque: Número de filas por bloque al sumar.
+    :return: DataFrame leído, o None si el archivo no pudo procesarse.
+    """
+    # Verificar si el archivo existe y tiene la extensión correcta
+    extension = _extension(archivo)
+    if not (os.path.isfile(archivo) and extension in (".xlsx", ".parquet", *SEPARADORES_TEXTO)):
+        print(f"Archivo no válido o no encontrado: {archivo}")
+        return None
+
+    try:
+        if suma is not None:
+            return sumar_columnas_excel_por_bloques(archivo, columnas, suma, hoja=hoja, filas_por_bloque=filas_por_bloque)
+        if columnas is not None:
+            # Leer en modo de solo lectura únicamente las columnas que se ocupan
+            return leer_columnas_archivo(archivo, columnas, hoja=hoja)
+        if extension in SEPARADORES_TEXTO:
+            return _ajustar_tipos(pd.read_csv(archivo, sep=SEPARADORES_TEXTO[extension], encoding=_codificacion_texto(archivo)))
+        if extension == ".parquet":
+            return _ajustar_tipos(pd.read_parquet(archivo))
+        if hoja is None:
+            return pd.read_excel(archivo, engine="openpyxl")
+        return pd.read_excel(archivo, engine="openpyxl", sheet_name=hoja)
+    except ValueError as e:
+        if extension == ".xlsx":
+            print(f"La hoja '{hoja}' no existe en el archivo {archivo}.")
+        else:
+            print(f"Error al leer el archivo {archivo}: {e}")
+    except Exception as e:
+        print(f"Error al leer el archivo {archivo}: {e}")
+    return None
+
+def calcular_huella_archivo(archivo):
+    """
+    Calcula la huella SHA-256 del contenido de un archivo.
+
+    :param archivo: Ruta del archivo.
+    :return: Huella hexadecimal del contenido.
+    """
+    sha = hashlib.sha256()
+    with open(archivo, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+def _ruta_cache_lectura(huella, hoja, columnas, directorio_cache):
+    # La lectura se identifica por el contenido del archivo y por la proyección solicitada
+    proyeccion = hashlib.sha256(repr((VERSION_CACHE, hoja, columnas)).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directorio_cache, f"{huella}_{proyeccion}.parquet")
+
+def leer_archivo_excel_con_cache(archivo, hoja=None, columnas=None, directorio_cache=DIRECTORIO_CACHE, suma=None, filas_por_bloque=FILAS_POR_BLOQUE_VENTAS):
+    """
+    Lee un archivo de origen reutilizando la lectura guardada en caché si el archivo no cambió.
+    Los archivos Parquet se leen directamente, sin caché.
+
+    :param archivo: Ruta del archivo a leer.
+    :param hoja: Nombre de la hoja a leer. Si es None, se usará la primera hoja.
+    :param columnas: Lista de columnas a conservar. Si es None, se leen todas.
+    :param directorio_cache: Carpeta de la caché. Si es None, no se usa caché.
+    :param suma: Columna a sumar por bloques (ver `leer_archivo_excel`). Las sumas se guardan en caché aparte.
+    :param filas_por_bloque: Número de filas por bloque al sumar.
+    :return: DataFrame leído, o None si el archivo no pudo procesarse.
+    """
+    def leer():
+        return leer_archivo_excel(archivo, hoja=hoja, columnas=columnas, suma=suma, filas_por_bloque=filas_por_bloque)
+
+    if directorio_cache is None or not (os.path.isfile(archivo) and _extension(archivo) in (".xlsx", *SEPARADORES_TEXTO)):
+        return leer()
+
+    try:
+        proyeccion = columnas if suma is None else (columnas, "suma", suma)
+        ruta_cache = _ruta_cache_lectura(calcular_huella_archivo(archivo), hoja, proyeccion, directorio_cache)
+    except OSError as e:
+        print(f"No se pudo calcular la huella del archivo {archivo}: {e}")
+        return leer()
+
+    if os.path.isfile(ruta_cache):
+        try:
+            df = pd.read_parquet(ruta_cache)
+            # Marcar la lectura como usada recientemente para la depuración por tamaño
+            os.utime(ruta_cache)
+            print(f"Lectura recuperada de la caché: {archivo}")
+            return df
+        except Exception as e:
+            print(f"No se pudo usar la caché del archivo {archivo}: {e}")
+
+    df = leer()
+    if df is not None:
+        try:
+            os.makedirs(directorio_cache, exist_ok=True)
+            # Escribir en un archivo temporal para que otro proceso nunca lea una lectura incompleta
+            ruta_temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+            df.to_parquet(ruta_temporal, index=False)
+            os.replace(ruta_temporal, ruta_cache)
+        except Exception as e:
+            print(f"No se pudo guardar en caché la lectura del archivo {archivo}: {e}")
+    return df
+
+def depurar_cache_lecturas(directorio_cache=DIRECTORIO_CACHE, tamano_maximo=TAMANO_MAXIMO_CACHE):
+    """
+    Elimina las lecturas usadas hace más tiempo hasta que la caché no exceda el tamaño máximo.
+
+    :param directorio_cache: Carpeta de la caché.
+    :param tamano_maximo: Tamaño máximo de la caché en bytes.
+    :return: Lista de archivos eliminados de la caché.
+    """
+    if directorio_cache is None or not os.path.isdir(directorio_cache):
+        return []
+
+    lecturas = []
+    for ruta in glob.glob(os.path.join(directorio_cache, "*.parquet")):
+        try:
+            estado = os.stat(ruta)
+            lecturas.append((estado.st_mtime, estado.st_size, ruta))
+        except OSError:
+            continue
+
+    tamano_total = sum(tamano for _, tamano, _ in lecturas)
+    eliminados = []
+    for _, tamano, ruta in sorted(lecturas):
+        if tamano_total <= tamano_maximo:
+            break
+        try:
+            os.remove(ruta)
+            tamano_total -= tamano
+            eliminados.append(ruta)
+        except OSError as e:
+            print(f"Error al eliminar la lectura en caché {ruta}: {e}")
+
+    if eliminados:
+        print(f"Lecturas eliminadas de la caché por tamaño: {len(eliminados)}")
+    return eliminados
+
+def invalidar_cache_lecturas(lista_archivos=None, directorio_cache=DIRECTORIO_CACHE):
+    """
+    Elimina lecturas de la caché para forzar que se vuelvan a leer los archivos.
+
+    :param lista_archivos: Archivos de origen cuyas lecturas se eliminarán. Si es None, se vacía la caché.
+    :param directorio_cache: Carpeta de la caché.
+    :return: Lista de archivos eliminados de la caché.
+    """
+    if directorio_cache is None or not os.path.isdir(directorio_cache):
+        print("La caché de lecturas está vacía.")
+        return []
+
+    if lista_archivos is None:
+        patrones = ["*.parquet", "*.tmp"]
+    else:
+        patrones = [f"{calcular_huella_archivo(archivo)}_*.parquet" for archivo in lista_archivos if os.path.isfile(archivo)]
+
+    eliminados = []
+    for patron in patrones:
+        for ruta in glob.glob(os.path.join(directorio_cache, patron)):
+            try:
+                os.remove(ruta)
+                eliminados.append(ruta)
+            except OSError as e:
+                print(f"Error al eliminar la lectura en caché {ruta}: {e}")
+
+    print(f"Lecturas eliminadas de la caché: {len(eliminados)}")
+    return eliminados
+
+def concatenar_lecturas(dataframes, columnas=None):
+    """
+    Concatena los DataFrames leídos de una familia de archivos.
+
+    :param dataframes: Lista de DataFrames leídos (los None se ignoran).
+    :param columnas: Lista de columnas a conservar, en el orden deseado. Si es None, se conservan todas.
+    :return: DataFrame fusionado, o None si no hay lecturas válidas.
+    """
+    dataframes = [df for df in dataframes if df is not None]
+
+    if not dataframes:
+        print("No se encontraron archivos válidos para fusionar.")
+        return None
+
+    # Concatenar los DataFrames si hay al menos uno válido
+    df_fusionado = pd.concat(dataframes, ignore_index=True)
+
+    if columnas is not None:
+        try:
+            # Filtrar y ordenar las columnas deseadas
+            df_fusionado = df_fusionado[columnas]
+        except KeyError as e:
+            print(f"Una o más columnas no se encuentran en el archivo: {e}")
+            return None
+
+    return df_fusionado
+
+def concatenar_sumas(dataframes, columnas, valor):
+    """
+    Integra las sumas parciales leídas de una familia de archivos en una sola suma por clave.
+
+    :param dataframes: Lista de DataFrames de sumas parciales (los None se ignoran).
+    :param columnas: Lista de columnas (claves y valor), en el orden deseado.
+    :param valor: Columna sumada.
+    :return: DataFrame con una fila por combinación de claves, o None si no hay lecturas válidas.
+    """
+    df_fusionado = concatenar_lecturas(dataframes, columnas)
+    if df_fusionado is None:
+        return None
+
+    claves = [col for col in columnas if col != valor]
+    return df_fusionado.groupby(claves, sort=False, dropna=True)[valor].sum().reset_index()[columnas]
+
+def fusionar_dataframes_excel(lista_archivos, hoja=None, columnas=None):
+    """
+    Fusiona múltiples archivos Excel en memoria, sin escribir un archivo intermedio.
+
+    :param lista_archivos: Lista de rutas de los archivos Excel a fusionar.
+    :param hoja: Nombre de la hoja a leer de cada archivo. Si es None, se usará la primera hoja.
+    :param columnas: Lista de columnas a conservar, en el orden deseado. Si es None, se conservan todas.
+    :return: DataFrame fusionado, o None si no se pudieron procesar archivos.
+    """
+    dataframes = [leer_archivo_excel(archivo, hoja=hoja, columnas=columnas) for archivo in lista_archivos]
+    return concatenar_lecturas(dataframes, columnas)
+
+def _leer_archivo_excel_en_proceso(archivo, hoja, columnas, directorio_cache=DIRECTORIO_CACHE, suma=None, filas_por_bloque=FILAS_POR_BLOQUE_VENTAS):
+    """
+    Lee un archivo dentro de un proceso de trabajo, capturando sus mensajes para
+    que el proceso principal los imprima en orden.
+
+    :return: Tupla (DataFrame o None, mensajes impresos durante la lectura).
+    """
+    columnas_lectura = columnas
+    if columnas is not None and COLUMNA_ARCHIVO_ORIGEN in columnas:
+        columnas_lectura = [col for col in columnas if col != COLUMNA_ARCHIVO_ORIGEN]
+
+    mensajes = io.StringIO()
+    with contextlib.redirect_stdout(mensajes):
+        df = leer_archivo_excel_con_cache(archivo, hoja=hoja, columnas=columnas_lectura, directorio_cache=directorio_cache, suma=suma, filas_por_bloque=filas_por_bloque)
+
+    if df is not None and columnas_lectura is not columnas:
+        # El origen se agrega después de la caché, que solo depende del contenido del archivo
+        df[COLUMNA_ARCHIVO_ORIGEN] = os.path.basename(archivo)
+    return df, mensajes.getvalue()
+
+@instrumentar
+def fusionar_familias_excel(familias, procesos=PROCESOS_LECTURA, directorio_cache=DIRECTORIO_CACHE, sumas=None, filas_por_bloque=FILAS_POR_BLOQUE_VENTAS):
+    """
+    Lee en paralelo los archivos de varias familias de reportes y fusiona cada familia en memoria.
+
+    Cada archivo se lee en un proceso independiente; los resultados y los mensajes de
+    error de cada archivo se entregan en el mismo orden en que fueron solicitados.
+
+    :param familias: Diccionario {nombre: (lista_archivos, hoja, columnas)}.
+    :param procesos: Número de procesos de lectura. None usa todos los núcleos; 1 lee en secuencia.
+    :param directorio_cache: Carpeta de la caché de lecturas. Si es None, no se usa caché.
+    :param sumas: Diccionario {nombre: columna a sumar} con las familias que se leen por bloques
+        conservando solo la suma por cada combinación de las demás columnas.
+    :param filas_por_bloque: Número de filas por bloque de las familias en `sumas`.
+    :return: Diccionario {nombre: DataFrame fusionado o None}, en el mismo orden de `familias`.
+    """
+    sumas = sumas or {}
+    tareas = [
+        (nombre, archivo, hoja, columnas, sumas.get(nombre))
+        for nombre, (lista_archivos, hoja, columnas) in familias.items()
+        for archivo in lista_archivos
+    ]
+
+    if procesos == 1 or len(tareas) <= 1:
+        lecturas = [_leer_archivo_excel_en_proceso(archivo, hoja, columnas, directorio_cache, suma, filas_por_bloque) for _, archivo, hoja, columnas, suma in tareas]
+    else:
+        lecturas = []
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            futuros = [executor.submit(_leer_archivo_excel_en_proceso, archivo, hoja, columnas, directorio_cache, suma, filas_por_bloque) for _, archivo, hoja, columnas, suma in tareas]
+            for (_, archivo, _, _, _), futuro in zip(tareas, futuros):
+                try:
+                    lecturas.append(futuro.result())
+                except Exception as e:
+                    lecturas.append((None, f"Error al leer el archivo {archivo}: {e}\n"))
+
+    # Agrupar las lecturas por familia respetando el orden original
+    dataframes_por_familia = {nombre: [] for nombre in familias}
+    for (nombre, _, _, _, _), (df, mensajes) in zip(tareas, lecturas):
+        if mensajes:
+            print(mensajes, end="")
+        dataframes_por_familia[nombre].append(df)
+
+    return {
+        nombre: concatenar_sumas(dataframes_por_familia[nombre], familias[nombre][2], sumas[nombre])
+        if nombre in sumas else concatenar_lecturas(dataframes_por_familia[nombre], familias[nombre][2])
+        for nombre in familias
+    }
+
+def fusionar_archivos_excel(lista_archivos, hoja=None, nombre_salida="archivo_fusionado.xlsx"):
+    """
+    Fusiona múltiples archivos Excel en un solo archivo, permitiendo especificar una hoja de cada archivo.
+    
+    :param lista_archivos: Lista de rutas de los archivos Excel a fusionar.
+    :param hoja: Nombre de la hoja a leer de cada archivo. Si es None, se usará la primera hoja.
+    :param nombre_salida: Nombre del archivo de salida fusionado.
+    :return: Nombre del archivo fusionado, o una cadena vacía si no se pudieron procesar archivos.
+    """
+    df_fusionado = fusionar_dataframes_excel(lista_archivos, hoja=hoja)
+
+    if df_fusionado is None:
+        return ""
+
+    # Especificar el motor openpyxl al guardar
+    df_fusionado.to_excel(nombre_salida, index=False, engine="openpyxl")
+    return nombre_salida
+
+def guardar_consolidado(df, nombre_base, formato=FORMATO_CONSOLIDADO):
+    """
+    Guarda una copia de archivo de un DataFrame consolidado.
+
+    :param df: DataFrame consolidado a guardar.
+    :param nombre_base: Nombre base del archivo (sin extensión).
+    :param formato: 'parquet' para una instantánea columnar, 'xlsx' para un libro de Excel o None para no guardar.
+    :return: Nombre del archivo generado, o None si no se generó.
+    """
+    if formato is None or df is None:
+        return None
+
+    nombre_archivo = f"{nombre_base}.{formato}"
+    try:
+        if formato == "parquet":
+            df.to_parquet(nombre_archivo, index=False)
+        elif formato == "xlsx":
+            df.to_excel(nombre_archivo, index=False, engine="openpyxl")
+        else:
+            print(f"Formato de consolidado no soportado: {formato}")
+            return None
+
+        print(f"Consolidado guardado: {nombre_archivo}")
+        return nombre_archivo
+    except ImportError as e:
+        print(f"No está disponible el motor para guardar '{nombre_archivo}': {e}")
+    except Exception as e:
+        print(f"Error al guardar el consolidado {nombre_archivo}: {e}")
+    return None
+
+def borrar_archivos(lista_archivos):
+    for archivo in lista_archivos:
+        if os.path.isfile(archivo):
+            try:
+                os.remove(archivo)
+                print(f"Archivo eliminado: {archivo}")
+            except Exception as e:
+                print(f"Error al eliminar el archivo {archivo}: {e}")
+        else:
+            print(f"Archivo no encontrado: {archivo}")
+
+def crear_dataframe_desde_archivo(archivo: str, columnas: list, hoja: str = None):
+
+    try:
+        # Leer en modo de solo lectura únicamente las columnas deseadas
+        df = leer_columnas_archivo(archivo, columnas, hoja=hoja)
+
+        # Verificar que estén todas las columnas deseadas
+        df_filtrado = df[columnas]
+
+        return df_filtrado
+    except FileNotFoundError:
+        print(f"El archivo {archivo} no fue encontrado.")
+    except KeyError as e:
+        print(f"Una o más columnas no se encuentran en el archivo: {e}")
+    except ValueError:
+        print(f"La hoja '{hoja}' no existe en el archivo {archivo}.")
+    except Exception as e:
+        print(f"Se produjo un error al procesar el archivo: {e}")
+
+def eliminar_columnas_df(dataframe, columnas):
+    """
+    Elimina una lista de columnas de un DataFrame.
+
+    :param dataframe: DataFrame de pandas del que se desean eliminar las columnas.
+    :param columnas: Lista de nombres de columnas a eliminar.
+    :return: DataFrame con las columnas eliminadas.
+    """
+    try:
+        # Verificar cuáles columnas existen en el DataFrame
+        columnas_existentes = [col for col in columnas if col in dataframe.columns]
+        columnas_no_existentes = [col for col in columnas if col not in dataframe.columns]
+
+        if columnas_existentes:
+            dataframe = dataframe.drop(columns=columnas_existentes)
+            print(f"Las columnas eliminadas exitosamente: {columnas_existentes}")
+        
+        if columnas_no_existentes:
+            print(f"Las siguientes columnas no existen en el DataFrame: {columnas_no_existentes}")
+        
+        return dataframe
+    except Exception as e:
+        print(f"Se produjo un error al intentar eliminar las columnas: {e}")
+        return dataframe
+    
+def filtrar_columnas_df(dataframe, columnas):
+    """
+    Devuelve un DataFrame que contiene solo las columnas especificadas.
+
+    :param dataframe: DataFrame de pandas del que se desea conservar las columnas.
+    :param columnas: Lista de nombres de columnas a conservar.
+    :return: DataFrame con solo las columnas especificadas.
+    """
+    try:
+        # Verificar cuáles columnas existen en el DataFrame
+        columnas_existentes = [col for col in columnas if col in dataframe.columns]
+        columnas_no_existentes = [col for col in columnas if col not in dataframe.columns]
+
+        if columnas_no_existentes:
+            print(f"Las siguientes columnas no existen en el DataFrame: {columnas_no_existentes}")
+
+        # Seleccionar solo las columnas existentes
+        dataframe = dataframe[columnas_existentes]
+
+        return dataframe
+    except Exception as e:
+        print(f"Se produjo un error al intentar mantener las columnas: {e}")
+        return dataframe
+    
+def insertar_columnas_despues(columnas, despues):
+    """
+    Devuelve un orden de columnas en el que las columnas indicadas quedan inmediatamente después de su ancla.
+
+    :param columnas: Lista de columnas en su orden actual.
+    :param despues: Diccionario {ancla: lista de columnas a colocar después de ella}; las que no existen se omiten.
+    :return: Lista de columnas reordenada, sin duplicados.
+    """
+    movidas = {col for cols in despues.values() for col in cols}
+    orden = []
+    for col in columnas:
+        if col not in movidas:
+            orden.append(col)
+        orden.extend(movida for movida in despues.get(col, []) if movida in columnas)
+    return orden
+
+@instrumentar
+def reemplazar_ceros_con_nan(dataframe, columnas):
+    """
+    Reemplaza ceros en las columnas especificadas de un DataFrame con NaN.
+
+    :param dataframe: DataFrame en el que se procesarán las columnas.
+    :param columnas: Lista de nombres de columnas donde se reemplazarán los ceros por NaN.
+    :return: DataFrame con los ceros reemplazados por NaN en las columnas especificadas.
+    """
+    try:
+        # Validar que las columnas existan en el DataFrame
+        columnas_validas = [col for col in columnas if col in dataframe.columns]
+
+        # Reemplazar ceros por NaN en las columnas válidas
+        dataframe[columnas_validas] = dataframe[columnas_validas].replace(0, np.nan)
+
+        print(f"Ceros reemplazados por NaN en las columnas: {columnas_validas}")
+        return dataframe
+    except Exception as e:
+        print(f"Error al reemplazar ceros por NaN: {e}")
+        return dataframe
+    
+def crear_carpeta(base_nombre_carpeta, ruta_base="."):
+    """
+    Crea una carpeta con un nombre que incluye la fecha y hora actual al final.
+    
+    :param base_nombre_carpeta: Nombre base para la carpeta.
+    :param ruta_base: Ruta donde se creará la carpeta. Por defecto, en el directorio actual.
+    :return: Ruta completa de la carpeta creada.
+    """
+    try:
+        # Obtener la fecha y hora actuales en formato 'YYYY-MM-DDTHH-MM-SS'
+        fecha_hora = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        
+        # Construir el nombre completo de la carpeta
+        nombre_completo_carpeta = f"{base_nombre_carpeta}_{fecha_hora}"
+        ruta_completa_carpeta = os.path.join(ruta_base, nombre_completo_carpeta)
+        
+        # Crear la carpeta
+        os.makedirs(ruta_completa_carpeta, exist_ok=True)
+        print(f"Carpeta creada: {ruta_completa_carpeta}")
+        return ruta_completa_carpeta
+    except Exception as e:
+        print(f"Error al crear la carpeta: {e}")
+        return None
+
+@instrumentar
+def mover_archivos_a_carpeta(lista_archivos, carpeta_destino, ruta_base="."):
+    """
+    Mueve una lista de archivos a una carpeta destino.
+    
+    :param lista_archivos: Lista con las rutas de los archivos a mover.
+    :param carpeta_destino: Nombre base de la carpeta destino.
+    :param ruta_base: Ruta donde se creará la carpeta. Por defecto, en el directorio actual.
+    :return: Ruta de la carpeta creada, o None si no se pudo crear.
+    """
+    try:
+        # Crear la carpeta destino si no existe
+        carpeta_destino = crear_carpeta(carpeta_destino, ruta_base)
+        
+        for archivo in lista_archivos:
+            if os.path.isfile(archivo):  # Verificar que el archivo existe
+                destino = os.path.join(carpeta_destino, os.path.basename(archivo))  # Ruta destino
+                shutil.move(archivo, destino)  # Mover el archivo
+                print(f"Archivo movido: {archivo} -> {destino}")
+            else:
+                print(f"El archivo no existe: {archivo}")
+        return carpeta_destino
+    except Exception as e:
+        print(f"Error al mover archivos: {e}")
+        return None
+
+def validar_archivos(lista_archivos):
+    """
+    Valida que una lista de archivos no contenga valores vacíos.
+
+    No detiene el proceso: quien llama decide qué hacer (el pipeline lo informa como ErrorValidacion
+    y la línea de comandos lo convierte en el código de salida).
+
+    :param lista_archivos: Lista de rutas de archivos o de DataFrames fusionados.
+    :return: True si todos los archivos son válidos, False si hay archivos faltantes.
+    """
+    # Filtrar archivos vacíos
+    archivos_faltantes = [archivo for archivo in lista_archivos if archivo is None or (isinstance(archivo, str) and archivo == "")]
+    
+    if archivos_faltantes:
+        print("Error: Faltan archivos necesarios para el proceso del reporte.")
+        return False
+    
+    print("Todos los archivos son válidos.")
+    return True
+
+
+
+def agregar_por_almacen(df, valor, prefijo, columna_total, metadatos=None, solo_con_almacen=False, clave="ProdConcat", almacen="Almacen"):
+    """
+    Agrupa un DataFrame por producto en una sola pasada vectorizada: una columna por almacén,
+    el total del producto y sus datos descriptivos.
+
+    Las claves de producto y almacén se convierten a códigos enteros una sola vez y las sumas
+    se acumulan con `np.bincount`, sin volver a agrupar ni combinar DataFrames. El resultado es
+    el mismo que el de un `pivot_table` por almacén combinado con los `groupby` por producto.
+
+    :param df: DataFrame con las columnas de producto, almacén y valor.
+    :param valor: Columna a sumar.
+    :param prefijo: Prefijo para el nombre de las columnas por almacén (p. ej. 'Existencias en ').
+    :param columna_total: Nombre de la columna con el total por producto.
+    :param metadatos: Diccionario {columna: 'first' | 'mean'} con los datos descriptivos del producto.
+    :param solo_con_almacen: Si es True, solo se incluyen (y se suman en el total) las filas con almacén.
+    :param clave: Columna que identifica al producto.
+    :param almacen: Columna que identifica al almacén.
+    :return: DataFrame con una fila por producto ordenada por clave.
+    """
+    metadatos = metadatos or {}
+
+    # Codificar una sola vez las claves; los valores vacíos reciben el código -1
+    codigos_producto, productos = pd.factorize(df[clave], sort=True)
+    codigos_almacen, almacenes = pd.factorize(df[almacen], sort=True)
+    total_productos, total_almacenes = len(productos), len(almacenes)
+
+    valores = df[valor].to_numpy(dtype="float64", na_value=np.nan)
+    valores_sin_nan = np.nan_to_num(valores, nan=0.0)
+    con_producto = codigos_producto >= 0
+    con_almacen = con_producto & (codigos_almacen >= 0)
+
+    # Matriz producto x almacén: una celda sin filas queda vacía, una celda con solo NaN suma 0
+    celdas = codigos_producto[con_almacen] * total_almacenes + codigos_almacen[con_almacen]
+    sumas = np.bincount(celdas, weights=valores_sin_nan[con_almacen], minlength=total_productos * total_almacenes)
+    filas_por_celda = np.bincount(celdas, minlength=total_productos * total_almacenes)
+    matriz = np.where(filas_por_celda > 0, sumas, np.nan).reshape(total_productos, total_almacenes)
+
+    filas = con_almacen if solo_con_almacen else con_producto
+    total = np.bincount(codigos_producto[filas], weights=valores_sin_nan[filas], minlength=total_productos)
+
+    resultado = {clave: productos}
+    for columna, funcion in metadatos.items():
+        serie = df[columna]
+        disponibles = con_producto & serie.notna().to_numpy()
+        if funcion == "first":
+            # Primera fila con valor de cada producto
+            posiciones = np.flatnonzero(disponibles)
+            codigos, primeras = np.unique(codigos_producto[posiciones], return_index=True)
+            fila_por_producto = np.zeros(total_productos, dtype="int64")
+            fila_por_producto[codigos] = posiciones[primeras]
+            tiene_valor = np.zeros(total_productos, dtype=bool)
+            tiene_valor[codigos] = True
+            resultado[columna] = serie.iloc[fila_por_producto].reset_index(drop=True).where(tiene_valor)
+        elif funcion == "mean":
+            numeros = serie.to_numpy(dtype="float64", na_value=np.nan)
+            suma = np.bincount(codigos_producto[disponibles], weights=numeros[disponibles], minlength=total_productos)
+            conteo = np.bincount(codigos_producto[disponibles], minlength=total_productos)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                resultado[columna] = np.where(conteo > 0, suma / conteo, np.nan)
+        else:
+            raise ValueError(f"Función de agregación no soportada: {funcion}")
+
+    # Conservar el tipo entero de los valores cuando no hay celdas vacías, como lo hace pivot_table
+    entero = pd.api.types.is_integer_dtype(df[valor])
+    if entero and not np.isnan(matriz).any():
+        matriz = matriz.astype(df[valor].dtype)
+    for indice, nombre_almacen in enumerate(almacenes):
+        resultado[f"{prefijo}{nombre_almacen}"] = matriz[:, indice]
+    resultado[columna_total] = total.astype(df[valor].dtype) if entero else total
+
+    dfResultado = pd.DataFrame(resultado)
+    if solo_con_almacen:
+        dfResultado = dfResultado[(filas_por_celda.reshape(total_productos, total_almacenes) > 0).any(axis=1)].reset_index(drop=True)
+    return dfResultado
+
+def expandir_columnas(columnas, patrones, excluir=()):
+    """
+    Expande una lista de columnas con comodines ('Existencias en *') contra las columnas de un DataFrame.
+
+    :param columnas: Columnas disponibles, en el orden en que se devuelven las coincidencias.
+    :param patrones: Lista de nombres de columna o patrones con '*', '?' o '[...]'.
+    :param excluir: Columnas que no se incluyen aunque coincidan con un patrón.
+    :return: Lista de columnas sin duplicados; los nombres sin comodines se conservan aunque no existan.
+    """
+    columnas = [col for col in columnas if isinstance(col, str) and col not in excluir]
+    expandidas = []
+    for patron in patrones:
+        coincidencias = [col for col in columnas if fnmatch.fnmatchcase(col, patron)] if any(c in patron for c in "*?[") else [patron]
+        expandidas.extend(col for col in coincidencias if col not in expandidas)
+    return expandidas
+
+def ultimos_por_clave(df, clave, orden, por_dia=False, quitar=()):
+    """
+    Obtiene el registro más reciente de cada clave.
+
+    :param df: DataFrame de movimientos.
+    :param clave: Columna que identifica al registro (p. ej. 'Producto').
+    :param orden: Columna de fecha con la que se elige el más reciente.
+    :param por_dia: Si es True, la fecha se reduce al día, sin la hora.
+    :param quitar: Columnas que se eliminan antes.
+    :return: DataFrame con un registro por clave.
+    """
+    if quitar:
+        df = eliminar_columnas_df(df, list(quitar))
+    # En un DataFrame nuevo, sin modificar ni copiar el de entrada
+    if por_dia:
+        df = df.assign(**{orden: pd.to_datetime(df[orden]).dt.date})
+    df = df.sort_values(by=[clave, orden], ascending=[True, False])
+    return df.drop_duplicates(subset=clave, keep="first")
+
+def agregar_columnas_derivadas(df, derivadas, numericas=(), rellenar=None, constantes=None):
+    """
+    Agrega columnas calculadas con expresiones de `DataFrame.eval` (las columnas con espacios
+    se escriben entre acentos graves y las constantes con '@').
+
+    :param df: DataFrame al que se agregan las columnas; se modifica.
+    :param derivadas: Diccionario {columna: expresión}, calculadas en orden.
+    :param numericas: Columnas que se convierten a número antes (los valores no numéricos quedan vacíos).
+    :param rellenar: Diccionario {columna: valor} de columnas que deben ser numéricas y cuyos vacíos se rellenan.
+    :param constantes: Diccionario {nombre: valor} de las constantes de las expresiones.
+    :return: DataFrame con las columnas agregadas.
+    """
+    rellenar = rellenar or {}
+    for columna in numericas:
+        df[columna] = pd.to_numeric(df[columna], errors='coerce')
+    # Verificar que las columnas sean numéricas y manejar NaN
+    if all(pd.api.types.is_numeric_dtype(df[columna]) for columna in rellenar):
+        for columna, valor in rellenar.items():
+            df[columna] = df[columna].fillna(valor)
+        for columna, expresion in derivadas.items():
+            # El motor de Python evalúa con las mismas operaciones de pandas, con o sin numexpr
+            df[columna] = df.eval(expresion, engine="python", local_dict=constantes or {})
+        print(f"Columnas {list(derivadas)} creadas exitosamente.")
+    else:
+        print(f"Error: Las columnas {list(rellenar)} deben ser numéricas.")
+    return df
+
+def _nodo_pivote(espec, *dataframes):
+    dataframes = [df for df in dataframes if df is not None]
+    df = dataframes[0] if len(dataframes) == 1 else pd.concat(dataframes, ignore_index=True)
+    valor = espec["valor"]
+    if "rellenar" in espec:
+        df = df.assign(**{valor: df[valor].fillna(espec["rellenar"])})
+    return agregar_por_almacen(
+        df,
+        valor,
+        prefijo=espec["prefijo"],
+        columna_total=espec["total"],
+        metadatos=espec.get("metadatos"),
+        solo_con_almacen=espec.get("solo_con_almacen", False),
+        clave=espec.get("clave", "ProdConcat"),
+        almacen=espec.get("almacen", "Almacen"),
+    )
+
+def _nodo_agrupacion(espec, df):
+    # Solo se toman las columnas que se agrupan y se suman, sin copiar el DataFrame de entrada
+    claves = espec["claves"]
+    medidas = expandir_columnas(df.columns, espec["medidas"], excluir=claves)
+    dfAgrupado = filtrar_columnas_df(df, claves + medidas)
+    medidas = [columna for columna in medidas if columna in dfAgrupado.columns]
+
+    # Reemplazar NaN con un valor predeterminado antes de agrupar
+    if espec.get("relleno_claves") is not None:
+        dfAgrupado = dfAgrupado.fillna({columna: espec["relleno_claves"] for columna in claves})
+
+    return dfAgrupado.groupby(claves).agg(
+        {columna: espec.get("agregacion", "sum") for columna in medidas}
+    ).reset_index()
+
+def completar_union(espec, df):
+    """
+    Aplica a la unión de un nodo 'union' sus renombres, columnas numéricas, columnas derivadas y orden
+    de columnas. La comparten los motores de pandas y DuckDB, que solo difieren en cómo unen.
+
+    :param espec: Nodo 'union' de la especificación.
+    :param df: Resultado de la unión; se modifica.
+    :return: DataFrame con las columnas del reporte.
+    """
+    if "renombrar" in espec:
+        df.rename(columns=espec["renombrar"], inplace=True)
+    if "derivadas" in espec or "numericas" in espec:
+        df = agregar_columnas_derivadas(df, espec.get("derivadas", {}), espec.get("numericas", ()), espec.get("rellenar_derivadas"), espec.get("constantes"))
+    if "despues" in espec:
+        # Reorganizar las columnas una sola vez
+        df = df[insertar_columnas_despues(df.columns.tolist(), espec["despues"])]
+    return df
+
+def _nodo_union(espec, izquierda, derecha):
+    clave = espec.get("clave", "ProdConcat")
+    if "ultimos" in espec:
+        derecha = ultimos_por_clave(derecha, **espec["ultimos"])
+    if "columnas_derecha" in espec:
+        derecha = filtrar_columnas_df(derecha, espec["columnas_derecha"])
+    if "renombrar_derecha" in espec:
+        derecha = derecha.rename(columns=espec["renombrar_derecha"])
+
+    df = pd.merge(izquierda, derecha, on=clave, how=espec.get("como", "left"))
+    return completar_union(espec, df)
+
+def _nodo_funcion(espec, *dataframes):
+    return getattr(sys.modules[__name__], espec["funcion"])(*dataframes)
+
+# Operación de cada tipo de nodo de `especificaciones`
+OPERACIONES_NODO = {
+    "pivote": _nodo_pivote,
+    "agrupacion": _nodo_agrupacion,
+    "union": _nodo_union,
+    "funcion": _nodo_funcion,
+}
+
+def aplicar_especificacion(espec, *entradas):
+    """
+    Calcula un nodo de `especificaciones` sobre sus entradas.
+
+    :param espec: Nodo de la especificación (diccionario con 'tipo' y sus parámetros).
+    :param entradas: DataFrames de las entradas del nodo, en el orden de 'entradas'.
+    :return: DataFrame resultante.
+    """
+    return OPERACIONES_NODO[espec["tipo"]](espec, *entradas)
+
+@instrumentar
+def ejecutar_especificacion(espec, *entradas):
+    """
+    Etapa de un nodo sin función con nombre: aplica la especificación y registra su medición.
+    """
+    return aplicar_especificacion(espec, *entradas)
+
+@instrumentar
+def crearDataframeExistenciaFinal(dfExistencias):
+    # Agrupa en una sola pasada por ProdConcat: la existencia de cada almacén en su propia columna,
+    # la existencia global y el primer valor de 'Nombre', 'TipoProducto', etc.
+    return aplicar_especificacion(ESPECIFICACIONES["ExistenciasFinal"], dfExistencias)
+
+@instrumentar
+def creaReporteExistenciaConcentrada(dfExistenciasFinal):
+    # Suma por MARCA-MODELO-NOMBRE las existencias de cada almacén que traen los datos y la global
+    return aplicar_especificacion(ESPECIFICACIONES["ConcentradoExistencias"], dfExistenciasFinal)
+
+
+def creaDataFrameUltimasCompras(dfCompras):
+    """
+    Obtiene el registro de la compra más reciente de cada producto.
+
+    :param dfCompras: DataFrame de movimientos de compra (o de últimas compras ya calculadas).
+    :return: DataFrame con un registro por producto.
+    """
+    # Sin el almacén, con la fecha sin la hora y un registro por Producto, el de la fecha más reciente
+    return ultimos_por_clave(dfCompras, **ESPECIFICACIONES["ExistenciasComprasFinal"]["ultimos"])
+
+def cargar_ultimas_compras(ruta=ARCHIVO_ULTIMAS_COMPRAS):
+    """
+    Carga el historial de últimas compras por producto.
+
+    :param ruta: Ruta del historial en Parquet. Si es None, no se usa historial.
+    :return: Tupla (DataFrame de últimas compras o None, diccionario {huella: archivo} de los movimientos ya integrados).
+    """
+    if ruta is None or not os.path.isfile(ruta):
+        return None, {}
+
+    try:
+        dfUltimasCompras = pd.read_parquet(ruta)
+        with open(f"{os.path.splitext(ruta)[0]}.json", encoding="utf-8") as f:
+            archivosIntegrados = json.load(f)
+        print(f"Historial de últimas compras cargado: {len(dfUltimasCompras)} productos")
+        return dfUltimasCompras, archivosIntegrados
+    except Exception as e:
+        print(f"Error al cargar el historial de últimas compras {ruta}: {e}")
+        return None, {}
+
+@instrumentar
+def actualizar_ultimas_compras(dfUltimasCompras, dfComprasNuevas):
+    """
+    Integra movimientos de compra nuevos al historial de últimas compras.
+
+    Solo se ordenan los movimientos nuevos junto con un registro por producto del historial,
+    por lo que el costo depende de los movimientos nuevos y no de todas las compras anteriores.
+    Ante la misma fecha se conserva el registro del historial.
+
+    :param dfUltimasCompras: DataFrame de últimas compras del historial, o None.
+    :param dfComprasNuevas: DataFrame de movimientos de compra nuevos, o None.
+    :return: DataFrame de últimas compras actualizado, o None si no hay compras.
+    """
+    if dfComprasNuevas is None or dfComprasNuevas.empty:
+        return dfUltimasCompras
+
+    # Copia superficial: solo se reemplaza la columna de producto
+    dfComprasNuevas = convertir_columna_uppercase(dfComprasNuevas.copy(deep=False), "Producto")
+    if dfUltimasCompras is not None:
+        dfComprasNuevas = pd.concat([dfUltimasCompras, dfComprasNuevas], ignore_index=True)
+
+    return creaDataFrameUltimasCompras(dfComprasNuevas).reset_index(drop=True)
+
+def guardar_ultimas_compras(dfUltimasCompras, archivosIntegrados, ruta=ARCHIVO_ULTIMAS_COMPRAS):
+    """
+    Guarda el historial de últimas compras y los movimientos que ya se integraron.
+
+    :param dfUltimasCompras: DataFrame de últimas compras por producto.
+    :param archivosIntegrados: Diccionario {huella: archivo} de los movimientos integrados.
+    :param ruta: Ruta del historial en Parquet. Si es None, no se guarda.
+    :return: Ruta del historial guardado, o None si no se guardó.
+    """
+    if ruta is None or dfUltimasCompras is None:
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        dfUltimasCompras.to_parquet(ruta, index=False)
+        # Las huellas se guardan al final: si falla antes, los movimientos se vuelven a integrar sin cambiar el resultado
+        with open(f"{os.path.splitext(ruta)[0]}.json", "w", encoding="utf-8") as f:
+            json.dump(archivosIntegrados, f, ensure_ascii=False, indent=2)
+        print(f"Historial de últimas compras actualizado: {ruta}")
+        return ruta
+    except Exception as e:
+        print(f"Error al guardar el historial de últimas compras {ruta}: {e}")
+        return None
+
+def _columna_huella(serie):
+    # Representación estable entre formatos de origen y ejecuciones: números como float64 (4 y 4.0 son
+    # la misma fila), fechas en nanosegundos y texto sin espacios a los lados y en mayúsculas
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(serie.cat.categories.dtype)
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype("float64")
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.as_unit("ns").astype("int64")
+    return serie.astype("string").str.strip().str.upper()
+
+def calcular_huellas_filas(df, columnas):
+    """
+    Calcula una huella de 64 bits por fila a partir de las columnas clave, de forma vectorizada.
+
+    :param df: DataFrame con las filas.
+    :param columnas: Columnas clave que identifican una fila.
+    :return: Arreglo uint64 con la huella de cada fila, en el orden de `df`.
+    """
+    claves = pd.DataFrame({col: _columna_huella(df[col]) for col in columnas})
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy()
+
+def cargar_huellas_filas(ruta=ARCHIVO_HUELLAS_FILAS, dias=DIAS_HUELLAS_FILAS):
+    """
+    Carga las huellas de las filas contadas en ejecuciones anteriores, sin las que ya vencieron.
+
+    :param ruta: Ruta de las huellas en Parquet. Si es None o no existe, no hay huellas anteriores.
+    :param dias: Días que se conserva una huella. Si es None, no vencen.
+    :return: DataFrame con las columnas 'familia', 'huella', 'propietario', 'archivo' y 'fecha', o None.
+    """
+    if ruta is None or not os.path.isfile(ruta):
+        return None
+
+    try:
+        dfHuellas = pd.read_parquet(ruta)
+        if dias is not None:
+            dfHuellas = dfHuellas[dfHuellas["fecha"] >= pd.Timestamp(datetime.now().date()) - pd.Timedelta(days=dias)]
+        return dfHuellas.reset_index(drop=True)
+    except Exception as e:
+        print(f"Error al cargar las huellas de filas {ruta}: {e}")
+        return None
+
+def guardar_huellas_filas(dfHuellas, ruta=ARCHIVO_HUELLAS_FILAS):
+    """
+    Guarda las huellas de las filas contadas.
+
+    :param dfHuellas: DataFrame con las columnas 'familia', 'huella', 'propietario', 'archivo' y 'fecha'.
+    :param ruta: Ruta de las huellas en Parquet. Si es None, no se guardan.
+    :return: Ruta guardada, o None si no se guardó.
+    """
+    if ruta is None or dfHuellas is None:
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        # Familia, propietario y archivo se repiten en muchas filas; como categorías se guardan con diccionario
+        dfHuellas.astype({"familia": "category", "propietario": "category", "archivo": "category"}).to_parquet(ruta, index=False)
+        return ruta
+    except Exception as e:
+        print(f"Error al guardar las huellas de filas {ruta}: {e}")
+        return None
+
+@instrumentar
+def deduplicar_filas(df, columnas, huellasPrevias=None, propietarios=None):
+    """
+    Descarta las filas que ya aparecieron en otro archivo, identificándolas por la huella de sus columnas clave.
+
+    Cada huella pertenece al archivo en que apareció primero: en una ejecución anterior (`huellasPrevias`)
+    o, si es nueva, en el primer archivo de esta ejecución que la contiene. Se conservan todas las filas
+    de ese archivo, incluso las que se repiten dentro de él, por lo que volver a leer el mismo archivo
+    en la misma ejecución no cambia el resultado; de los demás archivos se descartan.
+
+    :param df: DataFrame fusionado con la columna COLUMNA_ARCHIVO_ORIGEN.
+    :param columnas: Columnas clave que identifican una fila.
+    :param huellasPrevias: Serie {huella: propietario} de las ejecuciones anteriores, o None.
+    :param propietarios: Diccionario {archivo: propietario} que identifica a cada archivo (p. ej. por la
+        huella de su contenido). Los archivos que no aparecen se identifican por su nombre.
+    :return: Tupla (DataFrame sin las filas repetidas, DataFrame con las filas leídas, duplicadas y conservadas
+        por archivo, DataFrame con las huellas nuevas y su 'propietario' y 'archivo').
+    """
+    propietarios = propietarios or {}
+    huellas = calcular_huellas_filas(df, columnas)
+    archivos = df[COLUMNA_ARCHIVO_ORIGEN].astype(str).to_numpy(dtype=object)
+    codigos, unicos = pd.factorize(archivos)
+    origenes = np.array([propietarios.get(archivo, archivo) for archivo in unicos], dtype=object)[codigos]
+
+    # Propietario de cada huella: el de la ejecución anterior o el primer archivo de esta ejecución
+    dfHuellas = pd.DataFrame({"huella": huellas, "propietario": origenes, "archivo": archivos})
+    duenos = dfHuellas.groupby("huella", sort=False)["propietario"].transform("first").to_numpy(dtype=object)
+    nuevas = ~np.zeros(len(huellas), dtype=bool)
+    if huellasPrevias is not None and len(huellasPrevias):
+        posiciones = pd.Index(huellasPrevias.index).get_indexer(huellas)
+        nuevas = posiciones < 0
+        duenos = np.where(nuevas, duenos, huellasPrevias.to_numpy(dtype=object)[posiciones])
+    duplicadas = duenos != origenes
+
+    dfConteo = pd.DataFrame({"Archivo": archivos, "Duplicadas": duplicadas}).groupby("Archivo", sort=False)["Duplicadas"].agg(["size", "sum"])
+    dfConteo = dfConteo.rename(columns={"size": "Filas", "sum": "Duplicadas"}).reset_index()
+    dfConteo["Conservadas"] = dfConteo["Filas"] - dfConteo["Duplicadas"]
+
+    dfHuellasNuevas = dfHuellas[nuevas].drop_duplicates("huella").reset_index(drop=True)
+    return df[~duplicadas].reset_index(drop=True), dfConteo, dfHuellasNuevas
+
+def deduplicar_familias(dataframes, columnas_por_familia, ruta=ARCHIVO_HUELLAS_FILAS, dias=DIAS_HUELLAS_FILAS, fecha=None, huellas_archivos=None):
+    """
+    Descarta de cada familia las filas repetidas entre archivos, informa cuántas filas aportó y cuántas
+    repitió cada archivo, y agrega las huellas nuevas al historial de huellas.
+
+    :param dataframes: Diccionario {familia: DataFrame fusionado con la columna COLUMNA_ARCHIVO_ORIGEN, o None}.
+    :param columnas_por_familia: Diccionario {familia: columnas clave}; las familias que no aparecen no se deduplican.
+    :param ruta: Ruta del historial de huellas. Si es None, solo se deduplica entre los archivos de esta ejecución.
+    :param dias: Días que se conserva una huella.
+    :param fecha: Fecha de la ejecución, con la que se registran las huellas nuevas; solo sirve para su vencimiento. Por defecto, hoy.
+    :param huellas_archivos: Diccionario {nombre de archivo: huella de su contenido} (ver `calcular_huella_archivo`).
+        Cada archivo se identifica por su contenido: una exportación nueva con el mismo nombre que una anterior
+        no es dueña de las filas que ya se contaron, y la misma exportación procesada otro día conserva las suyas.
+        Los archivos sin huella se identifican por su nombre.
+    :return: Tupla (diccionario {familia: DataFrame sin filas repetidas}, diccionario {familia: DataFrame de conteo por archivo}).
+    """
+    familias = [familia for familia in columnas_por_familia if dataframes.get(familia) is not None]
+    if not familias:
+        return dataframes, {}
+
+    dfHuellas = cargar_huellas_filas(ruta, dias)
+    fecha = pd.Timestamp(fecha or datetime.now()).normalize()
+    resultado, conteos, agregadas = dict(dataframes), {}, []
+    for familia in familias:
+        previas = None
+        if dfHuellas is not None:
+            previas = dfHuellas.loc[dfHuellas["familia"] == familia].set_index("huella")["propietario"]
+        propietarios = {}
+        for archivo in dataframes[familia][COLUMNA_ARCHIVO_ORIGEN].astype(str).unique():
+            propietario = (huellas_archivos or {}).get(archivo, archivo)
+            # Una copia idéntica de otro archivo de esta ejecución no es dueña de sus filas: se descartan como repetidas
+            propietarios[archivo] = propietario if propietario not in propietarios.values() else f"{propietario}:{archivo}"
+        resultado[familia], conteos[familia], nuevas = deduplicar_filas(dataframes[familia], columnas_por_familia[familia], previas, propietarios)
+        agregadas.append(pd.DataFrame({
+            "familia": familia,
+            "huella": nuevas["huella"].to_numpy(dtype="uint64"),
+            "propietario": nuevas["propietario"].to_numpy(dtype=object),
+            "archivo": nuevas["archivo"].to_numpy(dtype=object),
+            "fecha": fecha,
+        }))
+
+        dfConteo = conteos[familia]
+        print(f"Deduplicación de {familia} por {columnas_por_familia[familia]}: {int(dfConteo['Duplicadas'].sum())} de {int(dfConteo['Filas'].sum())} filas repetidas")
+        print(dfConteo.to_string(index=False))
+
+    if dfHuellas is not None:
+        agregadas.insert(0, dfHuellas.astype({"familia": object, "propietario": object, "archivo": object}))
+    guardar_huellas_filas(pd.concat(agregadas, ignore_index=True), ruta)
+    return resultado, conteos
+
+@instrumentar
+def creaDataFrameExistenciasComprasFinal(dfExistenciasFinal, dfCompras):
+    # Une a las existencias la última compra de cada producto, calcula el costo con IVA y la utilidad
+    # y coloca la cantidad después de la fecha de compra, y el costo y el precio al público después del precio de compra
+    return aplicar_especificacion(ESPECIFICACIONES["ExistenciasComprasFinal"], dfExistenciasFinal, dfCompras)
+
+
+@instrumentar
+def creaDataFrameVentasFinal(dfVentas, dfPiezasConsumidas):
+    # Los DataFrames pueden traer las filas de cada ticket o, con la lectura por bloques,
+    # las sumas por almacén y producto; el resultado es el mismo.
+    # Agrupa en una sola pasada por ProdConcat las cantidades vendidas y consumidas de cada almacén
+    # en su propia columna y las ventas totales
+    return aplicar_especificacion(ESPECIFICACIONES["VentasFinal"], dfVentas, dfPiezasConsumidas)
+
+@instrumentar
+def creaReporteExistenciasComprasVentasCC(dfExistenciasComprasFinal, dfVentasFinalMerged):
+    # Merge de dfExistenciasComprasFinal y dfVentasFinalMerged por 'ProdConcat'
+    return aplicar_especificacion(ESPECIFICACIONES["ExistenciasComprasVentas"], dfExistenciasComprasFinal, dfVentasFinalMerged)
+
+def _almacenes_reporte(df):
+    """
+    Devuelve los almacenes con columna de existencias ('Existencias en <almacén>') o de ventas
+    ('Ventas de <almacén>') en un reporte, en orden alfabético.
+    """
+    almacenes = set()
+    for columna in df.columns:
+        for prefijo in ("Existencias en ", "Ventas de "):
+            if isinstance(columna, str) and columna.startswith(prefijo):
+                almacenes.add(columna[len(prefijo):])
+    return sorted(almacenes)
+
+def _matriz_por_almacen(df, prefijo, almacenes):
+    # Matriz producto x almacén con las columnas '<prefijo><almacén>'; las vacías o faltantes quedan en 0
+    matriz = np.zeros((len(df), len(almacenes)))
+    for indice, almacen in enumerate(almacenes):
+        if f"{prefijo}{almacen}" in df.columns:
+            matriz[:, indice] = pd.to_numeric(df[f"{prefijo}{almacen}"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    return np.nan_to_num(matriz, nan=0.0)
+
+def _claves_celdas(productos, almacenes):
+    # Índice (producto, almacén) de cada celda de una matriz producto x almacén, fila por fila
+    return pd.MultiIndex.from_arrays([np.repeat(productos, len(almacenes)), np.tile(np.asarray(almacenes, dtype=object), len(productos))])
+
+def cargar_ventanas_velocidad(ruta=ARCHIVO_VELOCIDAD):
+    """
+    Carga las ventanas de ventas y existencias por producto y almacén de las ejecuciones anteriores.
+
+    :param ruta: Ruta de las ventanas en Parquet. Si es None o no existe, no hay ejecuciones anteriores.
+    :return: Diccionario con 'claves' (MultiIndex producto, almacén), 'ventas' y 'existencias'
+        (matrices celda x ejecución), 'fechas' (fecha de cada posición de la ventana) y 'posicion'
+        (posición de la última ejecución), o None.
+    """
+    if ruta is None or not os.path.isfile(ruta):
+        return None
+
+    try:
+        dfVentanas = pd.read_parquet(ruta)
+        with open(f"{os.path.splitext(ruta)[0]}.json", encoding="utf-8") as f:
+            estado = json.load(f)
+        tamano = len(estado["fechas"])
+        return {
+            "claves": pd.MultiIndex.from_arrays([dfVentanas["ProdConcat"].to_numpy(dtype=object), dfVentanas["Almacen"].to_numpy(dtype=object)]),
+            "ventas": dfVentanas[[f"Ventas_{i}" for i in range(tamano)]].to_numpy(dtype="float64"),
+            "existencias": dfVentanas[[f"Existencias_{i}" for i in range(tamano)]].to_numpy(dtype="float64"),
+            "fechas": estado["fechas"],
+            "posicion": estado["posicion"],
+        }
+    except Exception as e:
+        print(f"Error al cargar las ventanas de velocidad {ruta}: {e}")
+        return None
+
+def guardar_ventanas_velocidad(ventanas, ruta=ARCHIVO_VELOCIDAD):
+    """
+    Guarda las ventanas de ventas y existencias por producto y almacén.
+
+    :param ventanas: Diccionario devuelto por `actualizar_ventanas_velocidad`.
+    :param ruta: Ruta de las ventanas en Parquet. Si es None, no se guardan.
+    :return: Ruta guardada, o None si no se guardó.
+    """
+    if ruta is None or ventanas is None:
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tamano = len(ventanas["fechas"])
+        dfVentanas = pd.DataFrame({
+            "ProdConcat": ventanas["claves"].get_level_values(0).astype(str),
+            "Almacen": ventanas["claves"].get_level_values(1).astype(str),
+            **{f"Ventas_{i}": ventanas["ventas"][:, i] for i in range(tamano)},
+            **{f"Existencias_{i}": ventanas["existencias"][:, i] for i in range(tamano)},
+        })
+        dfVentanas.to_parquet(ruta, index=False)
+        with open(f"{os.path.splitext(ruta)[0]}.json", "w", encoding="utf-8") as f:
+            json.dump({"fechas": ventanas["fechas"], "posicion": ventanas["posicion"]}, f, ensure_ascii=False, indent=2)
+        return ruta
+    except Exception as e:
+        print(f"Error al guardar las ventanas de velocidad {ruta}: {e}")
+        return None
+
+def actualizar_ventanas_velocidad(ventanas, dfReporte, fecha, tamano=VENTANA_VELOCIDAD):
+    """
+    Integra las ventas y existencias por almacén de una ejecución a las ventanas de las anteriores.
+
+    Cada ventana guarda las últimas `tamano` ejecuciones en una posición circular: la ejecución
+    nueva reemplaza a la más antigua (o a la del mismo día, si se vuelve a ejecutar) para todas
+    las celdas a la vez, por lo que el costo depende del número de celdas y no del historial.
+    Las celdas que quedan en cero en toda la ventana se descartan.
+
+    :param ventanas: Ventanas de las ejecuciones anteriores (ver `cargar_ventanas_velocidad`), o None.
+    :param dfReporte: Reporte con 'ProdConcat' y las columnas 'Existencias en <almacén>' y 'Ventas de <almacén>'.
+    :param fecha: Fecha de la ejecución ('AAAA-MM-DD').
+    :param tamano: Número de ejecuciones de la ventana.
+    :return: Ventanas actualizadas.
+    """
+    if ventanas is None or len(ventanas["fechas"]) != tamano:
+        if ventanas is not None:
+            print(f"La ventana de velocidad cambió de {len(ventanas['fechas'])} a {tamano} ejecuciones; se reinicia el historial.")
+        ventanas = {
+            "claves": pd.MultiIndex.from_arrays([np.array([], dtype=object), np.array([], dtype=object)]),
+            "ventas": np.zeros((0, tamano)),
+            "existencias": np.zeros((0, tamano)),
+            "fechas": [None] * tamano,
+            "posicion": -1,
+        }
+
+    # La misma fecha reemplaza su posición; una fecha nueva ocupa la de la ejecución más antigua
+    fechas = list(ventanas["fechas"])
+    posicion = ventanas["posicion"]
+    if posicion < 0 or fechas[posicion] != fecha:
+        posicion = (posicion + 1) % tamano
+        fechas[posicion] = fecha
+
+    almacenes = _almacenes_reporte(dfReporte)
+    productos = dfReporte["ProdConcat"].astype(str).to_numpy(dtype=object)
+    ventas = _matriz_por_almacen(dfReporte, "Ventas de ", almacenes).ravel()
+    existencias = _matriz_por_almacen(dfReporte, "Existencias en ", almacenes).ravel()
+    con_valor = (ventas != 0) | (existencias != 0)
+    claves = _claves_celdas(productos, almacenes)[con_valor]
+
+    # Celdas nuevas al final; la posición de la ejecución se vacía y se llena con sus valores
+    nuevas = claves[ventanas["claves"].get_indexer(claves) < 0]
+    todas = ventanas["claves"].append(nuevas)
+    matrizVentas = np.vstack([ventanas["ventas"], np.zeros((len(nuevas), tamano))])
+    matrizExistencias = np.vstack([ventanas["existencias"], np.zeros((len(nuevas), tamano))])
+    matrizVentas[:, posicion] = 0
+    matrizExistencias[:, posicion] = 0
+    filas = todas.get_indexer(claves)
+    matrizVentas[filas, posicion] = ventas[con_valor]
+    matrizExistencias[filas, posicion] = existencias[con_valor]
+
+    conservar = (matrizVentas != 0).any(axis=1) | (matrizExistencias != 0).any(axis=1)
+    return {
+        "claves": todas[conservar],
+        "ventas": matrizVentas[conservar],
+        "existencias": matrizExistencias[conservar],
+        "fechas": fechas,
+        "posicion": posicion,
+    }
+
+def dias_ventana(fechas, dias_periodo=DIAS_PERIODO_VENTAS):
+    """
+    Calcula los días de ventas que cubre la ventana a partir de las fechas de sus ejecuciones:
+    los días entre la primera y la última, más el periodo de la primera, que se estima como
+    la separación promedio entre ejecuciones. Así la velocidad es correcta con ejecuciones
+    mensuales, semanales o diarias.
+
+    :param fechas: Fechas de las posiciones de la ventana ('AAAA-MM-DD' o None si está vacía).
+    :param dias_periodo: Días que se suponen cuando la ventana solo tiene una ejecución.
+    :return: Días de la ventana (0 si no tiene ejecuciones).
+    """
+    fechas = sorted(pd.Timestamp(fecha) for fecha in fechas if fecha is not None)
+    if len(fechas) < 2:
+        return len(fechas) * dias_periodo
+    return (fechas[-1] - fechas[0]).days * len(fechas) / (len(fechas) - 1)
+
+def calcular_metricas_velocidad(dfReporte, ventanas, dias_periodo=DIAS_PERIODO_VENTAS, dias_reorden=DIAS_REORDEN):
+    """
+    Calcula, para cada producto del reporte, la velocidad de venta (unidades por día), los días
+    de cobertura de la existencia actual y la marca de reorden por almacén y globales, además del
+    sell-through y la existencia promedio globales de la ventana.
+
+    :param dfReporte: Reporte con 'ProdConcat' y las columnas por almacén de existencias y ventas.
+    :param ventanas: Ventanas actualizadas con la ejecución del reporte.
+    :param dias_periodo: Días de ventas que se suponen cuando la ventana solo tiene una ejecución.
+    :param dias_reorden: Días de cobertura por debajo de los cuales se marca el reorden.
+    :return: DataFrame con las métricas, en el mismo orden de filas que el reporte.
+    """
+    almacenes = _almacenes_reporte(dfReporte)
+    productos = dfReporte["ProdConcat"].astype(str).to_numpy(dtype=object)
+    ejecuciones = sum(fecha is not None for fecha in ventanas["fechas"])
+    dias = dias_ventana(ventanas["fechas"], dias_periodo)
+
+    # Ventas y existencias de la ventana de cada celda del reporte; las celdas sin historial suman 0
+    filas = ventanas["claves"].get_indexer(_claves_celdas(productos, almacenes))
+    con_historial = filas >= 0
+    ventasVentana = np.zeros(len(filas))
+    existenciasVentana = np.zeros(len(filas))
+    ventasVentana[con_historial] = ventanas["ventas"][filas[con_historial]].sum(axis=1)
+    existenciasVentana[con_historial] = ventanas["existencias"][filas[con_historial]].sum(axis=1)
+    ventasVentana = ventasVentana.reshape(len(productos), len(almacenes))
+    existenciasVentana = existenciasVentana.reshape(len(productos), len(almacenes))
+    existencias = _matriz_por_almacen(dfReporte, "Existencias en ", almacenes)
+
+    def velocidad_y_cobertura(ventas, existencia):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            velocidad = ventas / dias if dias else np.full(ventas.shape, np.nan)
+            cobertura = np.where(velocidad > 0, existencia / velocidad, np.nan)
+        return velocidad, cobertura, np.nan_to_num(cobertura, nan=np.inf) < dias_reorden
+
+    velocidad, cobertura, reorden = velocidad_y_cobertura(ventasVentana, existencias)
+    ventasGlobal, existenciaGlobal = ventasVentana.sum(axis=1), existencias.sum(axis=1)
+    velocidadGlobal, coberturaGlobal, reordenGlobal = velocidad_y_cobertura(ventasGlobal, existenciaGlobal)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sellThrough = np.where(ventasGlobal + existenciaGlobal > 0, ventasGlobal / (ventasGlobal + existenciaGlobal) * 100, np.nan)
+
+    metricas = {}
+    for indice, almacen in enumerate(almacenes):
+        metricas[f"Velocidad en {almacen}"] = velocidad[:, indice]
+    for indice, almacen in enumerate(almacenes):
+        metricas[f"Días de Cobertura en {almacen}"] = cobertura[:, indice]
+    for indice, almacen in enumerate(almacenes):
+        metricas[f"Reordenar en {almacen}"] = reorden[:, indice]
+    metricas["Velocidad Global"] = velocidadGlobal
+    metricas["Días de Cobertura Global"] = coberturaGlobal
+    metricas["Reordenar Global"] = reordenGlobal
+    metricas["Sell-through Global"] = sellThrough
+    metricas["Existencia Promedio Global"] = existenciasVentana.sum(axis=1) / ejecuciones if ejecuciones else np.nan
+    return pd.DataFrame(metricas, index=dfReporte.index)
+
+@instrumentar
+def creaReporteVelocidadInventario(dfExistenciasComprasVentas, ruta=ARCHIVO_VELOCIDAD, fecha=None, ventana=VENTANA_VELOCIDAD):
+    """
+    Agrega al reporte de existencias, compras y ventas las métricas de velocidad del inventario
+    sobre las últimas `ventana` ejecuciones, e integra esta ejecución a las ventanas guardadas.
+
+    :param dfExistenciasComprasVentas: Reporte de existencias, compras y ventas.
+    :param ruta: Ruta de las ventanas. Si es None, la ventana solo contiene esta ejecución y no se guarda.
+    :param fecha: Fecha de la ejecución. Si es None, se usa la fecha actual.
+    :param ventana: Número de ejecuciones de la ventana. Si es None, el reporte se devuelve sin cambios.
+    :return: Reporte con las columnas de velocidad, cobertura y reorden.
+    """
+    if not ventana:
+        return dfExistenciasComprasVentas
+
+    fecha = pd.Timestamp(fecha or datetime.now()).date().isoformat()
+    ventanas = actualizar_ventanas_velocidad(cargar_ventanas_velocidad(ruta), dfExistenciasComprasVentas, fecha, ventana)
+    guardar_ventanas_velocidad(ventanas, ruta)
+    dfMetricas = calcular_metricas_velocidad(dfExistenciasComprasVentas, ventanas)
+    return pd.concat([dfExistenciasComprasVentas, dfMetricas], axis=1)
+
+
+def _recodificar_claves(codigos, valores, tipo):
+    """
+    Convierte los códigos de `pd.factorize` y sus valores únicos a un Categorical del tipo indicado.
+
+    :param codigos: Códigos por fila devueltos por `pd.factorize` (-1 para valores vacíos).
+    :param valores: Valor de cada código, ya transformado.
+    :param tipo: CategoricalDtype de destino.
+    :return: Categorical con los valores de cada fila.
+    """
+    # El -1 agregado al final hace que los códigos vacíos sigan vacíos
+    mapeo = np.append(tipo.categories.get_indexer(valores), -1)
+    return pd.Categorical.from_codes(mapeo[codigos], dtype=tipo)
+
+def _mayusculas(valores):
+    # Los valores que no son texto quedan vacíos, igual que con Series.str.upper()
+    return pd.Index(pd.Series(valores, dtype=object).str.upper(), dtype=object)
+
+def convertir_columna_uppercase(df, columna="ProdConcat"):
+    """
+    Convierte todos los valores de una columna de un DataFrame a mayúsculas.
+
+    La conversión se hace solo sobre los valores únicos de la columna; las columnas
+    categóricas conservan su tipo.
+
+    :param df: DataFrame que contiene la columna a transformar.
+    :param columna: Nombre de la columna que se desea convertir a mayúsculas. Por defecto, 'ProdConcat'.
+    :return: DataFrame con la columna transformada.
+    """
+    try:
+        if columna not in df.columns:
+            raise ValueError(f"La columna '{columna}' no existe en el DataFrame.")
+
+        # Convertir a mayúsculas solo los valores únicos de la columna
+        codigos, unicos = pd.factorize(df[columna])
+        mayusculas = _mayusculas(unicos)
+
+        if isinstance(df[columna].dtype, pd.CategoricalDtype):
+            tipo = pd.CategoricalDtype(mayusculas.dropna().unique().sort_values())
+            df[columna] = _recodificar_claves(codigos, mayusculas, tipo)
+        else:
+            df[columna] = mayusculas.take(codigos, allow_fill=True, fill_value=None).astype(df[columna].dtype)
+
+        return df
+    except Exception as e:
+        print(f"Error al convertir la columna '{columna}' a mayúsculas: {e}")
+        return df
+
+@instrumentar
+def codificar_claves_compartidas(dataframes, columnas, mayusculas=False):
+    """
+    Convierte una columna de clave de varios DataFrames a un mismo tipo categórico.
+
+    Cada columna se factoriza una sola vez; con los valores únicos de todas se construye
+    un diccionario de claves ordenado que comparten todos los DataFrames, de modo que
+    las uniones y agrupaciones posteriores trabajan sobre códigos enteros.
+
+    :param dataframes: Lista de DataFrames (los None se ignoran).
+    :param columnas: Lista con el nombre de la columna de clave de cada DataFrame.
+    :param mayusculas: Si es True, las claves se convierten a mayúsculas (solo sobre los valores únicos).
+    :return: CategoricalDtype compartido.
+    """
+    pares = [(df, columna) for df, columna in zip(dataframes, columnas) if df is not None]
+
+    factorizados = []
+    for df, columna in pares:
+        codigos, unicos = pd.factorize(df[columna])
+        valores = _mayusculas(unicos) if mayusculas else pd.Index(pd.Series(unicos, dtype=object), dtype=object)
+        factorizados.append((codigos, valores))
+
+    # Diccionario único de claves, ordenado para conservar el orden de las agrupaciones
+    todas = [valores for _, valores in factorizados]
+    categorias = todas[0].append(todas[1:]) if todas else pd.Index([], dtype=object)
+    tipo = pd.CategoricalDtype(categorias.dropna().unique().sort_values())
+
+    for (df, columna), (codigos, valores) in zip(pares, factorizados):
+        df[columna] = _recodificar_claves(codigos, valores, tipo)
+
+    print(f"Diccionario de claves compartido: {len(tipo.categories)} valores en {len(pares)} DataFrames")
+    return tipo
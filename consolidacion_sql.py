@@ -0,0 +1,362 @@
+# %%
+"""
+Motor SQL de las transformaciones del reporte.
+
+Los nodos de `especificaciones` (tablas por almacén, agrupaciones, última compra por producto
+y uniones) se ejecutan como consultas SQL de DuckDB construidas a partir de la misma
+especificación, sobre copias en Parquet de los DataFrames de entrada, sin servidor y con
+agregaciones y uniones en paralelo.
+
+Las consultas calculan las agregaciones, el orden y las posiciones de las filas que se unen;
+los valores de texto y fechas se toman de los DataFrames originales, por lo que los tipos
+del resultado son los mismos que con pandas. Los renombres, las columnas derivadas (costo y
+utilidad) y el orden de columnas los aplica `consolidacion.completar_union`, igual que con pandas.
+
+Las sumas se acumulan en el orden original de las filas (`sum(... ORDER BY fila)` como `np.bincount`
+y `fsum(... ORDER BY fila)`, con compensación de Kahan, como `groupby().sum()`), por lo que dan
+exactamente los mismos valores que pandas sin importar cuántos hilos use DuckDB. Solo si DuckDB no
+está instalado la etapa se ejecuta con pandas; cualquier otro error detiene la etapa.
+"""
+import os
+import tempfile
+import functools
+import contextlib
+import numpy as np
+import pandas as pd
+
+import consolidacion
+from consolidacion import instrumentar
+
+# Carpeta donde se preparan las copias en Parquet de las entradas de cada consulta. None usa la carpeta temporal del sistema.
+DIRECTORIO_PREPARACION = None
+
+# Columna con la posición original de cada fila en las copias preparadas
+COLUMNA_FILA = "__fila"
+
+def disponible():
+    """
+    Indica si DuckDB está instalado.
+    """
+    try:
+        import duckdb  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _identificador(nombre):
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+def _literal(valor):
+    return "'" + str(valor).replace("'", "''") + "'"
+
+def _numero(columna, tabla=None):
+    # Valor numérico como DOUBLE, con NaN como vacío igual que en pandas
+    referencia = _identificador(columna) if tabla is None else f"{tabla}.{_identificador(columna)}"
+    return f"CASE WHEN isnan(CAST({referencia} AS DOUBLE)) THEN NULL ELSE CAST({referencia} AS DOUBLE) END"
+
+def _posiciones(serie):
+    # Posiciones de filas devueltas por una consulta; las vacías quedan en -1
+    return serie.to_numpy(dtype="int64", na_value=-1)
+
+def _tomar_filas(df, posiciones):
+    """
+    Toma las filas de un DataFrame por posición; las posiciones -1 quedan vacías,
+    con el mismo cambio de tipo que hace `pd.merge` en las filas sin coincidencia.
+    """
+    return df.reset_index(drop=True).reindex(posiciones).reset_index(drop=True)
+
+@contextlib.contextmanager
+def _conexion(**tablas):
+    """
+    Prepara cada DataFrame como archivo Parquet y abre una conexión de DuckDB en memoria
+    con una vista por tabla. Al salir se cierra la conexión y se eliminan las copias.
+
+    :param tablas: DataFrames a preparar, por nombre de vista.
+    :return: Conexión de DuckDB.
+    """
+    import duckdb
+
+    with tempfile.TemporaryDirectory(prefix="consolidacion_sql_", dir=DIRECTORIO_PREPARACION) as directorio:
+        conexion = duckdb.connect()
+        try:
+            for nombre, df in tablas.items():
+                ruta = os.path.join(directorio, f"{nombre}.parquet")
+                df.assign(**{COLUMNA_FILA: np.arange(len(df))}).to_parquet(ruta, index=False)
+                conexion.execute(f"CREATE VIEW {nombre} AS SELECT * FROM read_parquet({_literal(ruta)})")
+            yield conexion
+        finally:
+            conexion.close()
+
+def _con_respaldo_pandas(funcion):
+    """
+    Ejecuta la etapa con DuckDB y, solo si DuckDB no está instalado, con la función de pandas del mismo nombre.
+    """
+    funcion_pandas = getattr(consolidacion, funcion.__name__)
+    funcion_pandas = getattr(funcion_pandas, "__wrapped__", funcion_pandas)
+
+    @functools.wraps(funcion)
+    def etapa(*args, **kwargs):
+        try:
+            return funcion(*args, **kwargs)
+        except ImportError:
+            print(f"DuckDB no está instalado, {funcion.__name__} se ejecutará con pandas.")
+        return funcion_pandas(*args, **kwargs)
+
+    return etapa
+
+def _tipo_clave_union(izquierda, derecha, clave="ProdConcat", clave_derecha=None):
+    # Tipo de la clave tras `pd.merge`, que depende solo de los tipos de ambas claves
+    clave_derecha = clave_derecha or clave
+    vacia = pd.merge(
+        izquierda[[clave]].iloc[:0],
+        derecha[[clave_derecha]].iloc[:0].rename(columns={clave_derecha: clave}),
+        on=clave,
+        how="left"
+    )
+    return vacia[clave].dtype
+
+def _tipo_entero(*series):
+    # Tipo entero del resultado si todos los valores de origen son enteros, o None
+    if all(pd.api.types.is_integer_dtype(serie) for serie in series):
+        return np.result_type(*(serie.dtype for serie in series))
+    return None
+
+def agregar_por_almacen(tablas, valor, prefijo, columna_total, metadatos=None, solo_con_almacen=False, clave="ProdConcat", almacen="Almacen"):
+    """
+    Versión SQL de `consolidacion.agregar_por_almacen`: una columna por almacén, el total del
+    producto y sus datos descriptivos, con una fila por producto ordenada por clave.
+
+    :param tablas: Lista de DataFrames con las mismas columnas; se agregan como si estuvieran concatenados.
+    :return: DataFrame con el mismo contenido y tipos que la versión de pandas.
+    """
+    metadatos = metadatos or {}
+    columnas = [clave, almacen, valor] + list(metadatos)
+    nombres = [f"t{indice}" for indice in range(len(tablas))]
+
+    with _conexion(**{nombre: df[columnas] for nombre, df in zip(nombres, tablas)}) as conexion:
+        # Las filas de todas las tablas se numeran en el orden en que quedarían al concatenarlas
+        desplazamientos = np.cumsum([0] + [len(df) for df in tablas])[:-1]
+        conexion.execute("CREATE VIEW datos AS " + " UNION ALL ".join(
+            f"SELECT * REPLACE ({COLUMNA_FILA} + {desplazamiento} AS {COLUMNA_FILA}) FROM {nombre}"
+            for nombre, desplazamiento in zip(nombres, desplazamientos)
+        ))
+
+        almacenes = [fila[0] for fila in conexion.execute(
+            f"SELECT DISTINCT {_identificador(almacen)} FROM datos WHERE {_identificador(almacen)} IS NOT NULL ORDER BY 1"
+        ).fetchall()]
+
+        # Las sumas se acumulan en el orden de las filas, igual que np.bincount, para dar los mismos valores
+        valor_sin_nan = f"coalesce({_numero(valor)}, 0)"
+        seleccion = [f"arg_min({COLUMNA_FILA}, {COLUMNA_FILA}) AS primera"]
+        for indice, (columna, funcion) in enumerate(metadatos.items()):
+            if funcion == "first":
+                vacio = f"{_identificador(columna)} IS NULL"
+                if pd.api.types.is_float_dtype(tablas[0][columna]):
+                    vacio = f"({vacio} OR isnan({_identificador(columna)}))"
+                seleccion.append(f"arg_min({COLUMNA_FILA}, {COLUMNA_FILA}) FILTER (WHERE NOT {vacio}) AS m{indice}")
+            elif funcion == "mean":
+                seleccion.append(f"sum({_numero(columna)} ORDER BY {COLUMNA_FILA}) / count({_numero(columna)}) AS m{indice}")
+            else:
+                raise ValueError(f"Función de agregación no soportada: {funcion}")
+        for indice in range(len(almacenes)):
+            seleccion.append(f"sum({valor_sin_nan} ORDER BY {COLUMNA_FILA}) FILTER (WHERE {_identificador(almacen)} = $a{indice}) AS a{indice}")
+        filtro_total = f" FILTER (WHERE {_identificador(almacen)} IS NOT NULL)" if solo_con_almacen else ""
+        seleccion.append(f"coalesce(sum({valor_sin_nan} ORDER BY {COLUMNA_FILA}){filtro_total}, 0) AS total")
+        seleccion.append(f"count({_identificador(almacen)}) AS filas_con_almacen")
+
+        agregado = conexion.execute(
+            f"SELECT {', '.join(seleccion)} FROM datos WHERE {_identificador(clave)} IS NOT NULL "
+            f"GROUP BY {_identificador(clave)} ORDER BY {_identificador(clave)}",
+            {f"a{indice}": nombre_almacen for indice, nombre_almacen in enumerate(almacenes)}
+        ).df()
+
+    # Los valores de texto se toman de las filas originales para conservar sus tipos
+    if len(tablas) == 1:
+        origen = tablas[0]
+    else:
+        origen = pd.concat([df[[clave] + list(metadatos)] for df in tablas], ignore_index=True)
+    resultado = {clave: origen[clave].iloc[_posiciones(agregado["primera"])].reset_index(drop=True)}
+    for indice, (columna, funcion) in enumerate(metadatos.items()):
+        if funcion == "first":
+            resultado[columna] = _tomar_filas(origen[[columna]], _posiciones(agregado[f"m{indice}"]))[columna]
+        else:
+            resultado[columna] = agregado[f"m{indice}"].to_numpy(dtype="float64", na_value=np.nan)
+
+    # Conservar el tipo entero de los valores cuando no hay celdas vacías, como lo hace pivot_table
+    entero = _tipo_entero(*(df[valor] for df in tablas))
+    matriz = agregado[[f"a{indice}" for indice in range(len(almacenes))]].to_numpy(dtype="float64", na_value=np.nan)
+    if entero is not None and not np.isnan(matriz).any():
+        matriz = matriz.astype(entero)
+    for indice, nombre_almacen in enumerate(almacenes):
+        resultado[f"{prefijo}{nombre_almacen}"] = matriz[:, indice]
+    total = agregado["total"].to_numpy(dtype="float64")
+    resultado[columna_total] = total.astype(entero) if entero is not None else total
+
+    dfResultado = pd.DataFrame(resultado)
+    if solo_con_almacen:
+        dfResultado = dfResultado[agregado["filas_con_almacen"].to_numpy() > 0].reset_index(drop=True)
+    return dfResultado
+
+def _nodo_pivote(espec, *dataframes):
+    # Los DataFrames se agregan como si estuvieran concatenados, sin copiarlos
+    tablas = [df for df in dataframes if df is not None]
+    valor = espec["valor"]
+    if espec.get("rellenar", 0) != 0:
+        # La agregación ya suma los vacíos como 0; otro valor de relleno se aplica antes
+        tablas = [df.assign(**{valor: df[valor].fillna(espec["rellenar"])}) for df in tablas]
+    return agregar_por_almacen(
+        tablas,
+        valor,
+        prefijo=espec["prefijo"],
+        columna_total=espec["total"],
+        metadatos=espec.get("metadatos"),
+        solo_con_almacen=espec.get("solo_con_almacen", False),
+        clave=espec.get("clave", "ProdConcat"),
+        almacen=espec.get("almacen", "Almacen"),
+    )
+
+def _nodo_agrupacion(espec, df):
+    # Las consultas solo suman; las demás agregaciones se calculan con pandas
+    if espec.get("agregacion", "sum") != "sum":
+        return consolidacion.aplicar_especificacion(espec, df)
+    # Las medidas por almacén se expanden contra las columnas de los datos, igual que con pandas
+    claves = espec["claves"]
+    columnas = consolidacion.expandir_columnas(df.columns, espec["medidas"], excluir=claves)
+
+    # Reemplazar NaN con un valor predeterminado antes de agrupar
+    dfClaves = df[claves]
+    if espec.get("relleno_claves") is not None:
+        dfClaves = dfClaves.fillna(espec["relleno_claves"])
+
+    # Suma compensada (Kahan) en el orden de las filas, igual que groupby().sum()
+    with _conexion(datos=pd.concat([dfClaves, df[columnas]], axis=1)) as conexion:
+        agregado = conexion.execute(
+            f"SELECT arg_min({COLUMNA_FILA}, {COLUMNA_FILA}) AS primera, "
+            + ", ".join(f"coalesce(fsum({_numero(columna)} ORDER BY {COLUMNA_FILA}), 0) AS s{indice}" for indice, columna in enumerate(columnas))
+            + " FROM datos GROUP BY " + ", ".join(map(_identificador, claves))
+            + " ORDER BY " + ", ".join(map(_identificador, claves))
+        ).df()
+
+    dfAgrupado = dfClaves.iloc[_posiciones(agregado["primera"])].reset_index(drop=True)
+    for indice, columna in enumerate(columnas):
+        suma = agregado[f"s{indice}"].to_numpy(dtype="float64")
+        entero = _tipo_entero(df[columna])
+        dfAgrupado[columna] = suma.astype(entero) if entero is not None else suma
+    return dfAgrupado
+
+def _nodo_union(espec, izquierda, derecha):
+    """
+    Une dos entradas de un nodo 'union' en DuckDB: la consulta calcula qué fila de la derecha
+    (o, con 'ultimos', qué registro más reciente por clave) corresponde a cada fila de la izquierda;
+    los valores se toman de los DataFrames originales. Los renombres, las columnas derivadas y el
+    orden de columnas los aplica `consolidacion.completar_union`, igual que con pandas.
+    """
+    clave = espec.get("clave", "ProdConcat")
+    renombrar_derecha = espec.get("renombrar_derecha", {})
+    clave_derecha = next((columna for columna, nueva in renombrar_derecha.items() if nueva == clave), clave)
+    ultimos = espec.get("ultimos")
+
+    # Columnas de la derecha que se unen, en el orden en que las deja pandas (sin la clave)
+    columnas = espec.get("columnas_derecha") or [col for col in derecha.columns if col not in (ultimos or {}).get("quitar", ())]
+    faltantes = [col for col in columnas if col not in derecha.columns]
+    if faltantes:
+        raise KeyError(f"Faltan columnas en la entrada derecha: {faltantes}")
+    columnas = [col for col in columnas if col != clave_derecha]
+    repetidas = [renombrar_derecha.get(col, col) for col in columnas if renombrar_derecha.get(col, col) in izquierda.columns]
+    if espec.get("como", "left") != "left" or repetidas:
+        # Las uniones que no son 'left' y las columnas repetidas (que pandas renombra con sufijos) se calculan con pandas
+        return consolidacion.aplicar_especificacion(espec, izquierda, derecha)
+
+    tablaDerecha = derecha[list(dict.fromkeys([clave_derecha] + ([ultimos["orden"]] if ultimos else [])))]
+    if ultimos and ultimos.get("por_dia"):
+        # La fecha se interpreta igual que con pandas antes de reducirla al día
+        tablaDerecha = tablaDerecha.assign(**{ultimos["orden"]: pd.to_datetime(tablaDerecha[ultimos["orden"]])})
+    with _conexion(izquierda=izquierda[[clave]], derecha=tablaDerecha) as conexion:
+        union = f"d.{_identificador(clave_derecha)} = i.{_identificador(clave)}"
+        origen = "derecha"
+        if ultimos:
+            orden = _identificador(ultimos["orden"])
+            if ultimos.get("por_dia"):
+                orden = f"CAST({orden} AS DATE)"
+            # Registro más reciente de cada clave y, en empate, el primero
+            origen = f"""(
+                SELECT *, row_number() OVER (
+                    PARTITION BY {_identificador(clave_derecha)} ORDER BY {orden} DESC NULLS LAST, {COLUMNA_FILA}
+                ) AS orden_clave
+                FROM derecha
+            )"""
+            union += " AND d.orden_clave = 1"
+        uniones = conexion.execute(f"""
+            SELECT i.{COLUMNA_FILA} AS fila_izquierda, d.{COLUMNA_FILA} AS fila_derecha
+            FROM izquierda i
+            LEFT JOIN {origen} d ON {union}
+            ORDER BY fila_izquierda, fila_derecha
+        """).df()
+
+    filasDerecha = _posiciones(uniones["fila_derecha"])
+    dfDerecha = _tomar_filas(derecha[columnas], filasDerecha)
+    if ultimos and ultimos.get("por_dia") and ultimos["orden"] in columnas:
+        # La fecha se guarda sin la hora, solo en las filas con coincidencia
+        conCoincidencia = filasDerecha >= 0
+        fechas = np.full(len(filasDerecha), np.nan, dtype=object)
+        fechas[conCoincidencia] = pd.to_datetime(derecha[ultimos["orden"]].iloc[filasDerecha[conCoincidencia]]).dt.date.to_numpy()
+        dfDerecha[ultimos["orden"]] = fechas
+
+    df = pd.concat([
+        izquierda.iloc[_posiciones(uniones["fila_izquierda"])].reset_index(drop=True),
+        dfDerecha.rename(columns=renombrar_derecha),
+    ], axis=1)
+    df[clave] = df[clave].astype(_tipo_clave_union(izquierda, derecha, clave=clave, clave_derecha=clave_derecha))
+    return consolidacion.completar_union(espec, df)
+
+# Operación de cada tipo de nodo que se calcula en DuckDB; los demás tipos (y las variantes que las
+# consultas no cubren, ver cada operación) se calculan con pandas
+OPERACIONES_NODO = {
+    "pivote": _nodo_pivote,
+    "agrupacion": _nodo_agrupacion,
+    "union": _nodo_union,
+}
+
+def aplicar_especificacion(espec, *entradas):
+    """
+    Versión de DuckDB de `consolidacion.aplicar_especificacion`: las agregaciones y las uniones de los
+    nodos se calculan con consultas SQL construidas a partir de la especificación.
+
+    :param espec: Nodo de la especificación.
+    :param entradas: DataFrames de las entradas del nodo, en el orden de 'entradas'.
+    :return: DataFrame resultante, con el mismo contenido y tipos que con pandas.
+    """
+    operacion = OPERACIONES_NODO.get(espec["tipo"])
+    if operacion is None:
+        return consolidacion.aplicar_especificacion(espec, *entradas)
+    return operacion(espec, *entradas)
+
+@instrumentar
+@_con_respaldo_pandas
+def ejecutar_especificacion(espec, *entradas):
+    return aplicar_especificacion(espec, *entradas)
+
+@instrumentar
+@_con_respaldo_pandas
+def crearDataframeExistenciaFinal(dfExistencias):
+    return aplicar_especificacion(consolidacion.ESPECIFICACIONES["ExistenciasFinal"], dfExistencias)
+
+@instrumentar
+@_con_respaldo_pandas
+def creaReporteExistenciaConcentrada(dfExistenciasFinal):
+    return aplicar_especificacion(consolidacion.ESPECIFICACIONES["ConcentradoExistencias"], dfExistenciasFinal)
+
+@instrumentar
+@_con_respaldo_pandas
+def creaDataFrameExistenciasComprasFinal(dfExistenciasFinal, dfCompras):
+    return aplicar_especificacion(consolidacion.ESPECIFICACIONES["ExistenciasComprasFinal"], dfExistenciasFinal, dfCompras)
+
+@instrumentar
+@_con_respaldo_pandas
+def creaDataFrameVentasFinal(dfVentas, dfPiezasConsumidas):
+    return aplicar_especificacion(consolidacion.ESPECIFICACIONES["VentasFinal"], dfVentas, dfPiezasConsumidas)
+
+@instrumentar
+@_con_respaldo_pandas
+def creaReporteExistenciasComprasVentasCC(dfExistenciasComprasFinal, dfVentasFinalMerged):
+    return aplicar_especificacion(consolidacion.ESPECIFICACIONES["ExistenciasComprasVentas"], dfExistenciasComprasFinal, dfVentasFinalMerged)
@@ -0,0 +1,240 @@
+# %%
+"""
+Lectura ligera de las hojas y encabezados de los archivos de origen.
+
+Un archivo .xlsx es un zip con un XML por hoja. Para revisar un archivo basta con leer la lista
+de hojas del libro y la primera fila de la hoja que se va a procesar: la hoja se recorre como
+flujo hasta terminar su primera fila, y de la tabla de textos compartidos solo se leen los textos
+que ocupan los encabezados. Así la revisión tarda lo mismo con cien filas que con un millón.
+De los archivos CSV/TSV se lee solo la primera línea y de los Parquet solo el esquema.
+
+Salvo para Parquet (PyArrow), solo usa la biblioteca estándar, por lo que puede ejecutarse
+antes de importar pandas u openpyxl.
+"""
+import re
+import os
+import csv
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+# Relación del libro dentro del paquete y de las hojas y textos compartidos dentro del libro
+_TIPO_LIBRO = "/officeDocument"
+_TIPO_HOJA = "/worksheet"
+_TIPO_TEXTOS = "/sharedStrings"
+
+# Archivos de origen en texto: separador de cada extensión. `consolidacion` lee los archivos con los mismos valores
+SEPARADORES_TEXTO = {".csv": ",", ".tsv": "\t"}
+# Codificaciones que se prueban, en orden, en los archivos de texto (las exportaciones del ERP pueden venir en Latin-1)
+CODIFICACIONES_TEXTO = ["utf-8-sig", "latin-1"]
+
+# Caracteres que Excel escribe como _xHHHH_ en el XML
+_ESCAPE_EXCEL = re.compile(r"_x([0-9A-Fa-f]{4})_")
+
+def _local(etiqueta):
+    # Nombre de la etiqueta sin el espacio de nombres (los libros pueden usar el esquema transicional o el estricto)
+    return etiqueta.rsplit("}", 1)[-1]
+
+def _atributo(elemento, nombre):
+    # Atributo por nombre local, con o sin espacio de nombres
+    for clave, valor in elemento.attrib.items():
+        if _local(clave) == nombre:
+            return valor
+    return None
+
+def _texto(elemento):
+    # Texto de una celda o de un texto compartido, incluido el texto enriquecido (varios <r><t>)
+    texto = "".join(nodo.text or "" for nodo in elemento.iter() if _local(nodo.tag) == "t")
+    return _ESCAPE_EXCEL.sub(lambda m: chr(int(m.group(1), 16)), texto)
+
+def _relaciones(paquete, ruta):
+    """
+    Lee las relaciones de una parte del paquete.
+
+    :return: Lista de tuplas (id, tipo, ruta de destino dentro del zip).
+    """
+    carpeta, nombre = posixpath.split(ruta)
+    ruta_relaciones = posixpath.join(carpeta, "_rels", f"{nombre}.rels")
+    if ruta_relaciones not in paquete.namelist():
+        return []
+
+    relaciones = []
+    for relacion in ET.fromstring(paquete.read(ruta_relaciones)):
+        destino = relacion.get("Target", "")
+        destino = destino.lstrip("/") if destino.startswith("/") else posixpath.normpath(posixpath.join(carpeta, destino))
+        relaciones.append((relacion.get("Id"), relacion.get("Type", ""), destino))
+    return relaciones
+
+def _textos_compartidos(paquete, ruta, indices):
+    """
+    Lee de la tabla de textos compartidos solo los textos con los índices indicados,
+    deteniéndose al llegar al mayor.
+    """
+    textos, pendientes, indice = {}, set(indices), 0
+    if not pendientes or ruta is None:
+        return textos
+
+    with paquete.open(ruta) as archivo:
+        for evento, elemento in ET.iterparse(archivo, events=("end",)):
+            if _local(elemento.tag) != "si":
+                continue
+            if indice in pendientes:
+                textos[indice] = _texto(elemento)
+                pendientes.discard(indice)
+                if not pendientes:
+                    break
+            elemento.clear()
+            indice += 1
+    return textos
+
+def _primera_fila(paquete, ruta):
+    """
+    Lee las celdas de la primera fila de una hoja sin recorrer el resto.
+
+    :return: Lista de tuplas (tipo de celda, valor en bruto o elemento de texto en línea).
+    """
+    celdas = []
+    with paquete.open(ruta) as archivo:
+        for evento, elemento in ET.iterparse(archivo, events=("end",)):
+            etiqueta = _local(elemento.tag)
+            if etiqueta == "c":
+                tipo = elemento.get("t")
+                if tipo == "inlineStr":
+                    celdas.append((tipo, _texto(elemento)))
+                else:
+                    valor = next((nodo.text for nodo in elemento if _local(nodo.tag) == "v"), None)
+                    celdas.append((tipo, valor))
+            elif etiqueta == "row":
+                # Solo cuenta como encabezado si es la fila 1; una hoja que empieza más abajo no tiene encabezados
+                if elemento.get("r") not in (None, "1"):
+                    celdas = []
+                break
+            elif etiqueta == "sheetData":
+                break
+    return celdas
+
+def leer_hojas_y_encabezados(archivo, hoja=None):
+    """
+    Lee los nombres de las hojas de un libro .xlsx y los encabezados (primera fila) de una hoja,
+    sin cargar el libro completo.
+
+    :param archivo: Ruta del archivo .xlsx.
+    :param hoja: Hoja cuyos encabezados se leen. Si es None, la primera hoja.
+    :return: Tupla (lista de nombres de hoja, lista de encabezados o None si la hoja no existe).
+    :raises zipfile.BadZipFile: Si el archivo no es un libro .xlsx.
+    :raises KeyError: Si al libro le falta alguna de sus partes.
+    """
+    with zipfile.ZipFile(archivo) as paquete:
+        ruta_libro = next((destino for _, tipo, destino in _relaciones(paquete, "") if tipo.endswith(_TIPO_LIBRO)), "xl/workbook.xml")
+        relaciones = _relaciones(paquete, ruta_libro)
+        destinos = {identificador: destino for identificador, tipo, destino in relaciones if tipo.endswith(_TIPO_HOJA)}
+        ruta_textos = next((destino for _, tipo, destino in relaciones if tipo.endswith(_TIPO_TEXTOS)), None)
+
+        # Hojas de cálculo en el orden del libro (sin hojas de gráficos)
+        hojas = [
+            (elemento.get("name"), destinos[_atributo(elemento, "id")])
+            for elemento in ET.fromstring(paquete.read(ruta_libro)).iter()
+            if _local(elemento.tag) == "sheet" and _atributo(elemento, "id") in destinos
+        ]
+        nombres = [nombre for nombre, _ in hojas]
+        if not hojas or (hoja is not None and hoja not in nombres):
+            return nombres, None
+        ruta_hoja = hojas[0][1] if hoja is None else dict(hojas)[hoja]
+
+        celdas = _primera_fila(paquete, ruta_hoja)
+        textos = _textos_compartidos(paquete, ruta_textos, [int(valor) for tipo, valor in celdas if tipo == "s" and valor is not None])
+        encabezados = []
+        for tipo, valor in celdas:
+            if tipo == "s" and valor is not None:
+                encabezados.append(textos.get(int(valor)))
+            elif valor is not None and tipo in ("str", "inlineStr", "e"):
+                encabezados.append(valor)
+            elif valor is not None and tipo == "b":
+                encabezados.append(valor == "1")
+            elif valor is not None:
+                # Encabezados numéricos; no coinciden con ninguna columna esperada pero se informan tal cual
+                encabezados.append(valor)
+        return nombres, encabezados
+
+def leer_encabezados_texto(archivo):
+    """
+    Lee los encabezados (primera línea) de un archivo CSV/TSV.
+
+    :param archivo: Ruta del archivo de texto.
+    :return: Lista de encabezados.
+    """
+    separador = SEPARADORES_TEXTO[os.path.splitext(archivo)[1].lower()]
+    with open(archivo, "rb") as f:
+        linea = f.readline()
+    for codificacion in CODIFICACIONES_TEXTO:
+        try:
+            texto = linea.decode(codificacion)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        # Ninguna codificación decodifica la línea: los caracteres inválidos se reemplazan y no coinciden con ninguna columna
+        texto = linea.decode(CODIFICACIONES_TEXTO[-1], errors="replace")
+    return next(csv.reader([texto], delimiter=separador), [])
+
+def leer_encabezados_parquet(archivo):
+    """
+    Lee los nombres de las columnas del esquema de un archivo Parquet, sin leer sus datos.
+
+    :param archivo: Ruta del archivo Parquet.
+    :return: Lista de columnas.
+    """
+    import pyarrow.parquet as pq
+    return list(pq.read_schema(archivo).names)
+
+def revisar_archivo(archivo, columnas, hoja=None):
+    """
+    Revisa que un archivo tenga la hoja y las columnas que se van a leer de él.
+    Los archivos CSV/TSV y Parquet tienen una sola tabla, por lo que en ellos no se revisa la hoja.
+
+    :param archivo: Ruta del archivo .xlsx, .csv, .tsv o .parquet.
+    :param columnas: Columnas que se leen del archivo.
+    :param hoja: Hoja que se lee en archivos .xlsx. Si es None, la primera hoja.
+    :return: Lista de problemas encontrados (vacía si el archivo está en orden).
+    """
+    extension = os.path.splitext(archivo)[1].lower()
+    try:
+        if extension in SEPARADORES_TEXTO:
+            hojas, encabezados, hoja = None, leer_encabezados_texto(archivo), None
+        elif extension == ".parquet":
+            hojas, encabezados, hoja = None, leer_encabezados_parquet(archivo), None
+        else:
+            hojas, encabezados = leer_hojas_y_encabezados(archivo, hoja)
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        return [f"{archivo}: no se pudo abrir como libro de Excel ({type(e).__name__}: {e})"]
+    except OSError as e:
+        return [f"{archivo}: no se pudo leer ({e})"]
+    except ImportError:
+        return [f"{archivo}: se requiere PyArrow para leer archivos Parquet"]
+    except Exception as e:
+        return [f"{archivo}: no se pudo leer ({type(e).__name__}: {e})"]
+
+    if encabezados is None:
+        if hoja is None:
+            return [f"{archivo}: el libro no tiene hojas de cálculo"]
+        return [f"{archivo}: no existe la hoja '{hoja}' (hojas: {hojas})"]
+
+    faltantes = [columna for columna in columnas if columna not in encabezados]
+    if faltantes:
+        nombre_hoja = "el archivo" if extension in SEPARADORES_TEXTO or extension == ".parquet" else f"la hoja '{hoja}'" if hoja is not None else "la primera hoja"
+        return [f"{archivo}: faltan las columnas {faltantes} en {nombre_hoja}"]
+    return []
+
+def revisar_familias(familias):
+    """
+    Revisa las hojas y encabezados de todos los archivos de las familias, sin detenerse
+    en el primer problema.
+
+    :param familias: Diccionario {familia: (lista de archivos, hoja, columnas)}.
+    :return: Lista con todos los problemas encontrados.
+    """
+    problemas = []
+    for familia, (archivos, hoja, columnas) in familias.items():
+        for archivo in archivos:
+            problemas.extend(f"{familia}: {problema}" for problema in revisar_archivo(archivo, columnas, hoja))
+    return problemas
@@ -0,0 +1,189 @@
+# %%
+"""
+Especificaciones declarativas de los reportes BI y planificador de sus etapas.
+
+Cada reporte se describe como un nodo con su tipo de operación, sus entradas (familias de
+archivos, otros reportes por nombre o nodos escritos en la misma especificación) y sus
+parámetros: llaves de agrupación, medidas, expansión por almacén y columnas derivadas.
+Los almacenes no se enumeran: las medidas con comodines ('Existencias en *') se expanden
+contra las columnas que trae cada ejecución, por lo que abrir o cerrar una sucursal no
+requiere cambiar código.
+
+El planificador une en un solo plan los nodos de todos los reportes: los nodos idénticos
+(por ejemplo, la tabla de existencias por almacén que usan el concentrado y el reporte de
+existencias) se calculan una sola vez.
+
+Solo usa la biblioteca estándar, por lo que puede importarse antes que pandas.
+"""
+import json
+import hashlib
+
+# Tasa de IVA que se suma al precio de compra para obtener el costo
+IVA = .16
+
+# Tipos de nodo que interpreta `consolidacion.aplicar_especificacion`:
+#   'pivote': suma 'valor' por producto con una columna por almacén ('prefijo' + almacén) y el 'total'
+#   'agrupacion': suma las 'medidas' (admiten comodines) por las 'claves'
+#   'union': une dos entradas por 'clave', con renombres, columnas numéricas, derivadas y orden de columnas
+#   'funcion': ejecuta la función de `consolidacion` indicada en 'funcion'
+# 'funcion' en los demás tipos nombra la función de `consolidacion` equivalente, que el motor
+# (pandas o DuckDB) puede reemplazar; no forma parte de la identidad del nodo
+TIPOS_NODO = ("pivote", "agrupacion", "union", "funcion")
+
+# Existencias de cada producto por almacén en columnas, la existencia global y sus datos descriptivos
+EXISTENCIAS_POR_ALMACEN = {
+    "tipo": "pivote",
+    "entradas": ["Existencias"],
+    "valor": "Existencia",
+    "prefijo": "Existencias en ",
+    "total": "Existencia",
+    "metadatos": {
+        "Nombre": "first",
+        "TipoProducto": "first",
+        "Modelo": "first",
+        "Marca": "first",
+        "Publico General": "mean",
+    },
+}
+
+# Ventas y piezas consumidas de cada producto por almacén en columnas y las ventas totales
+VENTAS_POR_ALMACEN = {
+    "tipo": "pivote",
+    "entradas": ["Ventas", "PiezasConsumidas"],
+    "valor": "Cantidad",
+    "rellenar": 0,
+    "prefijo": "Ventas de ",
+    "total": "Ventas Totales",
+    "solo_con_almacen": True,
+}
+
+# Existencias con la última compra (fecha, costo y cantidad) de cada producto, el costo con IVA y la utilidad
+EXISTENCIAS_CON_ULTIMA_COMPRA = {
+    "tipo": "union",
+    "entradas": [EXISTENCIAS_POR_ALMACEN, "Compras"],
+    "clave": "ProdConcat",
+    # Registro más reciente de cada producto, con la fecha sin la hora
+    "ultimos": {"clave": "Producto", "orden": "Fecha", "por_dia": True, "quitar": ["Almacen"]},
+    "columnas_derecha": ["Fecha", "Producto", "Costo", "Cantidad"],
+    "renombrar_derecha": {"Producto": "ProdConcat"},
+    "renombrar": {
+        "Existencia": "Existencia Global",
+        "Fecha": "Última Fecha Compra",
+        "Costo": "Precio Compra",
+        "Cantidad": "Cantidad Comprada Ultimo Mov",
+    },
+    "numericas": ["Precio Compra"],
+    # Las derivadas solo se calculan si estas columnas son numéricas; sus vacíos se rellenan antes
+    "rellenar_derivadas": {"Publico General": 0, "Precio Compra": 0},
+    "derivadas": {
+        "Costo": "`Precio Compra` + `Precio Compra` * @IVA",
+        "Utilidad": "((`Publico General` - Costo) / `Publico General`) * @CIEN",
+    },
+    "constantes": {"IVA": IVA, "CIEN": 100},
+    "despues": {
+        "Última Fecha Compra": ["Cantidad Comprada Ultimo Mov"],
+        "Precio Compra": ["Costo", "Publico General"],
+    },
+}
+
+# Especificaciones con nombre: cada una es una etapa del plan y puede ser la salida de un reporte
+ESPECIFICACIONES = {
+    "ExistenciasFinal": {**EXISTENCIAS_POR_ALMACEN, "funcion": "crearDataframeExistenciaFinal"},
+    # Acumulado de existencias por MARCA-MODELO-CATEGORÍA, por sucursal y global
+    "ConcentradoExistencias": {
+        "tipo": "agrupacion",
+        "funcion": "creaReporteExistenciaConcentrada",
+        "entradas": [EXISTENCIAS_POR_ALMACEN],
+        "claves": ["Marca", "Modelo", "Nombre"],
+        "relleno_claves": "Desconocido",
+        "medidas": ["Existencias en *", "Existencia"],
+    },
+    "ExistenciasComprasFinal": {**EXISTENCIAS_CON_ULTIMA_COMPRA, "funcion": "creaDataFrameExistenciasComprasFinal"},
+    "VentasFinal": {**VENTAS_POR_ALMACEN, "funcion": "creaDataFrameVentasFinal"},
+    # Existencias, compras y ventas en un solo reporte
+    "ExistenciasComprasVentas": {
+        "tipo": "union",
+        "funcion": "creaReporteExistenciasComprasVentasCC",
+        "entradas": [EXISTENCIAS_CON_ULTIMA_COMPRA, VENTAS_POR_ALMACEN],
+        "clave": "ProdConcat",
+    },
+    # Velocidad de venta, días de cobertura y reorden sobre las últimas ejecuciones
+    "VelocidadInventario": {
+        "tipo": "funcion",
+        "funcion": "creaReporteVelocidadInventario",
+        "entradas": ["ExistenciasComprasVentas"],
+    },
+}
+
+def _identidad(nodo, especificaciones, memo):
+    """
+    Devuelve la identidad canónica de un nodo: su especificación en JSON (sin 'funcion') con
+    las entradas sustituidas por sus propias identidades. Dos nodos con la misma identidad
+    producen el mismo resultado.
+    """
+    if isinstance(nodo, str):
+        if nodo not in especificaciones:
+            return json.dumps({"familia": nodo})
+        nodo = especificaciones[nodo]
+    if id(nodo) in memo:
+        if memo[id(nodo)] is None:
+            raise ValueError(f"Dependencia circular en la especificación: {nodo}")
+        return memo[id(nodo)]
+    memo[id(nodo)] = None
+
+    if nodo.get("tipo") not in TIPOS_NODO:
+        raise ValueError(f"Tipo de nodo no soportado: {nodo.get('tipo')} (tipos: {list(TIPOS_NODO)})")
+    contenido = {clave: valor for clave, valor in nodo.items() if clave not in ("entradas", "funcion")}
+    if nodo["tipo"] == "funcion":
+        contenido["funcion"] = nodo["funcion"]
+    contenido["entradas"] = [_identidad(entrada, especificaciones, memo) for entrada in nodo.get("entradas", [])]
+    memo[id(nodo)] = identidad = json.dumps(contenido, sort_keys=True, ensure_ascii=False, default=str)
+    return identidad
+
+def planificar(especificaciones=ESPECIFICACIONES):
+    """
+    Compila las especificaciones en un solo plan de etapas, calculando una sola vez los nodos
+    que se repiten entre reportes.
+
+    Cada nodo recibe el nombre de la primera especificación con nombre idéntica a él; los nodos
+    escritos dentro de otra especificación que no coinciden con ninguna reciben un nombre
+    '<tipo>_<huella>'. Las especificaciones con nombre idénticas a una anterior quedan como alias.
+
+    :param especificaciones: Diccionario {nombre: nodo}.
+    :return: Tupla (diccionario {etapa: (nodo con las entradas por nombre, lista de entradas)} en
+        un orden válido de ejecución, diccionario {especificación: etapa que la calcula} de los alias).
+    :raises ValueError: Si un nodo tiene un tipo no soportado o hay dependencias circulares.
+    """
+    memo = {}
+    nombres, alias = {}, {}
+    for nombre in especificaciones:
+        identidad = _identidad(nombre, especificaciones, memo)
+        if identidad in nombres:
+            alias[nombre] = nombres[identidad]
+        else:
+            nombres[identidad] = nombre
+
+    etapas = {}
+
+    def visitar(nodo):
+        # Agrega el nodo después de sus entradas y devuelve el nombre de su etapa (o de la familia)
+        if isinstance(nodo, str):
+            if nodo not in especificaciones:
+                return nodo
+            nodo = especificaciones[nodo]
+        identidad = _identidad(nodo, especificaciones, memo)
+        nombre = nombres.get(identidad)
+        if nombre is None:
+            nombre = nombres[identidad] = f"{nodo['tipo']}_{hashlib.sha1(identidad.encode('utf-8')).hexdigest()[:8]}"
+        if nombre in etapas:
+            return nombre
+
+        # La especificación con nombre define la etapa (con su 'funcion'), aunque se llegue a ella desde una copia
+        definicion = especificaciones.get(nombre, nodo)
+        entradas = [visitar(entrada) for entrada in definicion.get("entradas", [])]
+        etapas[nombre] = ({**definicion, "entradas": entradas}, entradas)
+        return nombre
+
+    for nombre in especificaciones:
+        visitar(nombre)
+    return etapas, alias
@@ -0,0 +1,307 @@
+# %%
+"""
+Almacén histórico de instantáneas del reporte.
+
+Cada ejecución del reporte agrega las existencias por almacén, las ventas por almacén y la
+última compra de cada producto a un almacén columnar en Parquet, con una partición por día:
+
+    <directorio>/<tabla>/fecha=AAAA-MM-DD/instantanea.parquet
+
+Las consultas filtran por periodo, almacén y producto sin abrir los reportes archivados:
+las particiones fuera del periodo no se leen y, dentro de cada archivo, se saltan los grupos
+de filas cuyas estadísticas no cumplen los filtros.
+
+Uso:
+    python historico.py existencias --almacen "Central Cell Plaza Bella" --desde 2026-04-01
+    python historico.py ventas --producto PROD-001 --salida ventas_prod-001.csv
+    python historico.py --fechas
+"""
+import os
+import sys
+import argparse
+from datetime import date
+import pandas as pd
+
+# Carpeta del almacén histórico (relativa a la carpeta de salida del reporte). None lo desactiva.
+DIRECTORIO_INSTANTANEAS = os.path.join(".historial", "instantaneas")
+
+# Tablas del almacén: nombre -> (columna de almacén o None si la tabla no la tiene, columna de producto)
+TABLAS = {
+    "existencias": ("Almacen", "ProdConcat"),
+    "ventas": ("Almacen", "ProdConcat"),
+    "ultimas_compras": (None, "ProdConcat"),
+}
+
+# Columna de partición con el día de cada instantánea
+COLUMNA_FECHA = "fecha"
+
+# Filas por grupo de cada archivo: grupos más pequeños permiten saltar más filas al filtrar
+# por almacén o producto, a cambio de archivos un poco más grandes.
+FILAS_POR_GRUPO = 50000
+
+# Nombre del archivo de cada partición; una nueva instantánea del mismo día reemplaza a la anterior
+ARCHIVO_PARTICION = "instantanea.parquet"
+
+def disponible():
+    """
+    Indica si PyArrow está instalado.
+    """
+    try:
+        import pyarrow.dataset  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _como_fecha(valor):
+    # Acepta 'AAAA-MM-DD', date, datetime o Timestamp
+    return None if valor is None else pd.Timestamp(valor).date()
+
+def _como_lista(valor):
+    if valor is None:
+        return None
+    return [valor] if isinstance(valor, str) else list(valor)
+
+def crear_tablas_instantanea(dfExistencias=None, dfVentas=None, dfPiezasConsumidas=None, dfUltimasCompras=None):
+    """
+    Construye las tablas de una instantánea a partir de los DataFrames leídos por el reporte.
+
+    :param dfExistencias: DataFrame de existencias (una fila por almacén y producto), o None.
+    :param dfVentas: DataFrame de ventas con las columnas Almacen, ProdConcat y Cantidad, o None.
+    :param dfPiezasConsumidas: DataFrame de piezas consumidas con las mismas columnas que las ventas, o None.
+    :param dfUltimasCompras: DataFrame con la última compra de cada producto, o None.
+    :return: Diccionario {tabla: DataFrame} con las tablas que se pudieron construir.
+    """
+    tablas = {}
+    if dfExistencias is not None:
+        # En el reporte las existencias en cero se dejan vacías; en el historial se guardan como cero
+        tablas["existencias"] = dfExistencias.assign(Existencia=dfExistencias["Existencia"].fillna(0))
+
+    ventas = [
+        df.loc[:, ["Almacen", "ProdConcat", "Cantidad"]].assign(Origen=origen)
+        for origen, df in (("Ventas", dfVentas), ("PiezasConsumidas", dfPiezasConsumidas)) if df is not None
+    ]
+    if ventas:
+        # Una fila por origen, almacén y producto, igual con la lectura completa o por bloques
+        dfVentasInstantanea = pd.concat([df.astype({"Almacen": object, "ProdConcat": object}) for df in ventas], ignore_index=True)
+        tablas["ventas"] = dfVentasInstantanea.groupby(["Origen", "Almacen", "ProdConcat"], as_index=False)["Cantidad"].sum()
+
+    if dfUltimasCompras is not None:
+        tablas["ultimas_compras"] = dfUltimasCompras.rename(columns={"Producto": "ProdConcat"})
+    return tablas
+
+def _preparar_tabla(df, tabla):
+    """
+    Normaliza los tipos de una tabla para que todas las particiones compartan el mismo esquema:
+    textos y claves como cadenas, números como float64 y fechas como timestamp.
+    Las filas se ordenan por almacén y producto para que las estadísticas de cada grupo sean selectivas.
+    """
+    df = df.copy()
+    for columna in df.columns:
+        serie = df[columna]
+        if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie):
+            continue
+        if pd.api.types.is_numeric_dtype(serie):
+            df[columna] = serie.astype("float64")
+        elif columna == "Fecha":
+            df[columna] = pd.to_datetime(serie)
+        else:
+            df[columna] = serie.astype("string")
+
+    orden = [columna for columna in TABLAS[tabla] if columna is not None and columna in df.columns]
+    if orden:
+        df = df.sort_values(orden, kind="stable", na_position="last")
+    return df.reset_index(drop=True)
+
+def guardar_instantanea(tablas, fecha=None, directorio=DIRECTORIO_INSTANTANEAS):
+    """
+    Agrega las tablas de una ejecución al almacén histórico, en la partición de su fecha.
+    Si ya existe una instantánea del mismo día, se reemplaza.
+
+    :param tablas: Diccionario {tabla: DataFrame}; las tablas deben estar en TABLAS.
+    :param fecha: Día de la instantánea. Si es None, se usa el día actual.
+    :param directorio: Carpeta del almacén histórico. Si es None, no se guarda.
+    :return: Lista de archivos guardados.
+    """
+    if directorio is None or not tablas:
+        return []
+    if not disponible():
+        print("PyArrow no está instalado, no se guardó la instantánea histórica.")
+        return []
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fecha = _como_fecha(fecha) or date.today()
+    guardados = []
+    for tabla, df in tablas.items():
+        if tabla not in TABLAS:
+            raise ValueError(f"Tabla no soportada por el historial: {tabla}")
+        if df is None:
+            continue
+        carpeta = os.path.join(directorio, tabla, f"{COLUMNA_FECHA}={fecha.isoformat()}")
+        ruta = os.path.join(carpeta, ARCHIVO_PARTICION)
+        try:
+            os.makedirs(carpeta, exist_ok=True)
+            datos = pa.Table.from_pandas(_preparar_tabla(df, tabla), preserve_index=False)
+            # Se escribe en un archivo temporal y se renombra, para que una consulta nunca lea un archivo a medias
+            ruta_temporal = f"{ruta}.tmp"
+            pq.write_table(datos, ruta_temporal, row_group_size=FILAS_POR_GRUPO)
+            os.replace(ruta_temporal, ruta)
+            guardados.append(tabla)
+        except Exception as e:
+            print(f"Error al guardar la instantánea {tabla} del {fecha}: {e}")
+
+    if guardados:
+        print(f"Instantánea histórica del {fecha} guardada: {', '.join(guardados)}")
+    return [os.path.join(directorio, tabla, f"{COLUMNA_FECHA}={fecha.isoformat()}", ARCHIVO_PARTICION) for tabla in guardados]
+
+def fechas_disponibles(tabla, directorio=DIRECTORIO_INSTANTANEAS):
+    """
+    Devuelve los días con instantánea de una tabla, en orden.
+
+    :param tabla: Tabla del almacén histórico.
+    :param directorio: Carpeta del almacén histórico.
+    :return: Lista de fechas (date).
+    """
+    carpeta = os.path.join(directorio, tabla)
+    if not os.path.isdir(carpeta):
+        return []
+
+    fechas = []
+    for nombre in os.listdir(carpeta):
+        prefijo, _, valor = nombre.partition("=")
+        if prefijo == COLUMNA_FECHA and os.path.isfile(os.path.join(carpeta, nombre, ARCHIVO_PARTICION)):
+            try:
+                fechas.append(date.fromisoformat(valor))
+            except ValueError:
+                continue
+    return sorted(fechas)
+
+def _abrir_tabla(tabla, directorio):
+    """
+    Abre una tabla del almacén histórico como dataset de PyArrow, con la fecha como partición
+    y un esquema común a todas las particiones (las columnas que falten en alguna quedan vacías).
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    particiones = ds.partitioning(pa.schema([(COLUMNA_FECHA, pa.date32())]), flavor="hive")
+    rutas = [
+        os.path.join(directorio, tabla, f"{COLUMNA_FECHA}={fecha.isoformat()}", ARCHIVO_PARTICION)
+        for fecha in fechas_disponibles(tabla, directorio)
+    ]
+    dataset = ds.dataset(rutas, format="parquet", partitioning=particiones, partition_base_dir=os.path.join(directorio, tabla))
+    # Las particiones escritas con otras versiones de pandas pueden diferir en el tipo de texto (string o large_string)
+    esquema = pa.unify_schemas([fragmento.physical_schema for fragmento in dataset.get_fragments()] + [particiones.schema], promote_options="permissive")
+    return ds.dataset(rutas, schema=esquema, format="parquet", partitioning=particiones, partition_base_dir=os.path.join(directorio, tabla))
+
+def consultar(tabla, desde=None, hasta=None, almacenes=None, productos=None, columnas=None, directorio=DIRECTORIO_INSTANTANEAS):
+    """
+    Consulta una tabla del almacén histórico.
+
+    Los filtros se aplican al leer: solo se abren las particiones del periodo y, dentro de
+    cada archivo, solo los grupos de filas que pueden contener los almacenes o productos buscados.
+
+    :param tabla: Tabla a consultar ('existencias', 'ventas' o 'ultimas_compras').
+    :param desde: Primer día del periodo (incluido), como 'AAAA-MM-DD' o date. None no limita.
+    :param hasta: Último día del periodo (incluido). None no limita.
+    :param almacenes: Almacén o lista de almacenes. None no filtra.
+    :param productos: Producto o lista de productos (sin distinguir mayúsculas). None no filtra.
+    :param columnas: Columnas a leer además de la fecha. None lee todas.
+    :return: DataFrame con la columna 'fecha' y las filas que cumplen los filtros, ordenado por fecha.
+    """
+    if tabla not in TABLAS:
+        raise ValueError(f"Tabla no soportada por el historial: {tabla}. Tablas disponibles: {list(TABLAS)}")
+    if not disponible():
+        raise ImportError("Se requiere PyArrow para consultar el historial.")
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    columna_almacen, columna_producto = TABLAS[tabla]
+    almacenes = _como_lista(almacenes)
+    productos = _como_lista(productos)
+    if almacenes is not None and columna_almacen is None:
+        raise ValueError(f"La tabla {tabla} no tiene almacén; no se puede filtrar por almacén.")
+
+    if not fechas_disponibles(tabla, directorio):
+        print(f"No hay instantáneas de {tabla} en {directorio}")
+        return pd.DataFrame(columns=[COLUMNA_FECHA] + list(columnas or []))
+
+    dataset = _abrir_tabla(tabla, directorio)
+
+    filtros = []
+    desde, hasta = _como_fecha(desde), _como_fecha(hasta)
+    if desde is not None:
+        filtros.append(ds.field(COLUMNA_FECHA) >= pa.scalar(desde, pa.date32()))
+    if hasta is not None:
+        filtros.append(ds.field(COLUMNA_FECHA) <= pa.scalar(hasta, pa.date32()))
+    if almacenes is not None:
+        filtros.append(ds.field(columna_almacen).isin(almacenes))
+    if productos is not None:
+        # Las claves de producto se guardan en mayúsculas
+        filtros.append(ds.field(columna_producto).isin([str(producto).upper() for producto in productos]))
+    filtro = None
+    for condicion in filtros:
+        filtro = condicion if filtro is None else filtro & condicion
+
+    if columnas is not None:
+        faltantes = [columna for columna in columnas if columna not in dataset.schema.names]
+        if faltantes:
+            raise ValueError(f"Columnas que no existen en la tabla {tabla}: {faltantes}")
+        columnas = [COLUMNA_FECHA] + [columna for columna in columnas if columna != COLUMNA_FECHA]
+
+    df = dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+    # La fecha de la partición va primero
+    df = df[[COLUMNA_FECHA] + [columna for columna in df.columns if columna != COLUMNA_FECHA]]
+    return df.sort_values(COLUMNA_FECHA, kind="stable").reset_index(drop=True)
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Consulta el almacén histórico de instantáneas del reporte BI.")
+    parser.add_argument("tabla", nargs="?", choices=list(TABLAS), help="Tabla a consultar.")
+    parser.add_argument("--directorio", default=DIRECTORIO_INSTANTANEAS, help="Carpeta del almacén histórico.")
+    parser.add_argument("--desde", help="Primer día del periodo (AAAA-MM-DD).")
+    parser.add_argument("--hasta", help="Último día del periodo (AAAA-MM-DD).")
+    parser.add_argument("--almacen", nargs="+", help="Almacenes a consultar.")
+    parser.add_argument("--producto", nargs="+", help="Productos a consultar.")
+    parser.add_argument("--columnas", nargs="+", help="Columnas a leer (por defecto, todas).")
+    parser.add_argument("--salida", help="Guardar el resultado en un archivo .csv, .xlsx o .parquet en lugar de mostrarlo.")
+    parser.add_argument("--fechas", action="store_true", help="Mostrar los días con instantánea de cada tabla y salir.")
+    return parser
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+
+    if args.fechas:
+        for tabla in ([args.tabla] if args.tabla else TABLAS):
+            fechas = fechas_disponibles(tabla, args.directorio)
+            rango = f"{fechas[0]} a {fechas[-1]}" if fechas else "sin instantáneas"
+            print(f"{tabla}: {len(fechas)} día(s), {rango}")
+        return 0
+    if args.tabla is None:
+        print("Error: indica la tabla a consultar o --fechas")
+        return 1
+
+    try:
+        df = consultar(args.tabla, args.desde, args.hasta, args.almacen, args.producto, args.columnas, args.directorio)
+    except (ValueError, ImportError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    if args.salida is None:
+        with pd.option_context("display.max_rows", 100, "display.width", 200):
+            print(df)
+    elif args.salida.endswith(".parquet"):
+        df.to_parquet(args.salida, index=False)
+    elif args.salida.endswith(".xlsx"):
+        df.to_excel(args.salida, index=False)
+    else:
+        df.to_csv(args.salida, index=False)
+    if args.salida is not None:
+        print(f"{len(df)} fila(s) guardadas en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+# %%
+"""
+Ejecución por lotes del reporte para varios grupos de tiendas y periodos.
+
+Un manifiesto enumera los trabajos, cada uno con su carpeta de entrada, su periodo y el nombre
+de su salida. Los archivos de entrada que se repiten entre trabajos (p. ej. el mismo catálogo de
+existencias en todas las carpetas) se leen una sola vez: antes de ejecutar los trabajos, cada
+archivo distinto (por contenido) se lee en paralelo a la caché de lecturas compartida por el lote,
+y los trabajos recuperan de ella la lectura en lugar de volver a procesar el libro. Después, los
+trabajos se ejecutan en un grupo de procesos de tamaño acotado, cada uno en su propia carpeta de
+salida (con su propio historial) y con su propio registro de mensajes.
+
+El manifiesto puede ser un CSV o un JSON (lista de objetos) con los campos:
+
+    entrada   Carpeta con las exportaciones del trabajo (relativa a la carpeta del manifiesto).
+    periodo   Día de los datos, AAAA-MM-DD, o mes, AAAA-MM (se toma el último día). Opcional.
+    salida    Nombre de la carpeta de salida del trabajo dentro de la salida del lote. Opcional.
+    reportes  Reportes a generar, separados por espacios (claves de REPORTES). Opcional.
+    opciones  Solo en JSON: opciones del pipeline del trabajo (ver `PipelineReporte`). Opcional.
+    archivar  Mover al terminar los archivos trabajados a la carpeta BI-DATA-CC_<fecha>. Opcional;
+              no se admite si otro trabajo lee la misma carpeta de entrada.
+
+Uso:
+    python lote.py trabajos.csv --salida ./lote --procesos 4
+    python lote.py trabajos.json --salida ./lote --sin-precarga
+"""
+import io
+import os
+import sys
+import csv
+import json
+import time
+import calendar
+import argparse
+import contextlib
+from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import report
+
+# Procesos para ejecutar los trabajos del lote (None = según los núcleos). Cada trabajo lee y escribe
+# en secuencia dentro de su proceso, por lo que este número acota los procesos y la memoria del lote.
+PROCESOS_LOTE = None
+
+# Caché de lecturas compartida por los trabajos del lote, dentro de la carpeta de salida del lote
+DIRECTORIO_CACHE_LOTE = ".cache_lecturas"
+
+# Resumen del lote y registro de mensajes de cada trabajo
+ARCHIVO_RESUMEN = "resumen_lote.json"
+ARCHIVO_REGISTRO = "lote.log"
+
+def _consolidacion():
+    # Importación diferida, como en `report`, para que --help responda de inmediato
+    import consolidacion
+    return consolidacion
+
+def _entero_o_none(valor):
+    # 'auto' usa todos los núcleos disponibles
+    return None if valor == "auto" else int(valor)
+
+def _fecha_periodo(periodo):
+    """
+    Convierte un periodo AAAA-MM-DD o AAAA-MM (último día del mes) en la fecha de los datos.
+
+    :raises ValueError: Si el periodo no tiene ninguno de los dos formatos.
+    """
+    if periodo is None or periodo == "":
+        return None
+    try:
+        return datetime.strptime(periodo, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        pass
+    try:
+        mes = datetime.strptime(periodo, "%Y-%m")
+    except ValueError:
+        raise ValueError(f"Periodo no válido (se espera AAAA-MM-DD o AAAA-MM): {periodo}")
+    return date(mes.year, mes.month, calendar.monthrange(mes.year, mes.month)[1]).isoformat()
+
+def cargar_trabajos(ruta):
+    """
+    Lee el manifiesto de trabajos del lote.
+
+    :param ruta: Ruta del manifiesto (.csv o .json).
+    :return: Lista de diccionarios con los campos de cada trabajo, tal como vienen en el manifiesto.
+    :raises ValueError: Si el manifiesto no tiene un formato soportado o le falta la entrada a algún trabajo.
+    """
+    if ruta.lower().endswith(".json"):
+        with open(ruta, encoding="utf-8") as f:
+            trabajos = json.load(f)
+        if isinstance(trabajos, dict):
+            trabajos = trabajos.get("trabajos", [])
+    elif ruta.lower().endswith(".csv"):
+        with open(ruta, encoding="utf-8-sig", newline="") as f:
+            trabajos = [{campo.strip(): (valor or "").strip() for campo, valor in fila.items() if campo} for fila in csv.DictReader(f)]
+    else:
+        raise ValueError(f"El manifiesto debe ser .csv o .json: {ruta}")
+
+    faltantes = [indice + 1 for indice, trabajo in enumerate(trabajos) if not trabajo.get("entrada")]
+    if faltantes:
+        raise ValueError(f"A los trabajos {faltantes} del manifiesto les falta la carpeta de entrada")
+    return trabajos
+
+def preparar_trabajos(trabajos, salida=".", base="."):
+    """
+    Normaliza los trabajos del manifiesto: rutas absolutas, fecha del periodo y carpeta de salida de cada uno.
+
+    :param trabajos: Lista de trabajos de `cargar_trabajos`.
+    :param salida: Carpeta de salida del lote.
+    :param base: Carpeta contra la que se resuelven las entradas relativas (la del manifiesto).
+    :return: Lista de diccionarios con 'nombre', 'entrada', 'salida', 'periodo', 'fecha', 'reportes', 'opciones' y 'archivar'.
+    :raises ValueError: Si un periodo o un reporte no es válido, si dos trabajos comparten la carpeta de salida
+        o si un trabajo que archiva comparte su carpeta de entrada con otro.
+    """
+    preparados = []
+    for trabajo in trabajos:
+        entrada = os.path.abspath(os.path.join(base, trabajo["entrada"]))
+        periodo = trabajo.get("periodo") or None
+        nombre = trabajo.get("salida") or "_".join(parte for parte in (os.path.basename(entrada.rstrip(os.sep)), periodo) if parte)
+        reportes = trabajo.get("reportes") or None
+        if isinstance(reportes, str):
+            reportes = reportes.split()
+        invalidos = [reporte for reporte in reportes or [] if reporte not in report.REPORTES]
+        if invalidos:
+            raise ValueError(f"Reportes no soportados en el trabajo {nombre}: {invalidos}")
+        preparados.append({
+            "nombre": nombre,
+            "entrada": entrada,
+            "salida": os.path.abspath(os.path.join(salida, nombre)),
+            "periodo": periodo,
+            "fecha": _fecha_periodo(periodo),
+            "reportes": reportes,
+            "opciones": dict(trabajo.get("opciones") or {}),
+            "archivar": str(trabajo.get("archivar", "")).lower() in ("1", "true", "si", "sí"),
+        })
+
+    salidas = [trabajo["salida"] for trabajo in preparados]
+    repetidas = sorted({ruta for ruta in salidas if salidas.count(ruta) > 1})
+    if repetidas:
+        raise ValueError(f"Varios trabajos comparten la carpeta de salida (y su historial): {repetidas}")
+
+    # El primer trabajo en terminar movería las entradas compartidas y los demás ya no las encontrarían
+    entradas = [os.path.normcase(os.path.normpath(trabajo["entrada"])) for trabajo in preparados]
+    archivan = sorted({trabajo["nombre"] for trabajo, entrada in zip(preparados, entradas) if trabajo["archivar"] and entradas.count(entrada) > 1})
+    if archivan:
+        raise ValueError(f"Los trabajos {archivan} archivan una carpeta de entrada que comparten con otros trabajos; quite 'archivar' o use carpetas de entrada distintas")
+    return preparados
+
+def _crear_pipeline(trabajo, directorio_cache):
+    # Cada trabajo lee y escribe en secuencia: la concurrencia del lote la dan los procesos de los trabajos
+    opciones = {
+        **trabajo["opciones"],
+        "directorio_cache": directorio_cache,
+        "procesos_lectura": 1,
+        "procesos_escritura": 1,
+    }
+    if trabajo["fecha"] is not None:
+        opciones["fecha_instantanea"] = trabajo["fecha"]
+    return report.PipelineReporte(
+        entrada=trabajo["entrada"],
+        salida=trabajo["salida"],
+        reportes=trabajo["reportes"],
+        opciones=opciones,
+        archivar=trabajo["archivar"],
+    )
+
+def _precargar_archivo(archivo, hoja, columnas, directorio_cache, suma, filas_por_bloque):
+    """
+    Lee un archivo de origen a la caché de lecturas dentro de un proceso de trabajo.
+
+    :return: Tupla (número de filas leídas o None, mensajes impresos durante la lectura).
+    """
+    c = _consolidacion()
+    mensajes = io.StringIO()
+    with contextlib.redirect_stdout(mensajes):
+        df = c.leer_archivo_excel_con_cache(archivo, hoja=hoja, columnas=columnas, directorio_cache=directorio_cache, suma=suma, filas_por_bloque=filas_por_bloque)
+    return (None if df is None else len(df)), mensajes.getvalue()
+
+def precargar_entradas(trabajos, directorio_cache, procesos=PROCESOS_LOTE):
+    """
+    Lee a la caché de lecturas cada archivo de entrada distinto de todos los trabajos, una sola vez.
+
+    Los archivos se identifican por su contenido y por la proyección que leerá el trabajo (hoja,
+    columnas y suma por bloques), por lo que una copia del mismo catálogo en varias carpetas se
+    lee una vez. No se precargan los archivos Parquet, que no pasan por la caché, ni los movimientos
+    de compra que el historial del trabajo ya integró.
+
+    :param trabajos: Lista de trabajos de `preparar_trabajos`.
+    :param directorio_cache: Caché de lecturas compartida por el lote.
+    :param procesos: Número de procesos de lectura.
+    :return: Diccionario con el número de 'archivos' de entrada de todos los trabajos, los 'distintos' y los 'leidos'.
+    """
+    c = _consolidacion()
+    distintos, total = {}, 0
+    for trabajo in trabajos:
+        pipeline = _crear_pipeline(trabajo, directorio_cache)
+        if not os.path.isdir(pipeline.entrada):
+            continue
+        pipeline.descubrir()
+        filas_por_bloque = pipeline.opcion("filas_por_bloque_ventas")
+        integrados = {}
+        for familia in report.entradas_necesarias(pipeline.objetivos()):
+            if familia == "Compras":
+                _, integrados = c.cargar_ultimas_compras(pipeline.ruta_salida(c.ARCHIVO_ULTIMAS_COMPRAS))
+            hoja, columnas, suma = report.FAMILIAS[familia][1], pipeline.columnas_familia(familia), pipeline.suma_familia(familia)
+            for archivo in pipeline.archivos[familia]:
+                total += 1
+                if os.path.splitext(archivo)[1].lower() == ".parquet":
+                    continue
+                try:
+                    huella = c.calcular_huella_archivo(archivo)
+                except OSError as e:
+                    print(f"No se pudo calcular la huella del archivo {archivo}: {e}")
+                    continue
+                if familia == "Compras" and huella in integrados:
+                    continue
+                distintos.setdefault((huella, hoja, tuple(columnas), suma, filas_por_bloque if suma else None), archivo)
+
+    tareas = [(archivo, hoja, list(columnas), directorio_cache, suma, filas_por_bloque) for (_, hoja, columnas, suma, filas_por_bloque), archivo in distintos.items()]
+    leidos = 0
+    if tareas:
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            futuros = [executor.submit(_precargar_archivo, *tarea) for tarea in tareas]
+            for tarea, futuro in zip(tareas, futuros):
+                try:
+                    filas, mensajes = futuro.result()
+                except Exception as e:
+                    filas, mensajes = None, f"Error al leer el archivo {tarea[0]}: {e}\n"
+                if mensajes:
+                    print(mensajes, end="")
+                leidos += filas is not None
+    print(f"Entradas del lote: {total} archivo(s), {len(distintos)} distinto(s) precargado(s) en la caché, {leidos} leído(s)")
+    return {"archivos": total, "distintos": len(distintos), "leidos": leidos}
+
+def ejecutar_trabajo(trabajo, directorio_cache):
+    """
+    Ejecuta el pipeline completo de un trabajo, con sus mensajes en el registro de su carpeta de salida.
+
+    :param trabajo: Trabajo de `preparar_trabajos`.
+    :param directorio_cache: Caché de lecturas compartida por el lote.
+    :return: Diccionario con el resultado del trabajo ('estado' es 'ok' o 'error').
+    """
+    inicio = time.perf_counter()
+    resultado = {campo: trabajo[campo] for campo in ("nombre", "entrada", "salida", "periodo")}
+    os.makedirs(trabajo["salida"], exist_ok=True)
+    resultado["registro"] = os.path.join(trabajo["salida"], ARCHIVO_REGISTRO)
+
+    with open(resultado["registro"], "w", encoding="utf-8") as registro, contextlib.redirect_stdout(registro):
+        try:
+            if not os.path.isdir(trabajo["entrada"]):
+                raise FileNotFoundError(f"no existe la carpeta de entrada {trabajo['entrada']}")
+            archivos = _crear_pipeline(trabajo, directorio_cache).ejecutar()
+            resultado.update(estado="ok", archivos=archivos)
+        except report.ErrorValidacion as e:
+            print(f"Error: {e}; no se generaron reportes.")
+            resultado.update(estado="error", error=str(e), problemas=e.problemas)
+        except Exception as e:
+            print(f"Error: {type(e).__name__}: {e}")
+            resultado.update(estado="error", error=f"{type(e).__name__}: {e}")
+    resultado["segundos"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+def ejecutar_lote(trabajos, salida=".", procesos=PROCESOS_LOTE, precargar=True):
+    """
+    Ejecuta los trabajos del lote en un grupo de procesos y escribe el resumen del lote.
+
+    :param trabajos: Lista de trabajos de `preparar_trabajos`.
+    :param salida: Carpeta de salida del lote (caché compartida, resumen y una carpeta por trabajo).
+    :param procesos: Número máximo de trabajos simultáneos. None usa todos los núcleos.
+    :param precargar: Si es True, antes de los trabajos se lee una vez cada archivo de entrada distinto.
+    :return: Diccionario con el resumen del lote.
+    """
+    inicio = datetime.now()
+    os.makedirs(salida, exist_ok=True)
+    directorio_cache = os.path.abspath(os.path.join(salida, DIRECTORIO_CACHE_LOTE))
+
+    entradas = precargar_entradas(trabajos, directorio_cache, procesos) if precargar else None
+
+    resultados = {}
+    with ProcessPoolExecutor(max_workers=procesos) as executor:
+        futuros = {executor.submit(ejecutar_trabajo, trabajo, directorio_cache): trabajo for trabajo in trabajos}
+        for futuro in as_completed(futuros):
+            trabajo = futuros[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                resultado = {campo: trabajo[campo] for campo in ("nombre", "entrada", "salida", "periodo")}
+                resultado.update(estado="error", error=f"{type(e).__name__}: {e}")
+            resultados[trabajo["nombre"]] = resultado
+            detalle = f"{resultado['segundos']} s" if "segundos" in resultado else resultado["error"]
+            print(f"[{resultado['estado']}] {trabajo['nombre']} ({detalle})")
+
+    fin = datetime.now()
+    resumen = {
+        "inicio": inicio.isoformat(timespec="seconds"),
+        "fin": fin.isoformat(timespec="seconds"),
+        "segundos": round((fin - inicio).total_seconds(), 3),
+        "procesos": procesos,
+        "entradas": entradas,
+        # En el orden del manifiesto
+        "trabajos": [resultados[trabajo["nombre"]] for trabajo in trabajos],
+    }
+    ruta_resumen = os.path.join(salida, ARCHIVO_RESUMEN)
+    try:
+        with open(ruta_resumen, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=2)
+        print(f"Resumen del lote generado: {ruta_resumen}")
+    except Exception as e:
+        print(f"Error al generar el resumen del lote: {e}")
+
+    errores = sum(resultado["estado"] != "ok" for resultado in resumen["trabajos"])
+    print(f"Lote terminado en {resumen['segundos']} s: {len(trabajos) - errores} trabajo(s) correcto(s), {errores} con error")
+    return resumen
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Ejecuta el reporte BI para varios trabajos (carpeta de entrada, periodo y salida) de un manifiesto.")
+    parser.add_argument("manifiesto", help="Manifiesto de trabajos (.csv o .json).")
+    parser.add_argument("--salida", default=".", help="Carpeta de salida del lote (por defecto, la actual).")
+    parser.add_argument("--procesos", type=_entero_o_none, default=PROCESOS_LOTE, metavar="N|auto", help="Trabajos simultáneos (por defecto, según los núcleos).")
+    parser.add_argument("--sin-precarga", action="store_true", help="No leer de antemano los archivos de entrada distintos a la caché compartida.")
+    return parser
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+
+    try:
+        trabajos = preparar_trabajos(cargar_trabajos(args.manifiesto), salida=args.salida, base=os.path.dirname(os.path.abspath(args.manifiesto)))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    if not trabajos:
+        print("El manifiesto no tiene trabajos.")
+        return 0
+
+    resumen = ejecutar_lote(trabajos, salida=args.salida, procesos=args.procesos, precargar=not args.sin_precarga)
+    return 1 if any(resultado["estado"] != "ok" for resultado in resumen["trabajos"]) else 0
+
+
+# Los procesos de trabajo vuelven a importar este módulo, por lo que el lote solo se ejecuta desde el proceso principal.
+if __name__ == "__main__":
+    sys.exit(main())
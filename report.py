@@ -1,582 +1,1005 @@
 # %%
+"""
+Reporte BI de existencias, compras y ventas.
+
+Uso:
+    python report.py
+    python report.py --entrada ./exportaciones --salida ./reportes
+    python report.py --reportes ventas existencia --formato-salida parquet
+    python report.py --ventas-por-bloques 50000
+    python report.py --limite-memoria 2048
+    python report.py --motor duckdb
+    python report.py --deduplicar Ventas=Almacen,ProdConcat,Cantidad,Ticket
+    python report.py --entrada ./BI-DATA-CC_2026-04-01T09-00-00 --sin-archivar --fecha-instantanea 2026-04-01
+    python report.py --validar
+    python report.py --vigilar --entrada ./exportaciones --salida ./reportes
+    python report.py --invalidar-cache
+
+Las funciones de consolidación (y con ellas pandas, numpy y openpyxl) se importan solo
+al ejecutar las etapas del reporte, por lo que --help y --validar responden de inmediato.
+"""
+import io
 import os
+import sys
 import fnmatch
-import pandas as pd
-import numpy as np
+import argparse
+import functools
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-import shutil
-import sys
- 
-def generar_excel_by_df(df, nombre_base):
-    """
-    Genera un archivo Excel a partir de un DataFrame, añadiendo la fecha y hora actual al nombre del archivo.
 
-    :param df: DataFrame a exportar.
-    :param nombre_base: Nombre base del archivo (sin extensión).
-    :return: Ruta completa del archivo generado.
-    """
-    try:
-        # Obtener la fecha y hora actuales en formato 'YYYYMMDD_HHMMSS'
-        fecha_hora = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-        
-        # Construir el nombre del archivo
-        nombre_archivo = f"{nombre_base}_{fecha_hora}.xlsx"
-        
-        # Exportar el DataFrame a Excel
-        df.to_excel(nombre_archivo, index=False, engine="openpyxl")
-        
-        print(f"Archivo Excel generado exitosamente: {nombre_archivo}")
-        return nombre_archivo
-    except Exception as e:
-        print(f"Error al generar el archivo Excel: {e}")
-        return None
+import especificaciones
 
-def fusionar_archivos_excel(lista_archivos, hoja=None, nombre_salida="archivo_fusionado.xlsx"):
-    """
-    Fusiona múltiples archivos Excel en un solo archivo, permitiendo especificar una hoja de cada archivo.
-    
-    :param lista_archivos: Lista de rutas de los archivos Excel a fusionar.
-    :param hoja: Nombre de la hoja a leer de cada archivo. Si es None, se usará la primera hoja.
-    :param nombre_salida: Nombre del archivo de salida fusionado.
-    :return: Nombre del archivo fusionado, o una cadena vacía si no se pudieron procesar archivos.
-    """
-    dataframes = []
+#Qué columnas ocupamos de cada paquete de archivos
+columnasExistencias = ["Almacen", "ProdConcat", "Existencia", "Nombre", "TipoProducto", "Marca", "Modelo", "Publico General"]
+columnasCompras = ["Almacen", "Fecha", "Producto", "Costo", "Cantidad"]
+columnasVentas = ["Almacen", "ProdConcat", "Cantidad"]
+columnasPiezasConsumidas = ["Almacén Salida Reparación", "Producto", "Cantidad"]
 
-    for archivo in lista_archivos:
-        # Verificar si el archivo existe y tiene la extensión correcta
-        if os.path.isfile(archivo) and archivo.endswith(".xlsx"):
-            try:
-                # Leer el archivo con la hoja especificada
-                df = None
-                if hoja is None:
-                    df = pd.read_excel(archivo, engine="openpyxl")
-                else:
-                    df = pd.read_excel(archivo, engine="openpyxl", sheet_name=hoja)
-                
-
-                if df is not None:
-                   dataframes.append(df)
-            except ValueError:
-                print(f"La hoja '{hoja}' no existe en el archivo {archivo}.")
-            except Exception as e:
-                print(f"Error al leer el archivo {archivo}: {e}")
-        else:
-            print(f"Archivo no válido o no encontrado: {archivo}")
-
-    if dataframes:
-        # Concatenar los DataFrames si hay al menos uno válido
-        df_fusionado = pd.concat(dataframes, ignore_index=True)
-        # Especificar el motor openpyxl al guardar
-        df_fusionado.to_excel(nombre_salida, index=False, engine="openpyxl")
-        return nombre_salida
-    else:
-        print("No se encontraron archivos válidos para fusionar.")
-        return ""
-
-def listar_archivos_excel_por_cadena(directorio: str, cadena: str):
+# Familias de archivos de origen: texto que contiene el nombre del archivo, hoja a leer y columnas que ocupamos
+FAMILIAS = {
+    "Existencias": ("Existencia", None, columnasExistencias),
+    "Compras": ("Excel_Movimientos", "Detalle de movimientos", columnasCompras),
+    "Ventas": ("Analisis de Ventas por Tickets", None, columnasVentas),
+    "PiezasConsumidas": ("Excel_Reparaciones_Refacciones_Consumidas", None, columnasPiezasConsumidas),
+}
+
+# Etapas de transformación: nombre -> (nodo de `especificaciones`, entradas), compiladas de las
+# especificaciones declarativas de los reportes; los nodos que comparten varios reportes aparecen una sola vez.
+# Las entradas son familias de archivos leídas u otras etapas; el orden de declaración es un orden válido de ejecución
+ETAPAS, ALIAS_ETAPAS = especificaciones.planificar()
+
+# Reportes que genera el pipeline: nombre en la línea de comandos -> (nombre base del archivo, etapa que lo produce)
+REPORTES = {
+    "concentrado": ("BI-CONCENTRADO-EXISTENCIAS-BY-MODELO-MARCA", "ConcentradoExistencias"),
+    "existencia": ("BI-EXISTENCIA-CC", "ExistenciasComprasFinal"),
+    "ventas": ("BI-VENTAS-CC", "VentasFinal"),
+    "existencias-compras-ventas": ("BI-EXISTENCIAS-COMPRAS-VENTAS-CC", "VelocidadInventario"),
+}
+# Una especificación idéntica a otra se calcula en la etapa de la primera
+REPORTES = {reporte: (base, ALIAS_ETAPAS.get(etapa, etapa)) for reporte, (base, etapa) in REPORTES.items()}
+
+# Hilos para ejecutar en paralelo las ramas independientes de ETAPAS (None = según los núcleos; 1 = en secuencia).
+# Con perfilado o límite de memoria las etapas siempre se ejecutan en secuencia
+HILOS_ETAPAS = None
+
+# Motor de las etapas de ETAPAS: 'pandas' o 'duckdb' (consultas SQL de `consolidacion_sql`, con pandas como respaldo)
+MOTOR = "pandas"
+
+# Formatos de los archivos de origen; una familia puede mezclar archivos de distintos formatos
+EXTENSIONES_ENTRADA = (".xlsx", ".csv", ".tsv", ".parquet")
+
+# Archivos que genera el propio reporte (reportes BI y copias de los consolidados); nunca se clasifican como entradas
+PREFIJOS_GENERADOS = tuple(nombre for nombre, _ in REPORTES.values()) + ("ExistenciasCC", "ComprasCC", "VentasCC", "PiezasConsumidasCC")
+
+# Modo de vigilancia: segundos entre cada revisión de la carpeta de entrada
+INTERVALO_VIGILANCIA = 5
+# Segundos sin cambios en los archivos antes de reconstruir, para no leer archivos que aún se están copiando
+ESPERA_VIGILANCIA = 10
+
+def listar_archivos_excel_por_cadena(directorio: str, cadena: str, extension: str = ".xlsx"):
     archivos_excel = []
-    patron = f"*{cadena}*.xlsx"
-    
+    patron = f"*{cadena}*{extension}"
+
     for archivo in os.listdir(directorio):
         if fnmatch.fnmatch(archivo, patron):
             archivos_excel.append(archivo)
 
     return archivos_excel
 
-def borrar_archivos(lista_archivos):
-    for archivo in lista_archivos:
-        if os.path.isfile(archivo):
-            try:
-                os.remove(archivo)
-                print(f"Archivo eliminado: {archivo}")
-            except Exception as e:
-                print(f"Error al eliminar el archivo {archivo}: {e}")
-        else:
-            print(f"Archivo no encontrado: {archivo}")
-
-def crear_dataframe_desde_archivo(archivo: str, columnas: list, hoja: str = None):
-
-    try:
-        # Leer el archivo completo usando pandas con la hoja especificada
-        df = None
-        if hoja is None:
-             df = pd.read_excel(archivo, engine='openpyxl')
-        else:
-             df = pd.read_excel(archivo, engine='openpyxl', sheet_name=hoja)
-
-        # Filtrar solo las columnas deseadas
-        df_filtrado = df[columnas]
-
-        return df_filtrado
-    except FileNotFoundError:
-        print(f"El archivo {archivo} no fue encontrado.")
-    except KeyError as e:
-        print(f"Una o más columnas no se encuentran en el archivo: {e}")
-    except ValueError:
-        print(f"La hoja '{hoja}' no existe en el archivo {archivo}.")
-    except Exception as e:
-        print(f"Se produjo un error al procesar el archivo: {e}")
-
-def eliminar_columnas_df(dataframe, columnas):
+def clasificar_archivos(directorio, familias=FAMILIAS, extensiones=EXTENSIONES_ENTRADA, excluir=PREFIJOS_GENERADOS):
     """
-    Elimina una lista de columnas de un DataFrame.
+    Clasifica en un solo recorrido del directorio los archivos de cada familia
+    (los que contienen su texto en el nombre), en el mismo orden que `listar_archivos_excel_por_cadena`.
 
-    :param dataframe: DataFrame de pandas del que se desean eliminar las columnas.
-    :param columnas: Lista de nombres de columnas a eliminar.
-    :return: DataFrame con las columnas eliminadas.
-    """
-    try:
-        # Verificar cuáles columnas existen en el DataFrame
-        columnas_existentes = [col for col in columnas if col in dataframe.columns]
-        columnas_no_existentes = [col for col in columnas if col not in dataframe.columns]
-
-        if columnas_existentes:
-            dataframe = dataframe.drop(columns=columnas_existentes)
-            print(f"Las columnas eliminadas exitosamente: {columnas_existentes}")
-        
-        if columnas_no_existentes:
-            print(f"Las siguientes columnas no existen en el DataFrame: {columnas_no_existentes}")
-        
-        return dataframe
-    except Exception as e:
-        print(f"Se produjo un error al intentar eliminar las columnas: {e}")
-        return dataframe
-    
-def filtrar_columnas_df(dataframe, columnas):
-    """
-    Devuelve un DataFrame que contiene solo las columnas especificadas.
+    Se omiten los archivos temporales de Excel ('~$...') y los que genera el propio reporte.
 
-    :param dataframe: DataFrame de pandas del que se desea conservar las columnas.
-    :param columnas: Lista de nombres de columnas a conservar.
-    :return: DataFrame con solo las columnas especificadas.
+    :param directorio: Carpeta a recorrer.
+    :param familias: Diccionario {familia: (texto del nombre, hoja, columnas)}.
+    :param extensiones: Extensiones de los archivos que se clasifican.
+    :param excluir: Prefijos de los nombres de archivo que no se clasifican.
+    :return: Diccionario {familia: lista de rutas}.
     """
-    try:
-        # Verificar cuáles columnas existen en el DataFrame
-        columnas_existentes = [col for col in columnas if col in dataframe.columns]
-        columnas_no_existentes = [col for col in columnas if col not in dataframe.columns]
-
-        if columnas_no_existentes:
-            print(f"Las siguientes columnas no existen en el DataFrame: {columnas_no_existentes}")
-
-        # Seleccionar solo las columnas existentes
-        dataframe = dataframe[columnas_existentes]
-
-        return dataframe
-    except Exception as e:
-        print(f"Se produjo un error al intentar mantener las columnas: {e}")
-        return dataframe
-    
-def reemplazar_ceros_con_nan(dataframe, columnas):
+    patrones = {familia: f"*{cadena}*" for familia, (cadena, _, _) in familias.items()}
+    archivos = {familia: [] for familia in familias}
+    for archivo in os.listdir(directorio):
+        if archivo.startswith("~$") or archivo.startswith(excluir) or os.path.splitext(archivo)[1].lower() not in extensiones:
+            continue
+        for familia, patron in patrones.items():
+            if fnmatch.fnmatch(archivo, patron):
+                archivos[familia].append(os.path.join(directorio, archivo))
+    return archivos
+
+def firmas_archivos(archivos):
     """
-    Reemplaza ceros en las columnas especificadas de un DataFrame con NaN.
+    Devuelve la fecha de modificación y el tamaño de cada archivo, para detectar cambios sin leerlos.
 
-    :param dataframe: DataFrame en el que se procesarán las columnas.
-    :param columnas: Lista de nombres de columnas donde se reemplazarán los ceros por NaN.
-    :return: DataFrame con los ceros reemplazados por NaN en las columnas especificadas.
+    :param archivos: Diccionario {familia: lista de rutas}.
+    :return: Diccionario {familia: {ruta: (fecha de modificación en ns, tamaño)}}; se omiten los archivos que ya no existen.
     """
-    try:
-        # Validar que las columnas existan en el DataFrame
-        columnas_validas = [col for col in columnas if col in dataframe.columns]
-
-        # Reemplazar ceros por NaN en las columnas válidas
-        dataframe[columnas_validas] = dataframe[columnas_validas].replace(0, np.nan)
-
-        print(f"Ceros reemplazados por NaN en las columnas: {columnas_validas}")
-        return dataframe
-    except Exception as e:
-        print(f"Error al reemplazar ceros por NaN: {e}")
-        return dataframe
-    
-def crear_carpeta(base_nombre_carpeta, ruta_base="."):
+    firmas = {}
+    for familia, rutas in archivos.items():
+        firmas[familia] = {}
+        for ruta in rutas:
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            firmas[familia][ruta] = (estado.st_mtime_ns, estado.st_size)
+    return firmas
+
+def _consolidacion():
+    # Importación diferida de las funciones de consolidación y sus dependencias
+    import consolidacion
+    return consolidacion
+
+def _funcion_etapa(espec, motor, c):
     """
-    Crea una carpeta con un nombre que incluye la fecha y hora actual al final.
-    
-    :param base_nombre_carpeta: Nombre base para la carpeta.
-    :param ruta_base: Ruta donde se creará la carpeta. Por defecto, en el directorio actual.
-    :return: Ruta completa de la carpeta creada.
+    Devuelve la función que calcula un nodo del plan: la función con nombre de su 'funcion'
+    o, si no la tiene, el intérprete de especificaciones, ambos del motor si los implementa.
     """
-    try:
-        # Obtener la fecha y hora actuales en formato 'YYYY-MM-DDTHH-MM-SS'
-        fecha_hora = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-        
-        # Construir el nombre completo de la carpeta
-        nombre_completo_carpeta = f"{base_nombre_carpeta}_{fecha_hora}"
-        ruta_completa_carpeta = os.path.join(ruta_base, nombre_completo_carpeta)
-        
-        # Crear la carpeta
-        os.makedirs(ruta_completa_carpeta, exist_ok=True)
-        print(f"Carpeta creada: {ruta_completa_carpeta}")
-        return ruta_completa_carpeta
-    except Exception as e:
-        print(f"Error al crear la carpeta: {e}")
-        return None
+    funcion = espec.get("funcion") or "ejecutar_especificacion"
+    funcion = getattr(motor, funcion, getattr(c, funcion))
+    return funcion if espec.get("funcion") else functools.partial(funcion, espec)
 
-def mover_archivos_a_carpeta(lista_archivos, carpeta_destino):
-    """
-    Mueve una lista de archivos a una carpeta destino.
-    
-    :param lista_archivos: Lista con las rutas de los archivos a mover.
-    :param carpeta_destino: Ruta de la carpeta destino.
-    :return: None
+def etapas_necesarias(objetivos, etapas=ETAPAS, disponibles=()):
     """
-    try:
-        # Crear la carpeta destino si no existe
-        carpeta_destino = crear_carpeta(carpeta_destino)
-        
-        for archivo in lista_archivos:
-            if os.path.isfile(archivo):  # Verificar que el archivo existe
-                destino = os.path.join(carpeta_destino, os.path.basename(archivo))  # Ruta destino
-                shutil.move(archivo, destino)  # Mover el archivo
-                print(f"Archivo movido: {archivo} -> {destino}")
-            else:
-                print(f"El archivo no existe: {archivo}")
-    except Exception as e:
-        print(f"Error al mover archivos: {e}")
+    Devuelve las etapas que hay que ejecutar para obtener los objetivos, en orden de declaración.
 
-def validar_archivos(lista_archivos):
+    :param objetivos: Etapas cuyo resultado se necesita.
+    :param etapas: Diccionario {etapa: (función, entradas)}.
+    :param disponibles: Etapas o entradas cuyo resultado ya se tiene y no se vuelve a calcular.
+    :return: Lista de etapas a ejecutar.
     """
-    Valida que una lista de archivos no contenga valores vacíos.
-    
-    :param lista_archivos: Lista de rutas de archivos.
-    :return: True si todos los archivos son válidos, False si hay archivos faltantes.
+    pendientes, necesarias = list(objetivos), set()
+    while pendientes:
+        nombre = pendientes.pop()
+        if nombre in necesarias or nombre in disponibles or nombre not in etapas:
+            continue
+        necesarias.add(nombre)
+        pendientes.extend(etapas[nombre][1])
+    return [nombre for nombre in etapas if nombre in necesarias]
+
+def entradas_necesarias(objetivos, etapas=ETAPAS, disponibles=()):
     """
-    # Filtrar archivos vacíos
-    archivos_faltantes = [archivo for archivo in lista_archivos if archivo == ""]
-    
-    if archivos_faltantes:
-        print("Error: Faltan archivos necesarios para el proceso del reporte.")
-        sys.exit(1)  # Rompe la ejecución con un código de error
-        return False
-    
-    print("Todos los archivos son válidos.")
-    return True
-
-
-
-def crearDataframeExistenciaFinal(dfExistencias):
-    #Crea copia de DF de existencias para agrupación de existencias globales
-    dfExistenciasGrp = dfExistencias.copy(deep=True)
-    dfExistenciasGrp = filtrar_columnas_df(dfExistenciasGrp, ["ProdConcat", "Existencia"])
-    dfExistenciasGrpGlobal = dfExistenciasGrp.groupby('ProdConcat').agg({
-            'Existencia': 'sum'
-        }).reset_index()
-
-
-    # Realiza un PIVOT para los almacenes y calculos para agrupar los productos por ProdConcat
-    # Pivotar los datos para que cada Almacen tenga su propia columna
-    pivot = dfExistencias.pivot_table(
-        index="ProdConcat", 
-        columns="Almacen", 
-        values="Existencia", 
-        aggfunc="sum"  # Sumamos si hay duplicados
-    )
+    Devuelve las entradas (familias de archivos) que requieren las etapas de los objetivos.
 
-    # Renombrar las columnas del pivote agregando un prefijo
-    pivot = pivot.rename(columns=lambda col: f"Existencias en {col}")
-
-    # Resetear el índice del pivot
-    pivot.reset_index(inplace=True)
-
-    # Agrupar para obtener el primer valor de 'Nombre' y 'TipoProducto'
-    metadata = dfExistencias.groupby('ProdConcat').agg({
-        'Nombre': 'first',
-        'TipoProducto': 'first',
-        'Modelo': 'first',
-        'Marca': 'first',
-        "Publico General": 'mean'
-    }).reset_index()
-    
-    # Combinar el pivot con los datos adicionales
-    dfExistenciasAlmacenes = pd.merge(metadata, pivot, on="ProdConcat", how="left")
-
-    # #USAR dfExistenciasAlmacenes y dfExistenciasGrpGlobal para obtener datos limpios
-    dfExistenciasFinal =  pd.merge(dfExistenciasAlmacenes, dfExistenciasGrpGlobal, on="ProdConcat", how="inner")
-    return dfExistenciasFinal
-
-
-def creaReporteExistenciaConcentrada(dfExistenciasFinal):
-    dfConcentradoExistencias = dfExistenciasFinal.copy(deep=True)
-    dfConcentradoExistencias = eliminar_columnas_df(dfConcentradoExistencias, ["ProdConcat", "TipoProducto"])
-
-    # Reemplazar NaN con un valor predeterminado antes de agrupar
-    dfConcentradoExistencias[["Marca", "Modelo", "Nombre"]] = dfConcentradoExistencias[["Marca", "Modelo", "Nombre"]].fillna("Desconocido")
-
-    dfConcentradoExistencias = dfConcentradoExistencias.groupby(["Marca", "Modelo", "Nombre"]).agg({
-        'Existencias en Central Cell 20 de noviembre': 'sum',
-        'Existencias en Central Cell Almacén general': 'sum',
-        'Existencias en Central Cell Abastos': 'sum',
-        'Existencias en Central Cell Fortín': 'sum',
-        'Existencias en Central Cell Labotienda': 'sum',
-        'Existencias en Central Cell Nuño del Mercado': 'sum',
-        'Existencias en Central Cell Plaza Bella': 'sum',
-        'Existencias en Central Cell Plaza Bonn': 'sum',
-        'Existencias en Central Cell Reforma': 'sum',
-        'Existencias en Central Cell Revistería': 'sum',
-        'Existencias en Central Cell Violetas': 'sum',
-        'Existencia': 'sum'
-    }).reset_index()
-        # Renombrar columnas del DataFrame
-    dfPiezasConsumidas.rename(columns={
-        "Nombre": "Clasificación"
-    }, inplace=True)
-
-
-    generar_excel_by_df(dfConcentradoExistencias, "BI-CONCENTRADO-EXISTENCIAS-BY-MODELO-MARCA")
-
-
-
-def creaDataFrameExistenciasComprasFinal(dfExistenciasFinal, dfCompras):
-    dfComprasAdjusted = dfCompras.copy(deep=True)
-    dfComprasAdjusted = eliminar_columnas_df(dfComprasAdjusted, ["Almacen"])
-    #Agrupa los datos de compras para limpiar la muestra
-    # Paso 1: Transformar la columna Fecha para que solo contenga la fecha sin la hora
-    dfComprasAdjusted["Fecha"] = pd.to_datetime(dfComprasAdjusted["Fecha"]).dt.date
-    # Paso 2: Filtrar los registros con la fecha más reciente por producto
-    # Ordenar el DataFrame por Producto y Fecha en orden descendente
-    dfComprasAdjusted = dfComprasAdjusted.sort_values(by=["Producto", "Fecha"], ascending=[True, False])
-    # Mantener solo el registro más reciente para cada Producto
-    dfFiltradoCompras = dfComprasAdjusted.drop_duplicates(subset="Producto", keep="first")
-    dfFiltradoCompras.rename(columns={'Producto': 'ProdConcat'}, inplace=True)
-    #CASI LO FINAL
-    dfExistenciasComprasFinal =  pd.merge(dfExistenciasFinal, dfFiltradoCompras, on="ProdConcat", how="left")
-    dfExistenciasComprasFinal.rename(columns={'Existencia': 'Existencia Global', 'Fecha':'Última Fecha Compra', 'Costo':'Precio Compra', 'Cantidad':'Cantidad Comprada Ultimo Mov'}, inplace=True)
-    # Verificar si 'Publico General' es un DataFrame y corregir
-    if isinstance(dfExistenciasComprasFinal["Publico General"], pd.DataFrame):
-        # Si es un DataFrame, tomar la primera columna válida (ajustar según necesidad)
-        dfExistenciasComprasFinal["Publico General"] = dfExistenciasComprasFinal["Publico General"].iloc[:, 0]
-    # Lista actual de columnas en el DataFrame
-    columnas_actuales = dfExistenciasComprasFinal.columns.tolist()
-    # Crear un nuevo orden, asegurando que no se dupliquen columnas
-    columnas_nuevo_orden = []
-    for col in columnas_actuales:
-        if col != "Publico General" and col != "Cantidad Comprada Ultimo Mov":  # Evitar duplicar la columna en su posición original
-            columnas_nuevo_orden.append(col)
-        if col == "Precio Compra":  # Insertar "Publico General" después de "Precio Compra"
-            columnas_nuevo_orden.append("Publico General")
-        if col == "Última Fecha Compra":
-            columnas_nuevo_orden.append("Cantidad Comprada Ultimo Mov")
-    # Reorganizar las columnas del DataFrame
-    dfExistenciasComprasFinal = dfExistenciasComprasFinal[columnas_nuevo_orden]
-    dfExistenciasComprasFinal['Precio Compra'] = pd.to_numeric(dfExistenciasComprasFinal['Precio Compra'], errors='coerce')
-    IVA = .16
-    CIEN = 100
-    # Verificar que las columnas sean numéricas y manejar NaN
-    if pd.api.types.is_numeric_dtype(dfExistenciasComprasFinal["Publico General"]) and pd.api.types.is_numeric_dtype(dfExistenciasComprasFinal["Precio Compra"]):
-        # Rellenar NaN con 0 para evitar errores durante la resta
-        dfExistenciasComprasFinal["Publico General"] = dfExistenciasComprasFinal["Publico General"].fillna(0)
-        dfExistenciasComprasFinal["Precio Compra"] = dfExistenciasComprasFinal["Precio Compra"].fillna(0)
-        # Crear la columna 'Utilidad Bruta'
-        dfExistenciasComprasFinal['Costo'] = dfExistenciasComprasFinal["Precio Compra"]+(dfExistenciasComprasFinal["Precio Compra"]*IVA)
-        # Crear la columna 'Utilidad Bruta'
-        dfExistenciasComprasFinal['Utilidad'] = ((dfExistenciasComprasFinal["Publico General"]-dfExistenciasComprasFinal['Costo'])/dfExistenciasComprasFinal['Publico General']) * CIEN
-        print("Columna 'Utilidad' y 'Costo' creada exitosamente.")
-    else:
-        print("Error: Las columnas 'Publico General' y 'Precio Compra' deben ser numéricas.")
-    # Lista actual de columnas en el DataFrame
-    columnas_actuales = dfExistenciasComprasFinal.columns.tolist()
-    # Crear un nuevo orden, asegurando que no se dupliquen columnas
-    columnas_nuevo_orden = []
-    for col in columnas_actuales:
-        if col != "Costo":  # Evitar duplicar la columna en su posición original
-            columnas_nuevo_orden.append(col)
-        if col == "Precio Compra": 
-            columnas_nuevo_orden.append("Costo")
-    # Reorganizar las columnas del DataFrame
-    dfExistenciasComprasFinal = dfExistenciasComprasFinal[columnas_nuevo_orden]
-    return dfExistenciasComprasFinal
-
-
-def creaDataFrameVentasFinal(dfVentas, dfPiezasConsumidas):
-    # Combinar dfVentas y dfPiezasConsumidas
-    dfVentas = pd.concat([dfVentas, dfPiezasConsumidas], ignore_index=True)
-    dfVentas["Cantidad"] = dfVentas["Cantidad"].fillna(0)
-    # Agrupar por 'Almacen' y 'ProdConcat', sumando las cantidades
-    dfVentas = dfVentas.groupby(["Almacen", "ProdConcat"], as_index=False).agg({"Cantidad": "sum"})
-
-
-    dfVentasTotales = dfVentas.copy(deep=True)
-
-    # Paso 1: Agrupar por 'ProdConcat' y 'Almacen' para sumar las cantidades
-    dfVentasAgrupado = dfVentas.groupby(["ProdConcat", "Almacen"]).agg({"Cantidad": "sum"}).reset_index()
-
-    # Paso 2: Pivoteo por 'ProdConcat' y 'Almacen'
-    pivotVentas = dfVentasAgrupado.pivot_table(
-        index="ProdConcat", 
-        columns="Almacen", 
-        values="Cantidad", 
-        aggfunc="sum"  # Ya no debería ser necesario, pero lo dejamos por seguridad
-    )
-
-    # Paso 3: Renombrar las columnas del pivote agregando un prefijo
-    pivotVentas = pivotVentas.rename(columns=lambda col: f"Ventas de {col}")
-
-    # Paso 4: Convertir el índice del pivote a una columna para un DataFrame plano
-    dfVentasFinal = pivotVentas.reset_index()
-
-
-    dfVentasTotales = eliminar_columnas_df(dfVentasTotales, ["Almacen"])
+    :return: Lista de entradas, sin repetir, en el orden en que aparecen.
+    """
+    entradas = [entrada for nombre in etapas_necesarias(objetivos, etapas, disponibles) for entrada in etapas[nombre][1]]
+    entradas += [objetivo for objetivo in objetivos if objetivo not in etapas]
+    return [entrada for entrada in dict.fromkeys(entradas) if entrada not in etapas and entrada not in disponibles]
 
-    dfVentasTotalesAgp = dfVentasTotales.groupby(["ProdConcat"]).agg({"Cantidad": "sum"}).reset_index()
+def etapas_dependientes(entradas, etapas=ETAPAS):
+    """
+    Devuelve las etapas cuyo resultado depende, directa o indirectamente, de las entradas.
 
-    # Merge de dfVentasFinal y dfVentasTotalesAgp por 'ProdConcat'
-    dfVentasFinalMerged = pd.merge(
-        dfVentasFinal, 
-        dfVentasTotalesAgp, 
-        on="ProdConcat",  # Clave común
-        how="inner"       # Tipo de merge (inner join)
-    )
+    :param entradas: Familias de archivos o etapas que cambiaron.
+    :param etapas: Diccionario {etapa: (función, entradas)}.
+    :return: Lista de etapas, en orden de declaración.
+    """
+    afectadas = set(entradas)
+    for nombre, (_, entradas_etapa) in etapas.items():
+        if afectadas.intersection(entradas_etapa):
+            afectadas.add(nombre)
+    return [nombre for nombre in etapas if nombre in afectadas]
 
-    dfVentasFinalMerged.rename(columns={ 'Cantidad':'Ventas Totales'}, inplace=True)
-    return dfVentasFinalMerged
+# Mensajes de cada hilo de etapa; fuera de una etapa se escribe a la salida original
+_salida_hilo = threading.local()
 
-def creaReporteExistenciasComprasVentasCC(dfExistenciasComprasFinal, dfVentasFinalMerged):
-    # Merge de dfExistenciasComprasFinal y dfVentasFinalMerged por 'ProdConcat'
-    dfResultadoFinalBIData = pd.merge(
-        dfExistenciasComprasFinal,
-        dfVentasFinalMerged,
-        on="ProdConcat",  # Clave común
-        how="left"       # Tipo de merge (inner join)
-    )
+class _SalidaPorHilo:
+    def __init__(self, salida):
+        self.salida = salida
 
-    generar_excel_by_df(dfResultadoFinalBIData, "BI-EXISTENCIAS-COMPRAS-VENTAS-CC")
+    def write(self, texto):
+        return (getattr(_salida_hilo, "mensajes", None) or self.salida).write(texto)
 
+    def __getattr__(self, nombre):
+        return getattr(self.salida, nombre)
 
-def convertir_columna_uppercase(df, columna="ProdConcat"):
+def _ejecutar_etapa_en_hilo(funcion, entradas):
     """
-    Convierte todos los valores de una columna de un DataFrame a mayúsculas.
+    Ejecuta una etapa dentro de un hilo de trabajo, esperando primero a las etapas de las que depende
+    y capturando sus mensajes para que se impriman en orden.
 
-    :param df: DataFrame que contiene la columna a transformar.
-    :param columna: Nombre de la columna que se desea convertir a mayúsculas. Por defecto, 'ProdConcat'.
-    :return: DataFrame con la columna transformada.
+    :return: Tupla (resultado, mensajes impresos durante la etapa, excepción o None).
     """
+    argumentos = []
+    for entrada in entradas:
+        if isinstance(entrada, Future):
+            resultado, _, error = entrada.result()
+            if error is not None:
+                # La etapa de la que depende falló; su error se reporta en su lugar
+                return None, "", None
+            entrada = resultado
+        argumentos.append(entrada)
+
+    _salida_hilo.mensajes = io.StringIO()
     try:
-        if columna not in df.columns:
-            raise ValueError(f"La columna '{columna}' no existe en el DataFrame.")
-
-        # Convertir la columna a mayúsculas
-        df[columna] = df[columna].str.upper()
-
-        return df
+        return funcion(*argumentos), _salida_hilo.mensajes.getvalue(), None
     except Exception as e:
-        print(f"Error al convertir la columna '{columna}' a mayúsculas: {e}")
-        return df
-
-
-
-# %%
-print("####################################################")
-print("Iniciando análisis de datos...")
-
-directorio = "./"  # Directorio actual
-
-#Archivos de existencias de productos
-archivosExistencias = "Existencia"
-archivosExitenciasMap = listar_archivos_excel_por_cadena(directorio, archivosExistencias)
-
-#Archivos de datos de compras
-archivosCompras = "Excel_Movimientos"
-archivosComprasMap = listar_archivos_excel_por_cadena(directorio, archivosCompras)
-
-#Archivos de datos de ventas
-archivosVentas = "Analisis de Ventas por Tickets"
-archivosVentasMap = listar_archivos_excel_por_cadena(directorio, archivosVentas)
-
-#Archivos de datos de ventas
-archivosPiezasConsumidas = "Excel_Reparaciones_Refacciones_Consumidas"
-archivosPiezasConsumidasMap = listar_archivos_excel_por_cadena(directorio, archivosPiezasConsumidas)
-
-archivosTrabajados = archivosExitenciasMap+ archivosComprasMap+ archivosVentasMap + archivosPiezasConsumidasMap
-
-#Fusión de archvios clasificados por reportes
-existenciasCC = fusionar_archivos_excel(lista_archivos=archivosExitenciasMap, nombre_salida="ExistenciasCC.xlsx")
-comprasCC = fusionar_archivos_excel(lista_archivos=archivosComprasMap, hoja="Detalle de movimientos", nombre_salida="ComprasCC.xlsx")
-ventasCC = fusionar_archivos_excel(lista_archivos=archivosVentasMap, nombre_salida="VentasCC.xlsx")
-piezasConsumidasCC = fusionar_archivos_excel(lista_archivos=archivosPiezasConsumidasMap, nombre_salida="PiezasConsumidasCC.xlsx")
-
-
-validar_archivos([existenciasCC, comprasCC, ventasCC, piezasConsumidasCC]) 
-
-#Qué columnas ocupamos de cada paquete de archivos
-columnasExistencias = ["Almacen", "ProdConcat", "Existencia", "Nombre", "TipoProducto", "Marca", "Modelo", "Publico General"]
-columnasCompras = ["Almacen", "Fecha", "Producto", "Costo", "Cantidad"]
-columnasVentas = ["Almacen", "ProdConcat", "Cantidad"]
-columnasPiezasConsumidas = ["Almacén Salida Reparación", "Producto", "Cantidad"]
-
-#Generación de dataframe de existencias y ajustes por valores numéricos
-dfExistencias = crear_dataframe_desde_archivo(existenciasCC, columnasExistencias)
-dfExistencias = reemplazar_ceros_con_nan(dfExistencias, ["Existencia"])
+        return None, _salida_hilo.mensajes.getvalue(), e
+    finally:
+        del _salida_hilo.mensajes
 
-#Generación de dataframe de compras
-dfCompras = crear_dataframe_desde_archivo(comprasCC, columnasCompras)
-
-#Generación de dataframe de ventas
-dfVentas = crear_dataframe_desde_archivo(ventasCC, columnasVentas)
-
-#Generación de dataframe de piezas consumidas 
-dfPiezasConsumidas = crear_dataframe_desde_archivo(piezasConsumidasCC, columnasPiezasConsumidas)
-# Renombrar columnas del DataFrame de piezas consumidas
-dfPiezasConsumidas.rename(columns={
-    "Almacén Salida Reparación": "Almacen",
-    "Producto": "ProdConcat"
-}, inplace=True)
-
-# Eliminar filas duplicadas considerando todas las columnas
-# Este paso se comenta debido a que en una versión del reporte que saca plows
-# se detectaron piezas consumidas duplicadas por lo que se decidió no eliminar duplicados
-# sin embargo parece ser que actualmente esto ya no ocurre
-# dfPiezasConsumidas.drop_duplicates(inplace=True)
-
-
-dfVentas = convertir_columna_uppercase(dfVentas, "ProdConcat")
-dfExistencias = convertir_columna_uppercase(dfExistencias, "ProdConcat")
-dfPiezasConsumidas = convertir_columna_uppercase(dfPiezasConsumidas, "ProdConcat")
-dfCompras = convertir_columna_uppercase(dfCompras, "Producto")
-
-# Crea un un Dataframe que contenga los valores de existencias 
-# por almacen en forma de columnas y en otra la existencia global
-dfExistenciasFinal = crearDataframeExistenciaFinal(dfExistencias)
+def ejecutar_etapas(objetivos, datos, etapas, hilos=HILOS_ETAPAS):
+    """
+    Ejecuta solo las etapas necesarias para obtener los objetivos. Las ramas que no dependen
+    entre sí se ejecutan en paralelo y cada resultado se guarda en `datos`, de modo que
+    una siguiente llamada reutiliza lo ya calculado.
+
+    Se usan hilos y no procesos para que las etapas compartan los DataFrames intermedios
+    sin copiarlos; las etapas no modifican sus entradas.
+
+    :param objetivos: Etapas cuyo resultado se necesita.
+    :param datos: Diccionario {entrada o etapa: resultado} con las entradas leídas y lo ya calculado. Se actualiza.
+    :param etapas: Diccionario {etapa: (función, entradas)}.
+    :param hilos: Número de hilos. None usa el valor por defecto de ThreadPoolExecutor; 1 ejecuta en secuencia.
+        Con perfilado o límite de memoria siempre se ejecuta en secuencia, para que cada etapa mida solo su trabajo.
+    :return: Diccionario {objetivo: resultado}.
+    """
+    c = sys.modules.get("consolidacion")
+    if c is not None and c.etapas_en_secuencia():
+        hilos = 1
+
+    pendientes = etapas_necesarias(objetivos, etapas, disponibles=datos)
+    faltantes = [entrada for nombre in pendientes for entrada in etapas[nombre][1] if entrada not in datos and entrada not in etapas]
+    if faltantes:
+        raise KeyError(f"Faltan las entradas {sorted(set(faltantes))} para las etapas {pendientes}")
+
+    if hilos == 1 or len(pendientes) <= 1:
+        for nombre in pendientes:
+            funcion, entradas = etapas[nombre]
+            datos[nombre] = funcion(*(datos[entrada] for entrada in entradas))
+        return {objetivo: datos[objetivo] for objetivo in objetivos}
+
+    salida_original = sys.stdout
+    sys.stdout = _SalidaPorHilo(salida_original)
+    try:
+        # Las etapas se envían en orden de declaración: cuando un hilo espera a otra etapa,
+        # esa etapa ya está en ejecución o terminada
+        with ThreadPoolExecutor(max_workers=hilos) as executor:
+            futuros = {}
+            for nombre in pendientes:
+                funcion, entradas = etapas[nombre]
+                argumentos = [futuros.get(entrada, datos.get(entrada)) for entrada in entradas]
+                futuros[nombre] = executor.submit(_ejecutar_etapa_en_hilo, funcion, argumentos)
+
+            for nombre, futuro in futuros.items():
+                resultado, mensajes, error = futuro.result()
+                if mensajes:
+                    salida_original.write(mensajes)
+                if error is not None:
+                    raise error
+                datos[nombre] = resultado
+    finally:
+        sys.stdout = salida_original
+
+    return {objetivo: datos[objetivo] for objetivo in objetivos}
+
+
+class ErrorValidacion(ValueError):
+    """
+    Los archivos de entrada no tienen las hojas o columnas que ocupan los reportes, o no se pudieron leer.
 
-# Genera el primer reporte que dará como resultado el acumulado 
-# de existencias de Productos dividido por MARCA-MODELO-CATEGORÍA 
-# por sucursal y globalmente
-creaReporteExistenciaConcentrada(dfExistenciasFinal)
+    :param problemas: Lista de problemas encontrados.
+    """
 
-# Crea un DataFrame que contiene las existencias de productos por almacén 
-# (en columnas) y una columna con la existencia global total
-# a su vez, quedan agrupada la ultima compra hecha, junto con la fecha para cada uno de los productos
-dfExistenciasComprasFinal = creaDataFrameExistenciasComprasFinal(dfExistenciasFinal, dfCompras)
-generar_excel_by_df(dfExistenciasComprasFinal, "BI-EXISTENCIA-CC")
+    def __init__(self, problemas):
+        super().__init__(f"Se encontraron {len(problemas)} problema(s) en los archivos de entrada")
+        self.problemas = problemas
 
-# Fusiona los DataFrames de ventas y piezas consumidas, consolidando las 
-# cantidades de productos vendidos por almacén y obteniendo un DataFrame 
-# con el detalle completo de ventas
-dfVentasFinalMerged = creaDataFrameVentasFinal(dfVentas, dfPiezasConsumidas)
-generar_excel_by_df(dfVentasFinalMerged, "BI-VENTAS-CC")
+class PipelineReporte:
+    """
+    Pipeline del reporte BI con etapas explícitas:
+
+    descubrir -> validar -> leer -> transformar -> escribir -> guardar_instantanea -> archivar
+
+    Cada etapa guarda su resultado en el objeto, por lo que pueden ejecutarse por separado
+    (por ejemplo, para medirlas o integrarlas en otro proceso) o todas con `ejecutar`.
+    Solo se leen las familias y se calculan las etapas de ETAPAS que ocupan los reportes solicitados.
+
+    :param entrada: Carpeta con las exportaciones de origen.
+    :param salida: Carpeta donde se escriben los reportes, el historial y la carpeta de archivo. Por defecto, la de entrada.
+    :param reportes: Lista de reportes a generar (claves de REPORTES). Si es None, se generan todos.
+    :param opciones: Diccionario con las opciones del motor que reemplazan las constantes de `consolidacion`
+        ('formato_salida', 'libro_unico', 'procesos_lectura', 'procesos_escritura',
+        'formato_consolidado', 'directorio_cache', 'modo_perfilado', 'filas_por_bloque_ventas',
+        'ventana_velocidad', 'archivo_velocidad', 'deduplicar_familias', 'archivo_huellas_filas', 'dias_huellas_filas',
+        'limite_memoria_mb')
+        además de 'hilos_etapas' (HILOS_ETAPAS), 'motor' (MOTOR), 'directorio_instantaneas'
+        (`historico.DIRECTORIO_INSTANTANEAS`) y 'fecha_instantanea' (día de los datos para la instantánea y las ventanas de velocidad;
+        por defecto, el de la ejecución).
+    :param archivar: Si es True, al final se mueven los archivos trabajados a la carpeta BI-DATA-CC_<fecha>.
+    """
 
+    def __init__(self, entrada=".", salida=None, reportes=None, opciones=None, archivar=True):
+        self.entrada = entrada
+        self.salida = salida or entrada
+        self.reportes = list(reportes or REPORTES)
+        self.opciones = dict(opciones or {})
+        self.archivar_al_final = archivar
+
+        reportes_invalidos = [reporte for reporte in self.reportes if reporte not in REPORTES]
+        if reportes_invalidos:
+            raise ValueError(f"Reportes no soportados: {reportes_invalidos}")
+
+        self.archivos = {}
+        # Familias leídas y resultados de las etapas ya calculadas, que se reutilizan entre llamadas
+        self.datos = {}
+        self.resultados = {}
+        self.archivos_generados = []
+        # Filas leídas, duplicadas y conservadas por archivo de las familias deduplicadas
+        self.deduplicacion = {}
+        self.carpeta_archivo = None
+        self.inicio = None
+
+    def opcion(self, nombre):
+        """
+        Devuelve una opción del motor, o la constante equivalente de `consolidacion` si no se indicó.
+        """
+        if nombre in self.opciones:
+            return self.opciones[nombre]
+        return getattr(_consolidacion(), nombre.upper())
+
+    def ruta_salida(self, ruta):
+        """
+        Devuelve una ruta relativa dentro de la carpeta de salida (las rutas absolutas no cambian).
+        """
+        return None if ruta is None else os.path.join(self.salida, ruta)
+
+    def configuracion(self):
+        """
+        Devuelve la configuración efectiva de la ejecución.
+        """
+        return {
+            "entrada": self.entrada,
+            "salida": self.salida,
+            "reportes": self.reportes,
+            "hilos_etapas": self.opciones.get("hilos_etapas", HILOS_ETAPAS),
+            "motor": self.opciones.get("motor", MOTOR),
+            "directorio_instantaneas": self.directorio_instantaneas(),
+            **{nombre: self.opcion(nombre) for nombre in (
+                "formato_consolidado", "formato_salida", "libro_unico", "procesos_lectura",
+                "procesos_escritura", "directorio_cache", "modo_perfilado", "filas_por_bloque_ventas",
+                "ventana_velocidad", "deduplicar_familias", "limite_memoria_mb",
+            )},
+        }
+
+    def objetivos(self):
+        """
+        Devuelve las etapas que producen los reportes solicitados.
+        """
+        return [REPORTES[reporte][1] for reporte in self.reportes]
+
+    def familias_necesarias(self):
+        """
+        Devuelve las familias de archivos que requieren los reportes solicitados y que aún no se han leído.
+        """
+        return entradas_necesarias(self.objetivos(), disponibles=self.datos)
+
+    def familias_leidas(self):
+        """
+        Devuelve las familias de archivos que ya se leyeron, en el orden de FAMILIAS.
+        """
+        return [familia for familia in FAMILIAS if familia in self.datos]
+
+    def columnas_familia(self, familia):
+        """
+        Devuelve las columnas que se leen de una familia: las de FAMILIAS y, si la familia se deduplica,
+        las columnas clave que no se ocupan en el reporte.
+        """
+        columnas = FAMILIAS[familia][2]
+        claves = (self.opcion("deduplicar_familias") or {}).get(familia, [])
+        return columnas + [columna for columna in claves if columna not in columnas]
+
+    def suma_familia(self, familia):
+        """
+        Devuelve la columna que se suma al leer una familia por bloques, o None si la familia se lee completa.
+
+        Con la lectura por bloques, de ventas y piezas consumidas solo se conservan las cantidades sumadas
+        por almacén y producto. Las que se deduplican se leen completas, porque las filas repetidas se
+        descartan antes de sumar.
+        """
+        if not self.opcion("filas_por_bloque_ventas") or familia not in ("Ventas", "PiezasConsumidas"):
+            return None
+        return None if familia in (self.opcion("deduplicar_familias") or {}) else "Cantidad"
+
+    def descubrir(self):
+        """
+        Clasifica los archivos del directorio de entrada por familia de reporte.
+
+        :return: Diccionario {familia: lista de rutas}.
+        """
+        self.archivos = clasificar_archivos(self.entrada)
+        return self.archivos
+
+    def validar(self):
+        """
+        Revisa, antes de leer los datos, que cada familia que ocupan los reportes solicitados
+        tenga al menos un archivo de origen y que cada archivo tenga la hoja y las columnas
+        que se leen de él. Solo se leen los nombres de las hojas y la fila de encabezados,
+        y se informan todos los problemas a la vez.
+
+        :return: Lista de problemas encontrados (vacía si todo está en orden).
+        """
+        import encabezados
+
+        if not self.archivos:
+            self.descubrir()
+        familias = entradas_necesarias(self.objetivos())
+
+        problemas = [
+            f"No se encontraron archivos de {familia} ('*{FAMILIAS[familia][0]}*' con extensión {', '.join(EXTENSIONES_ENTRADA)}) en {self.entrada}"
+            for familia in familias if not self.archivos[familia]
+        ]
+        problemas += encabezados.revisar_familias({
+            familia: (self.archivos[familia], FAMILIAS[familia][1], self.columnas_familia(familia)) for familia in familias
+        })
+        for familia in familias:
+            print(f"{familia}: {len(self.archivos[familia])} archivo(s)")
+        for problema in problemas:
+            print(f"Error: {problema}")
+        return problemas
+
+    def leer(self, familias=None):
+        """
+        Lee y fusiona en memoria las familias de archivos, descarta las filas repetidas entre archivos
+        de las familias que se deduplican, integra las compras nuevas al historial de últimas compras
+        y deja los DataFrames listos para las transformaciones.
+
+        Todas las familias comparten el diccionario de claves: las que ya se habían leído se
+        recodifican con el diccionario ampliado por las que se leen en esta llamada.
+
+        :param familias: Familias a leer. Si es None, se leen las que ocupan los reportes solicitados.
+        :return: Diccionario {familia: DataFrame} con las familias leídas en esta llamada.
+        :raises ErrorValidacion: Si alguna familia no se pudo leer (p. ej. a un archivo le faltan columnas).
+        """
+        c = _consolidacion()
+        if not self.archivos:
+            self.descubrir()
+        familias = self.familias_necesarias() if familias is None else [familia for familia in familias if familia not in self.datos]
+        if not familias:
+            return {}
+        directorio_cache = self.ruta_salida(self.opcion("directorio_cache"))
+        ruta_ultimas_compras = self.ruta_salida(c.ARCHIVO_ULTIMAS_COMPRAS)
+        leerCompras = "Compras" in familias
+
+        #Compras: solo se leen los movimientos que aún no están integrados al historial de últimas compras
+        dfUltimasCompras, archivosComprasIntegrados, huellasCompras, archivosComprasNuevos = None, {}, {}, []
+        if leerCompras:
+            archivosComprasMap = self.archivos["Compras"]
+            dfUltimasCompras, archivosComprasIntegrados = c.cargar_ultimas_compras(ruta_ultimas_compras)
+            huellasCompras = {archivo: c.calcular_huella_archivo(archivo) for archivo in archivosComprasMap if os.path.isfile(archivo)}
+            archivosComprasNuevos = [archivo for archivo in archivosComprasMap if huellasCompras.get(archivo) not in archivosComprasIntegrados]
+
+        #Las familias que se deduplican se leen con sus columnas clave y el archivo de origen de cada fila
+        deduplicar = {familia: columnas for familia, columnas in (self.opcion("deduplicar_familias") or {}).items() if familia in familias}
+
+        #Fusión en memoria de archivos clasificados por reportes, solo con las columnas que ocupamos.
+        #Los archivos de todas las familias se leen en paralelo
+        familiasReporte = {
+            familia: (self.archivos[familia], hoja, self.columnas_familia(familia) + ([c.COLUMNA_ARCHIVO_ORIGEN] if familia in deduplicar else []))
+            for familia, (_, hoja, _) in FAMILIAS.items() if familia in familias and familia != "Compras"
+        }
+        if leerCompras and (archivosComprasNuevos or dfUltimasCompras is None):
+            _, hoja, _ = FAMILIAS["Compras"]
+            familiasReporte["Compras"] = (archivosComprasNuevos, hoja, self.columnas_familia("Compras") + [c.COLUMNA_ARCHIVO_ORIGEN])
+        filas_por_bloque = self.opcion("filas_por_bloque_ventas")
+        sumas = {familia: self.suma_familia(familia) for familia in familiasReporte if self.suma_familia(familia)} or None
+        leidas = c.fusionar_familias_excel(
+            familiasReporte,
+            procesos=self.opcion("procesos_lectura"),
+            directorio_cache=directorio_cache,
+            sumas=sumas,
+            filas_por_bloque=filas_por_bloque
+        )
+        c.depurar_cache_lecturas(directorio_cache)
+
+        #Los movimientos de un archivo cuentan como integrados aunque todas sus filas resulten repetidas
+        archivosComprasLeidos = set()
+        if leidas.get("Compras") is not None:
+            archivosComprasLeidos = set(leidas["Compras"][c.COLUMNA_ARCHIVO_ORIGEN].unique())
+
+        #Filas repetidas entre archivos que se traslapan, antes de cualquier suma; después solo se conservan las columnas del reporte
+        if deduplicar:
+            #Cada archivo es dueño de sus filas por su contenido, no por su nombre (el ERP repite los nombres)
+            huellasArchivos = {os.path.basename(archivo): huellasCompras.get(archivo) or c.calcular_huella_archivo(archivo)
+                               for familia in deduplicar for archivo in self.archivos[familia] if os.path.isfile(archivo)}
+            leidas, conteos = c.deduplicar_familias(
+                leidas,
+                deduplicar,
+                ruta=self.ruta_salida(self.opcion("archivo_huellas_filas")),
+                dias=self.opcion("dias_huellas_filas"),
+                fecha=self.opciones.get("fecha_instantanea") or self.inicio,
+                huellas_archivos=huellasArchivos,
+            )
+            self.deduplicacion.update(conteos)
+            for familia in conteos:
+                columnas = FAMILIAS[familia][2] + ([c.COLUMNA_ARCHIVO_ORIGEN] if familia == "Compras" else [])
+                leidas[familia] = leidas[familia][columnas]
+
+        dfExistencias = leidas.get("Existencias")
+        dfComprasNuevas = leidas.get("Compras")
+        dfVentas = leidas.get("Ventas")
+        dfPiezasConsumidas = leidas.get("PiezasConsumidas")
+
+        #Copia de archivo de los consolidados
+        formato_consolidado = self.opcion("formato_consolidado")
+        c.guardar_consolidado(dfExistencias, self.ruta_salida("ExistenciasCC"), formato_consolidado)
+        c.guardar_consolidado(dfComprasNuevas, self.ruta_salida("ComprasCC"), formato_consolidado)
+        c.guardar_consolidado(dfVentas, self.ruta_salida("VentasCC"), formato_consolidado)
+        c.guardar_consolidado(dfPiezasConsumidas, self.ruta_salida("PiezasConsumidasCC"), formato_consolidado)
+
+        #Diccionario único de claves de producto (en mayúsculas) y de almacén, compartido por todos los DataFrames,
+        #incluidos los de las familias que ya se habían leído (las piezas consumidas ya tienen sus columnas renombradas)
+        previos = [self.datos.get(familia) for familia in ("Existencias", "Ventas", "PiezasConsumidas", "Compras")]
+        c.codificar_claves_compartidas(
+            [dfExistencias, dfVentas, dfPiezasConsumidas, dfComprasNuevas, dfUltimasCompras] + previos,
+            ["ProdConcat", "ProdConcat", "Producto", "Producto", "Producto", "ProdConcat", "ProdConcat", "ProdConcat", "Producto"],
+            mayusculas=True
+        )
+        c.codificar_claves_compartidas(
+            [dfExistencias, dfVentas, dfPiezasConsumidas] + previos[:3],
+            ["Almacen", "Almacen", "Almacén Salida Reparación", "Almacen", "Almacen", "Almacen"]
+        )
+
+        #Integración de los movimientos nuevos a la última compra de cada producto
+        dfCompras = c.actualizar_ultimas_compras(dfUltimasCompras, dfComprasNuevas) if leerCompras else None
+
+        nuevos = {"Existencias": dfExistencias, "Compras": dfCompras, "Ventas": dfVentas, "PiezasConsumidas": dfPiezasConsumidas}
+        nuevos = {familia: df for familia, df in nuevos.items() if familia in familias}
+        if not c.validar_archivos(list(nuevos.values())):
+            raise ErrorValidacion([f"No se pudieron leer los archivos de {familia}" for familia, df in nuevos.items() if df is None])
+
+        if leerCompras:
+            archivosComprasIntegrados.update({huellasCompras[archivo]: os.path.basename(archivo) for archivo in archivosComprasNuevos if os.path.basename(archivo) in archivosComprasLeidos})
+            c.guardar_ultimas_compras(dfCompras, archivosComprasIntegrados, ruta_ultimas_compras)
+
+        #Ajustes por valores numéricos en existencias
+        if dfExistencias is not None:
+            nuevos["Existencias"] = c.reemplazar_ceros_con_nan(dfExistencias, ["Existencia"])
+
+        # Renombrar columnas del DataFrame de piezas consumidas
+        if dfPiezasConsumidas is not None:
+            dfPiezasConsumidas.rename(columns={
+                "Almacén Salida Reparación": "Almacen",
+                "Producto": "ProdConcat"
+            }, inplace=True)
+
+        # Eliminar filas duplicadas considerando todas las columnas
+        # Este paso se comenta debido a que en una versión del reporte que saca plows
+        # se detectaron piezas consumidas duplicadas por lo que se decidió no eliminar duplicados
+        # sin embargo parece ser que actualmente esto ya no ocurre
+        # dfPiezasConsumidas.drop_duplicates(inplace=True)
+        # Si vuelve a ocurrir, las filas repetidas entre archivos se descartan con la opción 'deduplicar_familias'
+
+        self.datos.update(nuevos)
+        return nuevos
+
+    def transformar(self):
+        """
+        Construye los DataFrames de los reportes solicitados, ejecutando solo las etapas
+        que ocupan y reutilizando las que ya se calcularon.
+
+        :return: Diccionario {nombre base del reporte: DataFrame}.
+        """
+        c = _consolidacion()
+        self.leer()
+
+        motor = c
+        if self.opciones.get("motor", MOTOR) == "duckdb":
+            import consolidacion_sql
+            if consolidacion_sql.disponible():
+                motor = consolidacion_sql
+            else:
+                print("DuckDB no está instalado, las etapas se ejecutarán con pandas.")
+
+        etapas = {nombre: (_funcion_etapa(espec, motor, c), entradas) for nombre, (espec, entradas) in ETAPAS.items()}
+        # Las ventanas de velocidad se guardan en la carpeta de salida, con la fecha de los datos de la ejecución
+        funcion, entradas = etapas["VelocidadInventario"]
+        etapas["VelocidadInventario"] = (functools.partial(
+            funcion,
+            ruta=self.ruta_salida(self.opcion("archivo_velocidad")),
+            fecha=self.opciones.get("fecha_instantanea") or self.inicio,
+            ventana=self.opcion("ventana_velocidad"),
+        ), entradas)
+        ejecutar_etapas(self.objetivos(), self.datos, etapas, hilos=self.opciones.get("hilos_etapas", HILOS_ETAPAS))
+
+        self.resultados = {REPORTES[reporte][0]: self.datos[REPORTES[reporte][1]] for reporte in self.reportes}
+        return self.resultados
+
+    def escribir(self, reportes=None):
+        """
+        Escribe los reportes solicitados en la carpeta de salida.
+
+        :param reportes: Reportes a escribir (claves de REPORTES). Si es None, o si se escribe un libro único, todos.
+        :return: Diccionario {reporte: archivo generado}, sin los que no se pudieron generar; con libro único,
+            todos los reportes apuntan al libro. La lista de archivos queda en `archivos_generados`.
+        """
+        c = _consolidacion()
+        if not self.resultados:
+            self.transformar()
+        libro_unico = self.opcion("libro_unico")
+        reportes = self.reportes if reportes is None or libro_unico else reportes
+        rutas = {reporte: self.ruta_salida(REPORTES[reporte][0]) for reporte in reportes}
+
+        # Escribe todos los reportes a la vez, una vez construidos
+        generados = c.generar_reportes(
+            {ruta: self.resultados[REPORTES[reporte][0]] for reporte, ruta in rutas.items()},
+            formato=self.opcion("formato_salida"),
+            libro_unico=self.ruta_salida(libro_unico),
+            procesos=self.opcion("procesos_escritura"),
+        )
+        archivos = {reporte: generados[ruta] for reporte, ruta in rutas.items() if ruta in generados}
+        self.archivos_generados = list(dict.fromkeys(archivos.values()))
+        return archivos
+
+    def directorio_instantaneas(self):
+        """
+        Devuelve la carpeta del almacén histórico de instantáneas, o None si está desactivado.
+        """
+        if "directorio_instantaneas" in self.opciones:
+            return self.ruta_salida(self.opciones["directorio_instantaneas"])
+        import historico
+        return self.ruta_salida(historico.DIRECTORIO_INSTANTANEAS)
+
+    def guardar_instantanea(self):
+        """
+        Agrega las existencias, ventas y últimas compras leídas al almacén histórico de instantáneas,
+        en la partición del día de la ejecución (o de la opción 'fecha_instantanea').
+
+        :return: Lista de archivos guardados.
+        """
+        directorio = self.directorio_instantaneas()
+        if directorio is None:
+            return []
+        import historico
+
+        tablas = historico.crear_tablas_instantanea(
+            self.datos.get("Existencias"),
+            self.datos.get("Ventas"),
+            self.datos.get("PiezasConsumidas"),
+            self.datos.get("Compras"),
+        )
+        fecha = self.opciones.get("fecha_instantanea") or self.inicio or datetime.now()
+        return historico.guardar_instantanea(tablas, fecha, directorio)
+
+    def preparar_ejecucion(self):
+        """
+        Prepara una ejecución o reconstrucción: fecha de inicio, mediciones vacías, modo de perfilado
+        ('modo_perfilado') y límite de memoria.
+        """
+        c = _consolidacion()
+        self.inicio = datetime.now()
+        c.REGISTRO_ETAPAS.clear()
+        c.MODO_PERFILADO = self.opcion("modo_perfilado")
+        self.configurar_memoria()
+
+    def configurar_memoria(self):
+        """
+        Prepara el modo de memoria acotada ('limite_memoria_mb'): con límite, las etapas se ejecutan
+        con copia en escritura. El límite solo se aplica durante `ejecutar` o `reconstruir` (ver
+        `limite_memoria`), por lo que no pasa a otras ejecuciones del mismo proceso.
+        """
+        if self.opcion("limite_memoria_mb") is not None:
+            _consolidacion().activar_copia_en_escritura()
+
+    def limite_memoria(self):
+        """
+        Devuelve el contexto que aplica el límite de memoria de esta ejecución; dentro de él, cada etapa
+        revisa la memoria antes y después de ejecutarse.
+        """
+        return _consolidacion().limite_memoria(self.opcion("limite_memoria_mb"))
+
+    def invalidar(self, familias):
+        """
+        Descarta las familias indicadas y las etapas que dependen de ellas, para que
+        se vuelvan a leer y calcular; el resto de lo leído y calculado se conserva.
+
+        :param familias: Familias de archivos que cambiaron.
+        :return: Reportes solicitados que dependen de esas familias.
+        """
+        afectadas = etapas_dependientes(familias)
+        for nombre in list(familias) + afectadas:
+            self.datos.pop(nombre, None)
+        self.resultados = {}
+        return [reporte for reporte in self.reportes if REPORTES[reporte][1] in afectadas]
+
+    def reconstruir(self, familias):
+        """
+        Vuelve a leer solo las familias que cambiaron y a escribir solo los reportes que dependen de ellas.
+
+        :param familias: Familias de archivos que cambiaron.
+        :return: Diccionario {reporte: archivo generado} de los reportes reconstruidos (ver `escribir`).
+        :raises ErrorValidacion: Si algún archivo de entrada no tiene las hojas o columnas necesarias.
+        """
+        self.preparar_ejecucion()
+
+        self.descubrir()
+        problemas = self.validar()
+        if problemas:
+            raise ErrorValidacion(problemas)
+        reportes = self.invalidar(familias)
+        if not reportes:
+            return {}
+        with self.limite_memoria():
+            self.transformar()
+            generados = self.escribir(reportes)
+        self.guardar_instantanea()
+        return generados
+
+    def archivar(self):
+        """
+        Mueve los archivos de origen, consolidados y reportes a la carpeta BI-DATA-CC_<fecha>
+        y escribe junto a ella el manifiesto de la ejecución.
+
+        :return: Ruta de la carpeta de archivo, o None si no se pudo crear.
+        """
+        c = _consolidacion()
+
+        # Reagrupar archivos y nuevos
+        archivosTrabajados = [archivo for familia in self.familias_leidas() for archivo in self.archivos[familia]]
+        archivosCompilados = listar_archivos_excel_por_cadena(self.salida, "CC")
+        if self.opcion("formato_consolidado") == "parquet":
+            archivosCompilados += listar_archivos_excel_por_cadena(self.salida, "CC", extension=".parquet")
+        archivosBI = listar_archivos_excel_por_cadena(self.salida, "BI-")
+        extension = c.EXTENSIONES_SALIDA.get(self.opcion("formato_salida"), ".xlsx")
+        if extension != ".xlsx":
+            archivosBI += listar_archivos_excel_por_cadena(self.salida, "BI-", extension=extension)
+
+        archivosTrabajados = archivosTrabajados + [self.ruta_salida(archivo) for archivo in archivosCompilados + archivosBI]
+        # Un archivo de origen también puede coincidir con el patrón de consolidados
+        archivosTrabajados = list(dict.fromkeys(os.path.normpath(archivo) for archivo in archivosTrabajados))
+        print(archivosTrabajados)
+        self.carpeta_archivo = c.mover_archivos_a_carpeta(archivosTrabajados, "BI-DATA-CC", self.salida)
+        return self.carpeta_archivo
+
+    def escribir_manifiesto(self):
+        """
+        Escribe el manifiesto JSON de la ejecución junto a la carpeta de archivo.
+
+        :return: Ruta del manifiesto, o None si no se pudo escribir.
+        """
+        c = _consolidacion()
+        inicio = self.inicio or datetime.now()
+        carpeta = self.carpeta_archivo or self.ruta_salida(f"BI-DATA-CC_{inicio.strftime('%Y-%m-%dT%H-%M-%S')}")
+        archivos_entrada = [archivo for familia in self.familias_leidas() for archivo in self.archivos[familia]]
+        return c.escribir_manifiesto(f"{carpeta}.json", inicio, archivos_entrada, configuracion=self.configuracion(), deduplicacion=self.deduplicacion)
+
+    def ejecutar(self):
+        """
+        Ejecuta todas las etapas del pipeline.
+
+        :return: Lista de archivos generados.
+        :raises ErrorValidacion: Si algún archivo de entrada no tiene las hojas o columnas necesarias.
+        :raises MemoryError: Si una etapa supera el límite de memoria ('limite_memoria_mb').
+        """
+        self.preparar_ejecucion()
+
+        self.descubrir()
+        # Se revisan los encabezados de todos los archivos antes de leer cualquiera
+        problemas = self.validar()
+        if problemas:
+            raise ErrorValidacion(problemas)
+        try:
+            with self.limite_memoria():
+                self.leer()
+                self.transformar()
+                self.escribir()
+        except MemoryError:
+            # El manifiesto registra la memoria de cada etapa hasta la que superó el límite
+            self.escribir_manifiesto()
+            raise
+        self.guardar_instantanea()
+        if self.archivar_al_final:
+            self.archivar()
+
+        # Manifiesto con las mediciones de cada etapa, junto a la carpeta de la ejecución
+        self.escribir_manifiesto()
+        return self.archivos_generados
+
+
+def vigilar(pipeline, intervalo=INTERVALO_VIGILANCIA, espera=ESPERA_VIGILANCIA, revisiones=None):
+    """
+    Mantiene el pipeline en memoria y reconstruye los reportes cada vez que cambian los archivos de entrada.
+
+    Cada `intervalo` segundos se revisan la fecha de modificación y el tamaño de los archivos clasificados.
+    Los cambios se acumulan hasta que pasan `espera` segundos sin cambios nuevos; entonces solo se vuelven a
+    leer las familias con archivos nuevos, modificados o eliminados (las lecturas sin cambios salen de la caché)
+    y solo se escriben los reportes que dependen de ellas. El archivo anterior de cada reporte reconstruido se
+    elimina (un libro único, cuando ya ningún reporte lo usa).
+
+    :param pipeline: PipelineReporte a mantener; no se archivan los archivos trabajados.
+    :param intervalo: Segundos entre revisiones.
+    :param espera: Segundos sin cambios antes de reconstruir.
+    :param revisiones: Número máximo de revisiones. Si es None, se vigila hasta interrumpir con Ctrl+C.
+    """
+    c = _consolidacion()
+    construidas = {familia: {} for familia in FAMILIAS}
+    observadas = firmas_archivos(pipeline.descubrir())
+    ultimo_cambio = time.monotonic() - espera
+    # Archivo vigente de cada reporte, según lo que devolvió su última escritura
+    vigentes = {}
+
+    print(f"Vigilando {os.path.abspath(pipeline.entrada)} (revisión cada {intervalo} s, espera de {espera} s). Ctrl+C para terminar.")
+    revision = 0
+    try:
+        while revisiones is None or revision < revisiones:
+            if revision:
+                time.sleep(intervalo)
+                firmas = firmas_archivos(pipeline.descubrir())
+                if firmas != observadas:
+                    observadas, ultimo_cambio = firmas, time.monotonic()
+            revision += 1
+
+            cambiadas = [familia for familia in FAMILIAS if observadas[familia] != construidas[familia]]
+            if not cambiadas or time.monotonic() - ultimo_cambio < espera:
+                continue
+
+            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} Cambios en {', '.join(cambiadas)}; reconstruyendo...")
+            inicio = time.perf_counter()
+            try:
+                generados = pipeline.reconstruir(cambiadas)
+                construidas = observadas
+            except ErrorValidacion as e:
+                # Se conserva lo construido; los reportes se reconstruyen cuando se corrijan los archivos
+                print(f"Error: {e}; se conservan los reportes anteriores.")
+                generados = None
+                construidas = observadas
+            except Exception as e:
+                # Un error pasajero (un archivo que aún se escribe o está bloqueado) se reintenta en la siguiente revisión
+                print(f"Error al reconstruir los reportes: {type(e).__name__}: {e}; se reintentará.")
+                generados = None
+
+            if generados:
+                # Los reportes reconstruidos reemplazan a su versión anterior
+                anteriores = [vigentes[reporte] for reporte in generados if reporte in vigentes]
+                vigentes.update(generados)
+                c.borrar_archivos([archivo for archivo in dict.fromkeys(anteriores) if archivo not in vigentes.values()])
+                print(f"Reportes actualizados en {time.perf_counter() - inicio:.1f} s: {[os.path.basename(archivo) for archivo in dict.fromkeys(generados.values())]}")
+    except KeyboardInterrupt:
+        print("Vigilancia terminada.")
+
+def _entero_o_none(valor):
+    # 'auto' usa todos los núcleos disponibles
+    return None if valor == "auto" else int(valor)
+
+def _familia_y_columnas(valor):
+    # 'Ventas=Almacen,ProdConcat,Cantidad,Ticket' -> ('Ventas', [columnas])
+    familia, _, columnas = valor.partition("=")
+    columnas = [columna.strip() for columna in columnas.split(",") if columna.strip()]
+    if familia not in FAMILIAS or not columnas:
+        raise argparse.ArgumentTypeError(f"se esperaba FAMILIA=COL1,COL2 con FAMILIA en {list(FAMILIAS)}: {valor}")
+    return familia, columnas
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description="Genera los reportes BI de existencias, compras y ventas a partir de las exportaciones del ERP."
+    )
+    parser.add_argument("--entrada", default=".", help="Carpeta con las exportaciones de origen (por defecto, la actual).")
+    parser.add_argument("--salida", help="Carpeta de los reportes, el historial y el archivo (por defecto, la de entrada).")
+    parser.add_argument("--reportes", nargs="+", choices=list(REPORTES), help="Reportes a generar (por defecto, todos).")
+    parser.add_argument("--formato-salida", choices=["xlsx", "xlsx-streaming", "parquet", "csv"], help="Formato de los reportes.")
+    parser.add_argument("--libro-unico", metavar="NOMBRE", help="Escribir todos los reportes como hojas de un solo libro.")
+    parser.add_argument("--formato-consolidado", choices=["parquet", "xlsx", "ninguno"], help="Copia de archivo de los consolidados.")
+    parser.add_argument("--procesos-lectura", type=_entero_o_none, default=argparse.SUPPRESS, metavar="N|auto", help="Procesos para leer los archivos de origen.")
+    parser.add_argument("--hilos-etapas", type=_entero_o_none, default=argparse.SUPPRESS, metavar="N|auto", help="Hilos para las etapas de transformación independientes (con --perfilado o --limite-memoria, siempre 1).")
+    parser.add_argument("--motor", choices=["pandas", "duckdb"], help="Motor de las etapas de transformación.")
+    parser.add_argument("--procesos-escritura", type=_entero_o_none, default=argparse.SUPPRESS, metavar="N|auto", help="Procesos para escribir los reportes.")
+    parser.add_argument("--ventas-por-bloques", type=int, metavar="FILAS", help="Leer ventas y piezas consumidas en bloques de FILAS filas, conservando solo las sumas por almacén y producto.")
+    parser.add_argument("--deduplicar", action="append", type=_familia_y_columnas, metavar="FAMILIA=COL1,COL2", help="Descartar las filas de FAMILIA repetidas entre archivos, identificadas por esas columnas (se puede repetir).")
+    parser.add_argument("--ventana-velocidad", type=int, metavar="N", help="Ejecuciones que se consideran en la velocidad de venta y los días de cobertura (0 las desactiva).")
+    parser.add_argument("--limite-memoria", type=float, metavar="MB", help="Memoria máxima de cada proceso; se detiene la ejecución antes de superarla y se comparten las columnas entre etapas en lugar de copiarlas.")
+    parser.add_argument("--sin-cache", action="store_true", help="No usar la caché de lecturas.")
+    parser.add_argument("--perfilado", choices=["cprofile", "tracemalloc"], help="Agregar un perfil de cada etapa al manifiesto.")
+    parser.add_argument("--sin-instantanea", action="store_true", help="No agregar la ejecución al almacén histórico de instantáneas.")
+    parser.add_argument("--fecha-instantanea", metavar="AAAA-MM-DD", help="Día de los datos para la instantánea histórica y las ventanas de velocidad (por defecto, el de la ejecución).")
+    parser.add_argument("--sin-archivar", action="store_true", help="No mover los archivos trabajados a la carpeta BI-DATA-CC_<fecha>.")
+    parser.add_argument("--vigilar", action="store_true", help="Mantener los datos en memoria y reconstruir los reportes afectados cada vez que cambien los archivos de entrada.")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_VIGILANCIA, metavar="SEG", help="Segundos entre revisiones de la carpeta de entrada en modo --vigilar.")
+    parser.add_argument("--espera", type=float, default=ESPERA_VIGILANCIA, metavar="SEG", help="Segundos sin cambios antes de reconstruir en modo --vigilar.")
+    parser.add_argument("--validar", action="store_true", help="Solo revisar los archivos de entrada, sin generar reportes.")
+    parser.add_argument("--invalidar-cache", action="store_true", help="Vaciar la caché de lecturas y salir.")
+    parser.add_argument("--cerrar-terminal", action="store_true", help="Cerrar la ventana de la terminal al terminar (Windows).")
+    return parser
+
+def opciones_desde_argumentos(args):
+    """
+    Convierte los argumentos de la línea de comandos en las opciones del pipeline.
+    """
+    opciones = {}
+    if args.formato_salida is not None:
+        opciones["formato_salida"] = args.formato_salida
+    if args.libro_unico is not None:
+        opciones["libro_unico"] = args.libro_unico
+    if args.formato_consolidado is not None:
+        opciones["formato_consolidado"] = None if args.formato_consolidado == "ninguno" else args.formato_consolidado
+    if hasattr(args, "procesos_lectura"):
+        opciones["procesos_lectura"] = args.procesos_lectura
+    if hasattr(args, "hilos_etapas"):
+        opciones["hilos_etapas"] = args.hilos_etapas
+    if args.motor is not None:
+        opciones["motor"] = args.motor
+    if hasattr(args, "procesos_escritura"):
+        opciones["procesos_escritura"] = args.procesos_escritura
+    if args.ventas_por_bloques is not None:
+        opciones["filas_por_bloque_ventas"] = args.ventas_por_bloques
+    if args.deduplicar:
+        opciones["deduplicar_familias"] = dict(args.deduplicar)
+    if args.ventana_velocidad is not None:
+        opciones["ventana_velocidad"] = args.ventana_velocidad or None
+    if args.limite_memoria is not None:
+        opciones["limite_memoria_mb"] = args.limite_memoria
+    if args.sin_cache:
+        opciones["directorio_cache"] = None
+    if args.perfilado is not None:
+        opciones["modo_perfilado"] = args.perfilado
+    if args.sin_instantanea:
+        opciones["directorio_instantaneas"] = None
+    if args.fecha_instantanea is not None:
+        opciones["fecha_instantanea"] = args.fecha_instantanea
+    return opciones
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+
+    if not os.path.isdir(args.entrada):
+        print(f"Error: no existe la carpeta de entrada {args.entrada}")
+        return 1
+    if args.salida:
+        os.makedirs(args.salida, exist_ok=True)
+
+    pipeline = PipelineReporte(
+        entrada=args.entrada,
+        salida=args.salida,
+        reportes=args.reportes,
+        opciones=opciones_desde_argumentos(args),
+        archivar=not args.sin_archivar,
+    )
 
-# Crea un reporte final que integra existencias, compras y ventas, 
-# mostrando el desglose de productos por almacén, acumulados y ventas 
-# globales, facilitando el análisis comparativo
-creaReporteExistenciasComprasVentasCC(dfExistenciasComprasFinal, dfVentasFinalMerged)
+    if args.validar:
+        return 1 if pipeline.validar() else 0
 
+    if args.invalidar_cache:
+        _consolidacion().invalidar_cache_lecturas(directorio_cache=pipeline.ruta_salida(pipeline.opcion("directorio_cache")))
+        return 0
 
-# Reagrupar archivos y nuevos 
-archivosCompilados = listar_archivos_excel_por_cadena(directorio, "CC")
-archivosBI = listar_archivos_excel_por_cadena(directorio, "BI-")
+    if args.vigilar:
+        pipeline.archivar_al_final = False
+        vigilar(pipeline, intervalo=args.intervalo, espera=args.espera)
+        return 0
 
-archivosTrabajados = archivosTrabajados + archivosCompilados + archivosBI
-print(archivosTrabajados)
-mover_archivos_a_carpeta(archivosTrabajados, "BI-DATA-CC")
+    print("####################################################")
+    print("Iniciando análisis de datos...")
 
-print("Análisis de datos finalizado.")
-print("####################################################")
-print("####################################################")
-print("####################################################")
-print("####################################################")
-print("####################################################")
-print("####################################################")
-print("####################################################")
+    try:
+        pipeline.ejecutar()
+    except ErrorValidacion as e:
+        print(f"Error: {e}; no se generaron reportes.")
+        return 1
+    except MemoryError as e:
+        print(f"Error: memoria insuficiente: {e}. Aumente --limite-memoria o reduzca los datos (p. ej. con --ventas-por-bloques).")
+        return 1
+
+    print("Análisis de datos finalizado.")
+    print("####################################################")
+    print("####################################################")
+    print("####################################################")
+    print("####################################################")
+    print("####################################################")
+    print("####################################################")
+    print("####################################################")
+
+    # Cerrar la ventana de la terminal
+    if args.cerrar_terminal and os.name == "nt":
+        os.system("TASKKILL /F /IM cmd.exe")
+    return 0
 
-# Cerrar la ventana de la terminal
-os.system("TASKKILL /F /IM cmd.exe")
 
+# %%
+# La lectura y escritura en paralelo pueden volver a importar este módulo en cada
+# proceso de trabajo, por lo que el análisis solo se ejecuta desde el proceso principal.
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Los módulos del reporte están en la raíz del repositorio
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ALMACENES = [
+    "Central Cell 20 de noviembre",
+    "Central Cell Almacén general",
+    "Central Cell Abastos",
+    "Central Cell Fortín",
+    "Central Cell Labotienda",
+    "Central Cell Nuño del Mercado",
+    "Central Cell Plaza Bella",
+    "Central Cell Plaza Bonn",
+    "Central Cell Reforma",
+    "Central Cell Revistería",
+    "Central Cell Violetas",
+]
+
+
+def escribir_exportaciones(carpeta):
+    """
+    Escribe un juego pequeño de exportaciones del ERP con el formato que espera el reporte.
+
+    :param carpeta: Carpeta donde se escriben los archivos.
+    :return: Ruta de la carpeta.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    # Un producto por almacén más uno repartido en dos almacenes, con claves en minúsculas y mayúsculas
+    existencias = pd.DataFrame({
+        "Almacen": ALMACENES + ["Central Cell Reforma"],
+        "ProdConcat": [f"p{numero}" for numero in range(len(ALMACENES))] + ["P0"],
+        "Existencia": [numero % 4 for numero in range(len(ALMACENES))] + [5],
+        "Nombre": [f"Producto {numero}" for numero in range(len(ALMACENES))] + ["Producto 0"],
+        "TipoProducto": "Accesorio",
+        "Marca": ["Samsung", "Apple", None] * 4,
+        "Modelo": "M1",
+        "Publico General": [100.0 + numero for numero in range(len(ALMACENES))] + [100.0],
+        "Sin uso": "x",
+    })
+    existencias.to_excel(os.path.join(carpeta, "Existencia general.xlsx"), index=False)
+
+    compras = pd.DataFrame({
+        "Almacen": "Central Cell Abastos",
+        "Fecha": pd.to_datetime(["2026-03-01 10:00", "2026-04-02 09:00", "2026-02-10 12:00"]),
+        "Producto": ["p0", "P0", "p3"],
+        "Costo": [40.0, 45.0, 20.0],
+        "Cantidad": [10, 5, 3],
+        "Sin uso": "y",
+    })
+    with pd.ExcelWriter(os.path.join(carpeta, "Excel_Movimientos_1.xlsx")) as escritor:
+        pd.DataFrame({"Resumen": [1]}).to_excel(escritor, sheet_name="Resumen", index=False)
+        compras.to_excel(escritor, sheet_name="Detalle de movimientos", index=False)
+
+    ventas = pd.DataFrame({
+        "Almacen": ["Central Cell Abastos", "Central Cell Violetas", "Central Cell Abastos", "Central Cell Reforma"],
+        "ProdConcat": ["p0", "P0", "p3", "p1"],
+        "Cantidad": [2, 1, 4, 1],
+        "Ticket": [1, 2, 3, 4],
+    })
+    ventas.to_excel(os.path.join(carpeta, "Analisis de Ventas por Tickets 1.xlsx"), index=False)
+
+    piezas = pd.DataFrame({"Almacén Salida Reparación": ["Central Cell Reforma"], "Producto": ["p3"], "Cantidad": [1], "Nombre": "z"})
+    piezas.to_excel(os.path.join(carpeta, "Excel_Reparaciones_Refacciones_Consumidas 1.xlsx"), index=False)
+    return carpeta
+
+
+@pytest.fixture
+def exportaciones(tmp_path):
+    return escribir_exportaciones(str(tmp_path / "entrada"))
+
+
+@pytest.fixture(autouse=True)
+def directorio_de_trabajo(tmp_path, monkeypatch):
+    # El reporte escribe en el directorio actual (caché de lecturas, reportes); nunca en el repositorio
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+import consolidacion
+
+
+def _existencias_con_pivote(dfExistencias):
+    # Implementación anterior: groupby del total, pivot_table por almacén, groupby de metadatos y dos merge
+    global_ = dfExistencias.groupby("ProdConcat").agg({"Existencia": "sum"}).reset_index()
+    pivote = dfExistencias.pivot_table(index="ProdConcat", columns="Almacen", values="Existencia", aggfunc="sum")
+    pivote = pivote.rename(columns=lambda col: f"Existencias en {col}").reset_index()
+    metadatos = dfExistencias.groupby("ProdConcat").agg({
+        "Nombre": "first", "TipoProducto": "first", "Modelo": "first", "Marca": "first", "Publico General": "mean",
+    }).reset_index()
+    return pd.merge(pd.merge(metadatos, pivote, on="ProdConcat", how="left"), global_, on="ProdConcat", how="inner")
+
+
+def _ventas_con_pivote(dfVentas, dfPiezasConsumidas):
+    dfVentas = pd.concat([dfVentas, dfPiezasConsumidas], ignore_index=True)
+    dfVentas["Cantidad"] = dfVentas["Cantidad"].fillna(0)
+    dfVentas = dfVentas.groupby(["Almacen", "ProdConcat"], as_index=False).agg({"Cantidad": "sum"})
+    pivote = dfVentas.pivot_table(index="ProdConcat", columns="Almacen", values="Cantidad", aggfunc="sum")
+    pivote = pivote.rename(columns=lambda col: f"Ventas de {col}").reset_index()
+    totales = dfVentas.groupby("ProdConcat").agg({"Cantidad": "sum"}).reset_index()
+    return pd.merge(pivote, totales, on="ProdConcat", how="inner").rename(columns={"Cantidad": "Ventas Totales"})
+
+
+def _datos(rng, filas):
+    almacenes = np.array(["Central Cell Reforma", "Central Cell Abastos", "Central Cell Violetas", None], dtype=object)
+    productos = np.array([f"P{numero}" for numero in range(30)], dtype=object)
+    existencias = pd.DataFrame({
+        "Almacen": rng.choice(almacenes, filas),
+        "ProdConcat": rng.choice(productos, filas),
+        "Existencia": rng.integers(0, 6, filas),
+        "Nombre": rng.choice(np.array(["Funda", "Cable", None], dtype=object), filas),
+        "TipoProducto": "Accesorio",
+        "Marca": rng.choice(np.array(["X", "Y", None], dtype=object), filas),
+        "Modelo": "M1",
+        "Publico General": np.where(rng.random(filas) < .2, np.nan, rng.integers(10, 90, filas)),
+    })
+    ventas = pd.DataFrame({
+        "Almacen": rng.choice(almacenes, filas),
+        "ProdConcat": rng.choice(productos, filas),
+        "Cantidad": np.where(rng.random(filas) < .1, np.nan, rng.integers(1, 4, filas)),
+    })
+    piezas = pd.DataFrame({"Almacen": rng.choice(almacenes[:2], 20), "ProdConcat": rng.choice(productos, 20), "Cantidad": 1})
+    return existencias, ventas, piezas
+
+
+def test_pivotes_vectorizados_identicos_a_pivot_table():
+    existencias, ventas, piezas = _datos(np.random.default_rng(11), 400)
+    existencias = consolidacion.reemplazar_ceros_con_nan(existencias, ["Existencia"])
+
+    pd.testing.assert_frame_equal(consolidacion.crearDataframeExistenciaFinal(existencias), _existencias_con_pivote(existencias))
+    pd.testing.assert_frame_equal(consolidacion.creaDataFrameVentasFinal(ventas, piezas), _ventas_con_pivote(ventas, piezas))
@@ -0,0 +1,20 @@
+import benchmark
+
+
+def test_benchmark_mide_cada_etapa_con_su_rendimiento(tmp_path, capsys):
+    datos = str(tmp_path / "datos")
+    # El concentrado de existencias espera las once sucursales
+    filas = benchmark.generar_datos_sinteticos(datos, sucursales=11, skus=40, filas_ventas=30, filas_movimientos=10, filas_piezas=20)
+
+    mediciones = benchmark.ejecutar_benchmark(datos, formato="csv", procesos=1, memoria=False)
+    salida = capsys.readouterr().out
+
+    etapas = {medicion["etapa"]: medicion for medicion in mediciones}
+    assert not [medicion for medicion in mediciones if "error" in medicion]
+    assert list(etapas)[:2] == ["fusion", "carga"]
+    assert "escritura BI-EXISTENCIAS-COMPRAS-VENTAS-CC" in etapas
+    # La fusión conoce sus filas hasta terminar la lectura y aun así informa su rendimiento
+    assert etapas["fusion"]["filas"] == sum(filas.values())
+    assert etapas["fusion"]["filas_por_segundo"]
+    linea_fusion = next(linea for linea in salida.splitlines() if linea.strip().startswith("fusion"))
+    assert linea_fusion.endswith(f"{etapas['fusion']['filas_por_segundo']} filas/s")
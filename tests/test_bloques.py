@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import consolidacion
+import report
+
+
+def _ventas_grandes(carpeta, filas=230):
+    # Varios archivos de ventas con claves repetidas entre bloques, cantidades vacías y filas sin almacén
+    rng = np.random.default_rng(5)
+    for numero in range(2):
+        pd.DataFrame({
+            "Almacen": rng.choice(np.array(["Central Cell Abastos", "Central Cell Reforma", None], dtype=object), filas),
+            "ProdConcat": rng.choice(np.array(["p0", "P0", "p1", "p2", "p3"], dtype=object), filas),
+            "Cantidad": np.where(rng.random(filas) < .1, np.nan, rng.integers(1, 4, filas)),
+            "Ticket": np.arange(filas),
+        }).to_excel(os.path.join(carpeta, f"Analisis de Ventas por Tickets {numero + 2}.xlsx"), index=False)
+
+
+def test_sumas_por_bloques_iguales_a_la_lectura_completa(exportaciones):
+    _ventas_grandes(exportaciones)
+    archivo = os.path.join(exportaciones, "Analisis de Ventas por Tickets 2.xlsx")
+    columnas = ["Almacen", "ProdConcat", "Cantidad"]
+
+    sumas = consolidacion.sumar_columnas_excel_por_bloques(archivo, columnas, "Cantidad", filas_por_bloque=17)
+    completo = pd.read_excel(archivo)[columnas]
+    esperado = completo.fillna({"Cantidad": 0}).groupby(["Almacen", "ProdConcat"], dropna=True)["Cantidad"].sum().reset_index()
+    obtenido = sumas.sort_values(["Almacen", "ProdConcat"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
+
+
+def test_ventas_por_bloques_igual_que_la_carga_completa(exportaciones):
+    _ventas_grandes(exportaciones)
+    completo = report.PipelineReporte(entrada=exportaciones, reportes=["ventas"], archivar=False)
+    por_bloques = report.PipelineReporte(entrada=exportaciones, reportes=["ventas"], opciones={"filas_por_bloque_ventas": 17}, archivar=False)
+
+    esperado = completo.transformar()["BI-VENTAS-CC"]
+    obtenido = por_bloques.transformar()["BI-VENTAS-CC"]
+    pd.testing.assert_frame_equal(obtenido, esperado)
+    # Solo se conservan las sumas: una fila por almacén y producto
+    assert len(por_bloques.datos["Ventas"]) < len(completo.datos["Ventas"])
@@ -0,0 +1,47 @@
+import os
+
+import pandas as pd
+
+import consolidacion
+
+COLUMNAS = ["Almacen", "ProdConcat", "Cantidad"]
+
+
+def test_cache_reutiliza_la_lectura_y_se_invalida_con_el_contenido(exportaciones, tmp_path, capsys):
+    archivo = os.path.join(exportaciones, "Analisis de Ventas por Tickets 1.xlsx")
+    cache = str(tmp_path / "cache")
+
+    primera = consolidacion.leer_archivo_excel_con_cache(archivo, columnas=COLUMNAS, directorio_cache=cache)
+    assert "caché" not in capsys.readouterr().out
+    segunda = consolidacion.leer_archivo_excel_con_cache(archivo, columnas=COLUMNAS, directorio_cache=cache)
+    assert f"Lectura recuperada de la caché: {archivo}" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(segunda, primera)
+
+    # Otra proyección de columnas es otra entrada
+    consolidacion.leer_archivo_excel_con_cache(archivo, columnas=COLUMNAS[:2], directorio_cache=cache)
+    assert "recuperada" not in capsys.readouterr().out
+    assert len(os.listdir(cache)) == 2
+
+    # Un archivo modificado con el mismo nombre se vuelve a leer
+    pd.DataFrame({"Almacen": ["Central Cell Abastos"], "ProdConcat": ["p9"], "Cantidad": [7]}).to_excel(archivo, index=False)
+    df = consolidacion.leer_archivo_excel_con_cache(archivo, columnas=COLUMNAS, directorio_cache=cache)
+    assert "recuperada" not in capsys.readouterr().out
+    assert df["ProdConcat"].tolist() == ["p9"]
+
+    assert len(consolidacion.invalidar_cache_lecturas([archivo], directorio_cache=cache)) == 1
+    assert len(consolidacion.invalidar_cache_lecturas(directorio_cache=cache)) == 2
+    assert os.listdir(cache) == []
+
+
+def test_depuracion_de_la_cache_por_tamano(tmp_path):
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    for numero in range(3):
+        ruta = cache / f"huella{numero}_proyeccion.parquet"
+        ruta.write_bytes(b"x" * 100)
+        # La más antigua es la primera en salir
+        os.utime(ruta, (1000 + numero, 1000 + numero))
+
+    eliminados = consolidacion.depurar_cache_lecturas(str(cache), tamano_maximo=150)
+    assert [os.path.basename(ruta) for ruta in eliminados] == ["huella0_proyeccion.parquet", "huella1_proyeccion.parquet"]
+    assert os.listdir(cache) == ["huella2_proyeccion.parquet"]
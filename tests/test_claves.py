@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+import consolidacion
+
+
+def test_diccionario_de_claves_compartido_en_mayusculas():
+    existencias = pd.DataFrame({"ProdConcat": ["b1", "A2", "a2", None], "Existencia": [1, 2, 3, 4]})
+    ventas = pd.DataFrame({"ProdConcat": ["A2", "c3"], "Cantidad": [1, 1]})
+    compras = pd.DataFrame({"Producto": ["B1", "d4"], "Costo": [1.0, 2.0]})
+
+    tipo = consolidacion.codificar_claves_compartidas([existencias, ventas, None, compras], ["ProdConcat", "ProdConcat", "ProdConcat", "Producto"], mayusculas=True)
+
+    assert list(tipo.categories) == ["A2", "B1", "C3", "D4"]
+    for df, columna in [(existencias, "ProdConcat"), (ventas, "ProdConcat"), (compras, "Producto")]:
+        assert df[columna].dtype == tipo
+    assert existencias["ProdConcat"].tolist()[:3] == ["B1", "A2", "A2"]
+    assert pd.isna(existencias["ProdConcat"].iloc[3])
+
+    # Las uniones trabajan sobre el mismo diccionario y dan lo mismo que sobre cadenas
+    unido = pd.merge(existencias, ventas, on="ProdConcat", how="left")
+    esperado = pd.merge(existencias.astype({"ProdConcat": object}), ventas.astype({"ProdConcat": object}), on="ProdConcat", how="left")
+    pd.testing.assert_frame_equal(unido.astype({"ProdConcat": object}), esperado)
+    np.testing.assert_array_equal(unido["Cantidad"].to_numpy(), [np.nan, 1, 1, np.nan])
+
+
+def test_mayusculas_solo_sobre_valores_unicos_conserva_el_tipo():
+    df = pd.DataFrame({"ProdConcat": pd.Categorical(["a", "b", "a"])})
+    assert consolidacion.convertir_columna_uppercase(df, "ProdConcat")["ProdConcat"].tolist() == ["A", "B", "A"]
+    assert isinstance(df["ProdConcat"].dtype, pd.CategoricalDtype)
@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+
+import consolidacion as c
+
+NOMBRE = "Analisis de Ventas por Tickets Central Cell Abastos.csv"
+COLUMNAS = ["Almacen", "ProdConcat", "Cantidad", "Ticket"]
+
+
+def _exportacion(carpeta, tickets):
+    # Exportación del ERP con el mismo nombre en cada periodo; devuelve las filas leídas y la huella del archivo
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, NOMBRE)
+    df = pd.DataFrame({"Almacen": "Central Cell Abastos", "ProdConcat": [f"P{t}" for t in tickets], "Cantidad": 1, "Ticket": tickets})
+    df.to_csv(ruta, index=False)
+    df[c.COLUMNA_ARCHIVO_ORIGEN] = NOMBRE
+    return df, {NOMBRE: c.calcular_huella_archivo(ruta)}
+
+
+def _deduplicar(df, huellas, ruta, fecha):
+    leidas, conteos = c.deduplicar_familias({"Ventas": df}, {"Ventas": COLUMNAS}, ruta=ruta, fecha=fecha, huellas_archivos=huellas)
+    return leidas["Ventas"], conteos["Ventas"]
+
+
+def test_exportaciones_con_el_mismo_nombre_que_se_traslapan(tmp_path):
+    ruta = str(tmp_path / "huellas_filas.parquet")
+
+    # Primera ejecución: tickets 1 a 4
+    df, huellas = _exportacion(tmp_path / "abril", [1, 2, 3, 4])
+    leidas, _ = _deduplicar(df, huellas, ruta, "2026-04-30")
+    assert leidas["Ticket"].tolist() == [1, 2, 3, 4]
+
+    # Volver a ejecutar el mismo archivo en la misma ejecución no cambia el resultado
+    leidas, _ = _deduplicar(df, huellas, ruta, "2026-04-30")
+    assert leidas["Ticket"].tolist() == [1, 2, 3, 4]
+
+    # Segunda ejecución: el mismo nombre con un rango que se traslapa (tickets 3 a 6)
+    df, huellas = _exportacion(tmp_path / "mayo", [3, 4, 5, 6])
+    leidas, conteo = _deduplicar(df, huellas, ruta, "2026-05-31")
+    assert leidas["Ticket"].tolist() == [5, 6]
+    assert conteo[["Filas", "Duplicadas", "Conservadas"]].values.tolist() == [[4, 2, 2]]
+
+
+def test_la_misma_exportacion_procesada_otro_dia_conserva_sus_filas(tmp_path):
+    # Una ejecución que falló, una fecha de instantánea atrasada o la vigilancia después de medianoche
+    ruta = str(tmp_path / "huellas_filas.parquet")
+    df, huellas = _exportacion(tmp_path / "abril", [1, 2, 3, 4])
+    _deduplicar(df, huellas, ruta, "2026-04-30")
+
+    leidas, conteo = _deduplicar(df, huellas, ruta, "2026-05-02")
+    assert leidas["Ticket"].tolist() == [1, 2, 3, 4]
+    assert conteo["Duplicadas"].tolist() == [0]
+
+
+def test_una_copia_identica_en_la_misma_ejecucion_no_suma_dos_veces(tmp_path):
+    df, huellas = _exportacion(tmp_path / "abril", [1, 2, 3])
+    copia = df.assign(**{c.COLUMNA_ARCHIVO_ORIGEN: "Copia de " + NOMBRE})
+    huellas["Copia de " + NOMBRE] = huellas[NOMBRE]
+
+    leidas, conteo = _deduplicar(pd.concat([df, copia], ignore_index=True), huellas, None, "2026-04-30")
+    assert leidas[c.COLUMNA_ARCHIVO_ORIGEN].tolist() == [NOMBRE] * 3
+    assert conteo[["Filas", "Duplicadas"]].values.tolist() == [[3, 0], [3, 3]]
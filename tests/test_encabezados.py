@@ -0,0 +1,39 @@
+import os
+
+import pandas as pd
+import pytest
+
+import encabezados
+import report
+
+
+def test_hojas_y_encabezados_sin_cargar_el_libro(exportaciones):
+    hojas, columnas = encabezados.leer_hojas_y_encabezados(os.path.join(exportaciones, "Excel_Movimientos_1.xlsx"), "Detalle de movimientos")
+    assert hojas == ["Resumen", "Detalle de movimientos"]
+    assert columnas == list(pd.read_excel(os.path.join(exportaciones, "Excel_Movimientos_1.xlsx"), sheet_name="Detalle de movimientos", nrows=0).columns)
+
+    assert encabezados.leer_hojas_y_encabezados(os.path.join(exportaciones, "Excel_Movimientos_1.xlsx"), "Otra")[1] is None
+
+
+def test_se_informan_todos_los_problemas_antes_de_leer(exportaciones, capsys):
+    assert report.PipelineReporte(entrada=exportaciones, archivar=False).validar() == []
+
+    pd.DataFrame({"Resumen": [1]}).to_excel(os.path.join(exportaciones, "Excel_Movimientos_1.xlsx"), sheet_name="Resumen", index=False)
+    pd.DataFrame({"Almacen": ["Central Cell Abastos"], "ProdConcat": ["p0"]}).to_excel(os.path.join(exportaciones, "Analisis de Ventas por Tickets 1.xlsx"), index=False)
+    with open(os.path.join(exportaciones, "Excel_Reparaciones_Refacciones_Consumidas 1.xlsx"), "w") as archivo:
+        archivo.write("no es un libro")
+
+    pipeline = report.PipelineReporte(entrada=exportaciones, archivar=False)
+    with pytest.raises(report.ErrorValidacion) as error:
+        pipeline.ejecutar()
+    problemas = error.value.problemas
+    assert len(problemas) == 3
+    assert problemas[0].startswith("Compras: ") and "no existe la hoja 'Detalle de movimientos'" in problemas[0]
+    assert problemas[1].endswith("faltan las columnas ['Cantidad'] en la primera hoja")
+    assert problemas[2].startswith("PiezasConsumidas: ") and "no se pudo abrir como libro de Excel" in problemas[2]
+    # No se leyó ningún archivo ni se generó ningún reporte
+    assert pipeline.datos == {}
+
+    capsys.readouterr()
+    assert report.main(["--entrada", exportaciones, "--sin-archivar", "--validar"]) == 1
+    assert report.main(["--entrada", exportaciones, "--sin-archivar", "--reportes", "concentrado", "--validar"]) == 0
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+import consolidacion
+import especificaciones
+
+
+def test_los_nodos_repetidos_se_calculan_una_vez():
+    etapas, alias = especificaciones.planificar()
+    assert alias == {}
+    # Las tablas dinámicas escritas dentro de otros reportes son las etapas con nombre
+    assert etapas["ConcentradoExistencias"][1] == ["ExistenciasFinal"]
+    assert etapas["ExistenciasComprasFinal"][1] == ["ExistenciasFinal", "Compras"]
+    assert etapas["ExistenciasComprasVentas"][1] == ["ExistenciasComprasFinal", "VentasFinal"]
+    # Cada etapa aparece después de sus entradas
+    orden = list(etapas)
+    for nombre, (_, entradas) in etapas.items():
+        assert all(orden.index(entrada) < orden.index(nombre) for entrada in entradas if entrada in etapas)
+
+    # Una especificación idéntica a otra queda como alias
+    _, alias = especificaciones.planificar({**especificaciones.ESPECIFICACIONES, "Copia": dict(especificaciones.ESPECIFICACIONES["VentasFinal"])})
+    assert alias == {"Copia": "VentasFinal"}
+
+    with pytest.raises(ValueError):
+        especificaciones.planificar({"Ciclo": {"tipo": "funcion", "funcion": "f", "entradas": ["Ciclo"]}})
+
+
+def test_almacenes_tomados_de_los_datos():
+    # Una sucursal nueva aparece en el concentrado sin cambiar el código
+    dfExistencias = pd.DataFrame({
+        "Almacen": ["Central Cell Centro", "Central Cell Abastos", "Central Cell Centro"],
+        "ProdConcat": ["P0", "P0", "P1"],
+        "Existencia": [2, 3, 4],
+        "Nombre": ["Funda", "Funda", "Cable"],
+        "TipoProducto": "Accesorio",
+        "Marca": ["X", "X", None],
+        "Modelo": "M1",
+        "Publico General": [10.0, 10.0, 5.0],
+    })
+    dfConcentrado = consolidacion.creaReporteExistenciaConcentrada(consolidacion.crearDataframeExistenciaFinal(dfExistencias))
+
+    assert list(dfConcentrado.columns) == ["Marca", "Modelo", "Nombre", "Existencias en Central Cell Abastos", "Existencias en Central Cell Centro", "Existencia"]
+    assert dfConcentrado.set_index("Nombre")["Existencia"].to_dict() == {"Funda": 5, "Cable": 4}
+    assert dfConcentrado.set_index("Nombre").loc["Cable", "Marca"] == "Desconocido"
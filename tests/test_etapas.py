@@ -0,0 +1,63 @@
+import threading
+
+import pandas as pd
+
+import consolidacion
+import report
+
+
+def test_solo_se_calculan_las_etapas_de_los_reportes_solicitados():
+    assert report.etapas_necesarias(["VentasFinal"]) == ["VentasFinal"]
+    assert report.entradas_necesarias(["VentasFinal"]) == ["Ventas", "PiezasConsumidas"]
+    assert report.etapas_necesarias(["ExistenciasComprasVentas"], disponibles={"ExistenciasFinal": None}) == [
+        "ExistenciasComprasFinal", "VentasFinal", "ExistenciasComprasVentas",
+    ]
+    assert report.entradas_necesarias(["ConcentradoExistencias", "ExistenciasComprasFinal"]) == ["Existencias", "Compras"]
+
+
+def test_ramas_independientes_en_paralelo_y_resultados_memorizados():
+    ejecutadas = []
+    # Las dos ramas se esperan entre sí: solo terminan si corren a la vez
+    barrera = threading.Barrier(2, timeout=5)
+
+    def rama(nombre):
+        def etapa(valor):
+            barrera.wait()
+            ejecutadas.append(nombre)
+            return valor + 1
+        return etapa
+
+    etapas = {
+        "Izquierda": (rama("Izquierda"), ["Entrada"]),
+        "Derecha": (rama("Derecha"), ["Entrada"]),
+        "Union": (lambda izquierda, derecha: izquierda + derecha, ["Izquierda", "Derecha"]),
+        "Sobrante": (lambda valor: 1 / 0, ["Entrada"]),
+    }
+    datos = {"Entrada": 1}
+
+    assert report.ejecutar_etapas(["Union"], datos, etapas, hilos=2) == {"Union": 4}
+    assert sorted(ejecutadas) == ["Derecha", "Izquierda"]
+    # La segunda llamada reutiliza lo ya calculado
+    assert report.ejecutar_etapas(["Izquierda", "Union"], datos, etapas, hilos=2) == {"Izquierda": 2, "Union": 4}
+    assert len(ejecutadas) == 2
+
+
+def test_etapas_en_paralelo_igual_que_en_secuencia(exportaciones):
+    pipeline = report.PipelineReporte(entrada=exportaciones, archivar=False)
+    leidos = pipeline.leer()
+    etapas = {nombre: (report._funcion_etapa(espec, consolidacion, consolidacion), entradas) for nombre, (espec, entradas) in report.ETAPAS.items()}
+
+    secuencial = report.ejecutar_etapas(list(etapas), dict(leidos), etapas, hilos=1)
+    paralelo = report.ejecutar_etapas(list(etapas), dict(leidos), etapas, hilos=4)
+    for nombre, df in secuencial.items():
+        pd.testing.assert_frame_equal(paralelo[nombre], df, obj=nombre)
+
+
+def test_con_perfilado_las_etapas_corren_en_secuencia(monkeypatch):
+    # El perfilado mide todo el proceso: en paralelo cada etapa contaría el trabajo de las demás
+    monkeypatch.setattr(consolidacion, "MODO_PERFILADO", "tracemalloc")
+    hilos = []
+    etapas = {nombre: (lambda valor: hilos.append(threading.current_thread()) or valor, ["Entrada"]) for nombre in ("A", "B", "C")}
+
+    report.ejecutar_etapas(["A", "B", "C"], {"Entrada": 1}, etapas, hilos=3)
+    assert hilos == [threading.main_thread()] * 3
@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+import pytest
+
+import consolidacion
+import encabezados
+import report
+
+pytest.importorskip("pyarrow")
+
+
+def _convertir(carpeta, nombre, extension, hoja=0):
+    # Reemplaza un archivo de origen .xlsx por su equivalente en otro formato
+    ruta = os.path.join(carpeta, nombre)
+    df = pd.read_excel(ruta, sheet_name=hoja)
+    os.remove(ruta)
+    destino = ruta.replace(".xlsx", extension)
+    if extension == ".parquet":
+        df.to_parquet(destino, index=False)
+    else:
+        df.to_csv(destino, sep="\t" if extension == ".tsv" else ",", index=False, encoding="latin-1" if extension == ".tsv" else "utf-8-sig")
+    return destino
+
+
+def _reportes(entrada, salida):
+    os.makedirs(salida)
+    opciones = {"formato_salida": "parquet", "procesos_escritura": 1, "directorio_instantaneas": None, "directorio_cache": None}
+    pipeline = report.PipelineReporte(entrada=entrada, salida=salida, opciones=opciones, archivar=False)
+    pipeline.ejecutar()
+    return {nombre: pd.read_parquet(archivo) for nombre, archivo in zip(pipeline.resultados, pipeline.archivos_generados)}
+
+
+def test_csv_tsv_y_parquet_dan_los_mismos_reportes_que_excel(exportaciones, tmp_path):
+    esperados = _reportes(exportaciones, str(tmp_path / "desde_excel"))
+
+    _convertir(exportaciones, "Existencia general.xlsx", ".csv")
+    _convertir(exportaciones, "Excel_Movimientos_1.xlsx", ".parquet", hoja="Detalle de movimientos")
+    _convertir(exportaciones, "Analisis de Ventas por Tickets 1.xlsx", ".tsv")
+    obtenidos = _reportes(exportaciones, str(tmp_path / "desde_texto"))
+
+    assert list(obtenidos) == list(esperados)
+    for nombre, df in esperados.items():
+        pd.testing.assert_frame_equal(obtenidos[nombre], df, obj=nombre)
+
+
+def test_tipos_explicitos_al_leer_texto(tmp_path, capsys):
+    archivo = str(tmp_path / "Analisis de Ventas por Tickets 1.csv")
+    pd.DataFrame({"Almacen": ["A", "B"], "ProdConcat": ["001", "p2"], "Cantidad": ["2", "x"]}).to_csv(archivo, index=False)
+
+    df = consolidacion.leer_columnas_archivo(archivo, ["Almacen", "ProdConcat", "Cantidad", "Descuento"])
+    # Las claves conservan sus ceros a la izquierda y los valores no numéricos quedan vacíos
+    assert df["ProdConcat"].tolist() == ["001", "p2"]
+    assert df["Cantidad"].dtype == "float64" and df["Cantidad"].isna().tolist() == [False, True]
+    assert f"Una o más columnas no se encuentran en el archivo {archivo}: ['Descuento']" in capsys.readouterr().out
+
+
+def test_encabezados_de_texto_con_codificacion_desconocida(tmp_path, monkeypatch):
+    archivo = str(tmp_path / "ventas.csv")
+    with open(archivo, "wb") as f:
+        f.write("Almacén,Cantidad\n".encode("latin-1"))
+    assert encabezados.leer_encabezados_texto(archivo) == ["Almacén", "Cantidad"]
+
+    # Si ninguna codificación decodifica la línea, los encabezados se leen igual, con los caracteres inválidos reemplazados
+    monkeypatch.setattr(encabezados, "CODIFICACIONES_TEXTO", ["utf-8"])
+    assert encabezados.leer_encabezados_texto(archivo) == ["Almac�n", "Cantidad"]
@@ -0,0 +1,26 @@
+import glob
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from conftest import RAIZ
+
+
+def test_fusion_en_memoria_sin_libros_intermedios(exportaciones):
+    resultado = subprocess.run([sys.executable, os.path.join(RAIZ, "report.py")], cwd=exportaciones, capture_output=True, text=True)
+    assert "Análisis de datos finalizado." in resultado.stdout, resultado.stdout + resultado.stderr
+
+    # Los consolidados ya no pasan por un libro de Excel: solo queda la copia de archivo en Parquet
+    assert not glob.glob(os.path.join(exportaciones, "**", "*CC.xlsx"), recursive=True)
+    (archivo,) = glob.glob(os.path.join(exportaciones, "BI-DATA-CC*", "ExistenciasCC.parquet"))
+    (origen,) = glob.glob(os.path.join(exportaciones, "BI-DATA-CC*", "Existencia general.xlsx"))
+
+    consolidado = pd.read_parquet(archivo)
+    esperado = pd.read_excel(origen)
+    assert list(consolidado.columns) == ["Almacen", "ProdConcat", "Existencia", "Nombre", "TipoProducto", "Marca", "Modelo", "Publico General"]
+    pd.testing.assert_frame_equal(consolidado, esperado[consolidado.columns])
+    assert glob.glob(os.path.join(exportaciones, "BI-DATA-CC*", "BI-EXISTENCIA-CC_*.xlsx"))
+    # El manifiesto de la ejecución queda junto a la carpeta de archivo
+    assert glob.glob(os.path.join(exportaciones, "BI-DATA-CC_*.json"))
@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+import pytest
+
+import report
+
+historico = pytest.importorskip("historico")
+pytest.importorskip("pyarrow.dataset")
+
+
+def _existencias(existencia):
+    return pd.DataFrame({
+        "Almacen": ["Central Cell Abastos", "Central Cell Reforma", "Central Cell Abastos"],
+        "ProdConcat": ["P0", "P0", "P1"],
+        "Existencia": [existencia, 2, None],
+        "Nombre": ["Funda", "Funda", "Cable"],
+    })
+
+
+def test_instantaneas_por_dia_se_reemplazan_y_se_filtran(tmp_path, capsys):
+    directorio = str(tmp_path / "historial")
+    historico.guardar_instantanea(historico.crear_tablas_instantanea(dfExistencias=_existencias(1)), "2026-04-01", directorio)
+    historico.guardar_instantanea(historico.crear_tablas_instantanea(dfExistencias=_existencias(9)), "2026-04-02", directorio)
+    # Una segunda ejecución del mismo día reemplaza la partición
+    historico.guardar_instantanea(historico.crear_tablas_instantanea(dfExistencias=_existencias(5)), "2026-04-02", directorio)
+
+    assert [fecha.isoformat() for fecha in historico.fechas_disponibles("existencias", directorio)] == ["2026-04-01", "2026-04-02"]
+
+    df = historico.consultar("existencias", desde="2026-04-02", almacenes="Central Cell Abastos", productos="p0", columnas=["Existencia"], directorio=directorio)
+    assert list(df.columns) == ["fecha", "Existencia"]
+    assert df["Existencia"].tolist() == [5.0]
+
+    # Las existencias vacías se guardan como cero
+    df = historico.consultar("existencias", hasta="2026-04-01", productos=["P1"], directorio=directorio)
+    assert df["Existencia"].tolist() == [0.0]
+
+    with pytest.raises(ValueError):
+        historico.consultar("ultimas_compras", almacenes="Central Cell Abastos", directorio=directorio)
+
+
+def test_ventas_se_agrupan_por_origen(tmp_path):
+    ventas = pd.DataFrame({"Almacen": ["A", "A", "B"], "ProdConcat": ["P0", "P0", "P0"], "Cantidad": [1, 2, 4]})
+    piezas = pd.DataFrame({"Almacen": ["A"], "ProdConcat": ["P0"], "Cantidad": [3]})
+    tablas = historico.crear_tablas_instantanea(dfVentas=ventas, dfPiezasConsumidas=piezas)
+    directorio = str(tmp_path / "historial")
+    historico.guardar_instantanea(tablas, "2026-04-01", directorio)
+
+    df = historico.consultar("ventas", almacenes="A", directorio=directorio).sort_values("Origen")
+    assert df["Origen"].tolist() == ["PiezasConsumidas", "Ventas"]
+    assert df["Cantidad"].tolist() == [3.0, 3.0]
+
+
+def test_pipeline_guarda_la_instantanea_del_dia_indicado(exportaciones, tmp_path):
+    salida = str(tmp_path / "salida")
+    os.makedirs(salida)
+    opciones = {"formato_salida": "csv", "procesos_escritura": 1, "fecha_instantanea": "2026-04-01"}
+    report.PipelineReporte(entrada=exportaciones, salida=salida, opciones=opciones, archivar=False).ejecutar()
+
+    directorio = os.path.join(salida, historico.DIRECTORIO_INSTANTANEAS)
+    for tabla in historico.TABLAS:
+        assert [fecha.isoformat() for fecha in historico.fechas_disponibles(tabla, directorio)] == ["2026-04-01"]
+    ventas = historico.consultar("ventas", productos="p3", directorio=directorio)
+    assert ventas.groupby("Origen")["Cantidad"].sum().to_dict() == {"PiezasConsumidas": 1.0, "Ventas": 4.0}
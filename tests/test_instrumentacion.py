@@ -0,0 +1,45 @@
+import json
+from datetime import datetime
+
+import pandas as pd
+
+import consolidacion
+
+
+def test_etapa_instrumentada_y_manifiesto(tmp_path, monkeypatch):
+    monkeypatch.setattr(consolidacion, "REGISTRO_ETAPAS", [])
+    monkeypatch.setattr(consolidacion, "MODO_PERFILADO", "cprofile")
+    ventas = pd.DataFrame({"Almacen": ["Central Cell Abastos", "Central Cell Reforma", "Central Cell Abastos"], "ProdConcat": ["A", "A", "B"], "Cantidad": [1, 2, 3]})
+    piezas = pd.DataFrame({"Almacen": ["Central Cell Reforma"], "ProdConcat": ["B"], "Cantidad": [1]})
+
+    consolidacion.creaDataFrameVentasFinal(ventas, piezas)
+
+    (medicion,) = consolidacion.REGISTRO_ETAPAS
+    assert medicion["etapa"] == "creaDataFrameVentasFinal"
+    assert medicion["entrada"] == [[3, 3], [1, 3]]
+    assert medicion["salida"] == [2, 4]
+    assert medicion["segundos"] >= 0 and medicion["cpu_segundos"] >= 0
+    assert any("creaDataFrameVentasFinal" in linea for linea in medicion["perfil"])
+
+    ruta = consolidacion.escribir_manifiesto(str(tmp_path / "BI-DATA-CC_prueba.json"), datetime.now(), ["Analisis de Ventas por Tickets 1.xlsx"])
+    with open(ruta, encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    assert manifiesto["etapas"] == [medicion]
+    assert manifiesto["archivos_entrada"] == ["Analisis de Ventas por Tickets 1.xlsx"]
+    assert manifiesto["configuracion"]["modo_perfilado"] == "cprofile"
+
+
+def test_etapa_con_error_queda_registrada(monkeypatch):
+    monkeypatch.setattr(consolidacion, "REGISTRO_ETAPAS", [])
+
+    @consolidacion.instrumentar
+    def etapa_fallida(df):
+        raise KeyError("Existencia")
+
+    try:
+        etapa_fallida(pd.DataFrame({"a": [1]}))
+    except KeyError:
+        pass
+    (medicion,) = consolidacion.REGISTRO_ETAPAS
+    assert medicion["error"] == "KeyError: 'Existencia'"
+    assert medicion["entrada"] == [[1, 1]]
@@ -0,0 +1,54 @@
+import os
+
+import pandas as pd
+
+import consolidacion
+
+
+def _familias(carpeta, *extra):
+    return {
+        "Existencias": ([os.path.join(carpeta, "Existencia general.xlsx"), *extra], None, ["Almacen", "ProdConcat", "Existencia"]),
+        "Ventas": ([os.path.join(carpeta, "Analisis de Ventas por Tickets 1.xlsx")] * 2, None, ["Almacen", "ProdConcat", "Cantidad"]),
+    }
+
+
+def test_lectura_en_paralelo_igual_a_la_secuencial(exportaciones, tmp_path, monkeypatch, capsys):
+    faltante = os.path.join(exportaciones, "Existencia borrada.xlsx")
+    secuencial = consolidacion.fusionar_familias_excel(_familias(exportaciones, faltante), procesos=1)
+    mensajes_secuencial = capsys.readouterr().out
+    # Cada lectura parte de una caché vacía
+    (tmp_path / "paralelo").mkdir()
+    monkeypatch.chdir(tmp_path / "paralelo")
+    paralelo = consolidacion.fusionar_familias_excel(_familias(exportaciones, faltante), procesos=2)
+    mensajes_paralelo = capsys.readouterr().out
+
+    assert list(paralelo) == ["Existencias", "Ventas"]
+    for familia, df in secuencial.items():
+        pd.testing.assert_frame_equal(paralelo[familia], df)
+    # Cada familia conserva el orden de sus archivos y el error del archivo faltante se sigue informando
+    assert paralelo["Ventas"]["Cantidad"].tolist() == [2, 1, 4, 1] * 2
+    assert f"Archivo no válido o no encontrado: {faltante}" in mensajes_paralelo
+    assert mensajes_paralelo == mensajes_secuencial
+
+
+def test_lectura_proyectada_solo_con_las_columnas_solicitadas(exportaciones):
+    archivo = os.path.join(exportaciones, "Excel_Movimientos_1.xlsx")
+    columnas = ["Producto", "Fecha", "Costo"]
+
+    df = consolidacion.leer_columnas_excel(archivo, columnas, hoja="Detalle de movimientos")
+    esperado = pd.read_excel(archivo, sheet_name="Detalle de movimientos")[columnas]
+    pd.testing.assert_frame_equal(df, esperado)
+
+
+def test_columna_faltante_se_informa_con_el_archivo(exportaciones, capsys):
+    archivo = os.path.join(exportaciones, "Analisis de Ventas por Tickets 1.xlsx")
+
+    df = consolidacion.leer_columnas_excel(archivo, ["Almacen", "Descuento", "Cantidad"])
+    assert list(df.columns) == ["Almacen", "Cantidad"]
+    assert f"Una o más columnas no se encuentran en el archivo {archivo}: ['Descuento']" in capsys.readouterr().out
+
+    # Se conservan los mensajes de siempre para una columna o una hoja que no existen
+    assert consolidacion.crear_dataframe_desde_archivo(archivo, ["Almacen", "Descuento"]) is None
+    assert "Una o más columnas no se encuentran en el archivo" in capsys.readouterr().out
+    assert consolidacion.crear_dataframe_desde_archivo(archivo, ["Almacen"], hoja="Detalle de movimientos") is None
+    assert f"La hoja 'Detalle de movimientos' no existe en el archivo {archivo}." in capsys.readouterr().out
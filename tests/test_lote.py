@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import historico
+import lote
+from conftest import escribir_exportaciones
+
+
+def _manifiesto(carpeta, filas):
+    ruta = os.path.join(carpeta, "trabajos.csv")
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write("entrada,periodo,salida,reportes\n")
+        f.writelines(",".join(fila) + "\n" for fila in filas)
+    return ruta
+
+
+def test_lote_con_entradas_repetidas_y_un_trabajo_con_error(tmp_path):
+    escribir_exportaciones(str(tmp_path / "norte"))
+    shutil.copytree(tmp_path / "norte", tmp_path / "sur")
+    manifiesto = _manifiesto(str(tmp_path), [
+        ("norte", "2026-03", "", ""),
+        ("sur", "2026-04-15", "sur_abril", "ventas"),
+        ("no_existe", "", "", ""),
+    ])
+    salida = str(tmp_path / "lote")
+
+    assert lote.main([manifiesto, "--salida", salida, "--procesos", "2"]) == 1
+
+    with open(os.path.join(salida, lote.ARCHIVO_RESUMEN), encoding="utf-8") as f:
+        resumen = json.load(f)
+    # Las dos carpetas traen los mismos archivos: cada uno se lee una sola vez (el reporte de ventas solo ocupa dos familias)
+    assert resumen["entradas"] == {"archivos": 4 + 2, "distintos": 4, "leidos": 4}
+    norte, sur, faltante = resumen["trabajos"]
+    assert [norte["nombre"], sur["nombre"], faltante["nombre"]] == ["norte_2026-03", "sur_abril", "no_existe"]
+    assert [norte["estado"], sur["estado"], faltante["estado"]] == ["ok", "ok", "error"]
+    assert "no existe la carpeta de entrada" in faltante["error"]
+    assert len(norte["archivos"]) == 4
+    assert [os.path.basename(archivo).split("_")[0] for archivo in sur["archivos"]] == ["BI-VENTAS-CC"]
+
+    # Cada trabajo escribe en su carpeta, con su registro y su historial fechado en su periodo
+    for trabajo in (norte, sur):
+        assert all(os.path.dirname(archivo) == trabajo["salida"] for archivo in trabajo["archivos"])
+        assert os.path.isfile(trabajo["registro"])
+    fechas = historico.fechas_disponibles("ventas", os.path.join(norte["salida"], historico.DIRECTORIO_INSTANTANEAS))
+    assert [fecha.isoformat() for fecha in fechas] == ["2026-03-31"]
+    # Sin archivar, las entradas se quedan donde estaban
+    assert os.path.isfile(tmp_path / "norte" / "Existencia general.xlsx")
+
+
+def test_manifiestos_invalidos(tmp_path):
+    trabajos = [{"entrada": "norte", "periodo": "2026-03"}, {"entrada": "norte", "periodo": "2026-04", "archivar": "sí"}]
+    with pytest.raises(ValueError, match="archivan una carpeta de entrada"):
+        lote.preparar_trabajos(trabajos, salida=str(tmp_path))
+    with pytest.raises(ValueError, match="comparten la carpeta de salida"):
+        lote.preparar_trabajos([{"entrada": "norte", "salida": "x"}, {"entrada": "sur", "salida": "x"}], salida=str(tmp_path))
+    with pytest.raises(ValueError, match="Periodo no válido"):
+        lote.preparar_trabajos([{"entrada": "norte", "periodo": "marzo"}], salida=str(tmp_path))
+    with pytest.raises(ValueError, match="les falta la carpeta de entrada"):
+        lote.cargar_trabajos(_manifiesto(str(tmp_path), [("", "2026-03", "", "")]))
@@ -0,0 +1,51 @@
+import glob
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import consolidacion
+import report
+
+
+def test_el_limite_solo_dura_el_bloque():
+    assert consolidacion.limite_memoria_actual() is None
+    with consolidacion.limite_memoria(512):
+        assert consolidacion.limite_memoria_actual() == 512
+        # Con límite, las etapas se miden una tras otra
+        assert consolidacion.etapas_en_secuencia()
+    assert consolidacion.limite_memoria_actual() is None
+    assert not consolidacion.etapas_en_secuencia()
+
+
+def test_la_etapa_no_se_ejecuta_si_la_memoria_estimada_supera_el_limite():
+    dfExistencias = pd.DataFrame({"Almacen": ["A"], "ProdConcat": ["P0"], "Existencia": [1], "Nombre": ["Funda"],
+                                  "TipoProducto": ["X"], "Modelo": ["M"], "Marca": ["Y"], "Publico General": [10.0]})
+    with consolidacion.limite_memoria(1), pytest.raises(consolidacion.ErrorLimiteMemoria) as error:
+        consolidacion.crearDataframeExistenciaFinal(dfExistencias)
+    assert error.value.estimada and error.value.etapa == "crearDataframeExistenciaFinal"
+
+
+def test_pipeline_con_limite(exportaciones, tmp_path, capsys):
+    opciones = {"formato_salida": "csv", "procesos_escritura": 1, "directorio_instantaneas": None}
+    salida = str(tmp_path / "amplio")
+    os.makedirs(salida)
+    generados = report.PipelineReporte(entrada=exportaciones, salida=salida, opciones=dict(opciones, limite_memoria_mb=1e6), archivar=False).ejecutar()
+    assert len(generados) == len(report.REPORTES)
+    # El límite no pasa a las ejecuciones siguientes del mismo proceso
+    assert consolidacion.limite_memoria_actual() is None
+
+    salida = str(tmp_path / "estrecho")
+    os.makedirs(salida)
+    with pytest.raises(MemoryError):
+        report.PipelineReporte(entrada=exportaciones, salida=salida, opciones=dict(opciones, limite_memoria_mb=1), archivar=False).ejecutar()
+    assert consolidacion.limite_memoria_actual() is None
+    # El manifiesto se escribe igual, con las etapas medidas hasta el error
+    (manifiesto,) = glob.glob(os.path.join(salida, "BI-DATA-CC_*.json"))
+    with open(manifiesto, encoding="utf-8") as f:
+        assert json.load(f)["configuracion"]["limite_memoria_mb"] == 1
+
+    capsys.readouterr()
+    assert report.main(["--entrada", exportaciones, "--sin-archivar", "--limite-memoria", "1"]) == 1
+    assert "memoria insuficiente" in capsys.readouterr().out
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import consolidacion as c
+import report
+
+consolidacion_sql = pytest.importorskip("consolidacion_sql")
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture
+def entradas():
+    # Un producto sin compras, uno sin ventas, un almacén que solo vende, vacíos y dos compras del mismo día
+    existencias = pd.DataFrame({
+        "Almacen": ["Central Cell Abastos", "Central Cell Reforma", "Central Cell Abastos", "Central Cell Reforma", None],
+        "ProdConcat": ["A", "A", "B", "C", "D"],
+        "Existencia": [3, 2, 0, 5, 1],
+        "Nombre": ["Funda", "Funda", None, "Cable", "Mica"],
+        "TipoProducto": ["Accesorio"] * 5,
+        "Marca": ["X", "X", "Y", None, "Z"],
+        "Modelo": ["M1", "M1", "M2", "M3", "M4"],
+        "Publico General": [100.0, 100.0, np.nan, 50.0, 20.0],
+    })
+    compras = pd.DataFrame({
+        "Almacen": ["Central Cell Abastos"] * 4,
+        "Fecha": pd.to_datetime(["2026-03-01 10:00", "2026-04-02 09:00", "2026-04-02 18:00", "2026-02-10 12:00"]),
+        "Producto": ["A", "A", "A", "C"],
+        "Costo": [40.0, 45.0, 47.0, 20.0],
+        "Cantidad": [10, 5, 6, 3],
+    })
+    ventas = pd.DataFrame({
+        "Almacen": ["Central Cell Abastos", "Central Cell Violetas", "Central Cell Abastos", None],
+        "ProdConcat": ["A", "A", "C", "B"],
+        "Cantidad": [2, 1, np.nan, 4],
+    })
+    piezas = pd.DataFrame({"Almacen": ["Central Cell Reforma"], "ProdConcat": ["C"], "Cantidad": [1]})
+    return {"Existencias": existencias, "Compras": compras, "Ventas": ventas, "PiezasConsumidas": piezas}
+
+
+def _ejecutar(motor, entradas):
+    etapas = {nombre: (report._funcion_etapa(espec, motor, c), entradas_etapa) for nombre, (espec, entradas_etapa) in report.ETAPAS.items()}
+    objetivos = [nombre for nombre in etapas if nombre != "VelocidadInventario"]
+    return report.ejecutar_etapas(objetivos, dict(entradas), etapas, hilos=1)
+
+
+def test_pandas_y_duckdb_producen_los_mismos_reportes(entradas):
+    esperados = _ejecutar(c, entradas)
+    obtenidos = _ejecutar(consolidacion_sql, entradas)
+    for etapa, esperado in esperados.items():
+        pd.testing.assert_frame_equal(obtenidos[etapa], esperado, check_exact=True, obj=etapa)
+
+
+def test_duckdb_sigue_los_cambios_de_la_especificacion(entradas):
+    # Otra tasa, otra derivada y otro nombre de columna cambian los dos motores por igual
+    espec = dict(c.ESPECIFICACIONES["ExistenciasComprasFinal"])
+    espec["constantes"] = {**espec["constantes"], "IVA": 0.08}
+    espec["derivadas"] = {**espec["derivadas"], "Margen": "`Publico General` - Costo"}
+    espec["renombrar"] = {**espec["renombrar"], "Cantidad": "Piezas Última Compra"}
+    existenciasFinal = c.aplicar_especificacion(c.ESPECIFICACIONES["ExistenciasFinal"], entradas["Existencias"])
+
+    esperado = c.aplicar_especificacion(espec, existenciasFinal, entradas["Compras"])
+    obtenido = consolidacion_sql.aplicar_especificacion(espec, existenciasFinal, entradas["Compras"])
+    assert {"Margen", "Piezas Última Compra"} <= set(obtenido.columns)
+    pd.testing.assert_frame_equal(obtenido, esperado, check_exact=True)
+
+
+def test_sumas_con_decimales_identicas_en_ambos_motores():
+    # Muchas cantidades no enteras por celda: el resultado depende del orden de la suma
+    rng = np.random.default_rng(7)
+    filas = 5000
+    almacenes = np.array(["Central Cell Abastos", "Central Cell Reforma", "Central Cell Violetas"], dtype=object)
+    existencias = pd.DataFrame({
+        "Almacen": rng.choice(almacenes, filas),
+        "ProdConcat": rng.choice(np.array([f"P{numero}" for numero in range(40)], dtype=object), filas),
+        "Existencia": rng.normal(size=filas) * rng.choice([1e-3, 1.0, 1e6], filas),
+        "Nombre": "Producto",
+        "TipoProducto": "Accesorio",
+        "Marca": rng.choice(np.array(["X", "Y", None], dtype=object), filas),
+        "Modelo": rng.choice(np.array(["M1", "M2"], dtype=object), filas),
+        "Publico General": rng.uniform(1, 1000, filas),
+    })
+    ventas = existencias[["Almacen", "ProdConcat"]].assign(Cantidad=rng.uniform(0, 3, filas))
+    piezas = ventas.iloc[:0]
+
+    for nombre, entradas in (
+        ("ExistenciasFinal", [existencias]),
+        ("VentasFinal", [ventas, piezas]),
+    ):
+        espec = c.ESPECIFICACIONES[nombre]
+        esperado = c.aplicar_especificacion(espec, *entradas)
+        obtenido = consolidacion_sql.aplicar_especificacion(espec, *entradas)
+        pd.testing.assert_frame_equal(obtenido, esperado, check_exact=True, obj=nombre)
+
+    existenciasFinal = c.aplicar_especificacion(c.ESPECIFICACIONES["ExistenciasFinal"], existencias)
+    espec = c.ESPECIFICACIONES["ConcentradoExistencias"]
+    pd.testing.assert_frame_equal(
+        consolidacion_sql.aplicar_especificacion(espec, existenciasFinal),
+        c.aplicar_especificacion(espec, existenciasFinal),
+        check_exact=True,
+    )
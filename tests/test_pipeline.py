@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import report
+from conftest import RAIZ
+
+
+def test_importar_el_reporte_no_ejecuta_nada_ni_carga_pandas():
+    resultado = subprocess.run(
+        [sys.executable, "-c", "import sys, report; print('pandas' in sys.modules)"],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    )
+    assert resultado.stdout.strip() == "False"
+
+
+def test_pipeline_genera_solo_los_reportes_solicitados(exportaciones, tmp_path):
+    salida = str(tmp_path / "salida")
+    os.makedirs(salida)
+    pipeline = report.PipelineReporte(entrada=exportaciones, salida=salida, reportes=["ventas"], opciones={"formato_salida": "csv", "procesos_escritura": 1}, archivar=False)
+
+    (archivo,) = pipeline.ejecutar()
+
+    assert os.path.basename(archivo).startswith("BI-VENTAS-CC_")
+    ventas = pd.read_csv(archivo, encoding="utf-8-sig").set_index("ProdConcat")
+    assert ventas.loc["P0", "Ventas Totales"] == 3
+    assert ventas.loc["P3", "Ventas Totales"] == 5
+    # Sin archivar, los archivos de origen se quedan donde estaban
+    assert os.path.isfile(os.path.join(exportaciones, "Existencia general.xlsx"))
+
+
+def test_archivo_que_no_se_puede_leer_es_un_error_de_validacion(exportaciones, capsys):
+    # Al archivo de ventas le falta una columna: la lectura falla sin terminar el proceso
+    pd.DataFrame({"Almacen": ["Central Cell Abastos"], "ProdConcat": ["p0"]}).to_excel(os.path.join(exportaciones, "Analisis de Ventas por Tickets 1.xlsx"), index=False)
+    pipeline = report.PipelineReporte(entrada=exportaciones, archivar=False)
+
+    with pytest.raises(report.ErrorValidacion) as error:
+        pipeline.leer()
+    assert error.value.problemas == ["No se pudieron leer los archivos de Ventas"]
+    assert "Analisis de Ventas por Tickets 1.xlsx: ['Cantidad']" in capsys.readouterr().out
+
+    assert report.main(["--entrada", exportaciones, "--sin-archivar"]) == 1
+    assert "no se generaron reportes" in capsys.readouterr().out
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import consolidacion
+
+
+@pytest.fixture
+def reportes():
+    existencias = pd.DataFrame({
+        "ProdConcat": ["A", "B", "C"],
+        "Nombre": ["Funda", None, "Cable"],
+        "Existencias en Central Cell Abastos": [3.0, np.nan, 1.0],
+        "Última Fecha Compra": pd.to_datetime(["2026-04-02", None, "2026-02-10"]),
+    })
+    ventas = pd.DataFrame({"ProdConcat": ["A", "C"], "Ventas Totales": [2.0, 5.0]})
+    return {"BI-EXISTENCIA-CC": existencias, "BI-VENTAS-CC": ventas}
+
+
+def _leer(archivo, **parametros):
+    if archivo.endswith(".parquet"):
+        return pd.read_parquet(archivo)
+    if archivo.endswith(".csv"):
+        return pd.read_csv(archivo, encoding="utf-8-sig", parse_dates=["Última Fecha Compra"] if "BI-EXISTENCIA" in archivo else None)
+    return pd.read_excel(archivo, **parametros)
+
+
+@pytest.mark.parametrize("formato", ["xlsx", "xlsx-streaming", "parquet", "csv"])
+def test_cada_formato_conserva_los_reportes(reportes, formato):
+    generados = consolidacion.generar_reportes(reportes, formato=formato, procesos=2)
+
+    assert list(generados) == list(reportes)
+    archivos = list(generados.values())
+    assert [archivo.split("_")[0] for archivo in archivos] == list(reportes)
+    # Todos los reportes de una ejecución llevan la misma fecha y hora
+    assert len({archivo.split("_", 1)[1].rsplit(".", 1)[0] for archivo in archivos}) == 1
+    for archivo, df in zip(archivos, reportes.values()):
+        leido = _leer(archivo)
+        pd.testing.assert_frame_equal(leido, df, check_dtype=False)
+
+
+def test_libro_unico_con_una_hoja_por_reporte(reportes):
+    generados = consolidacion.generar_reportes(reportes, formato="xlsx-streaming", libro_unico="BI-CC")
+
+    assert list(generados) == list(reportes)
+    (archivo,) = set(generados.values())
+    assert archivo.startswith("BI-CC_") and archivo.endswith(".xlsx")
+    hojas = pd.read_excel(archivo, sheet_name=None)
+    assert list(hojas) == list(reportes)
+    for nombre, df in reportes.items():
+        pd.testing.assert_frame_equal(hojas[nombre], df, check_dtype=False)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import consolidacion
+
+
+def _movimientos(rng, filas, archivo):
+    # Días distintos para cada movimiento: la última compra de cada producto no tiene empates
+    return pd.DataFrame({
+        "Almacen": "Central Cell Abastos",
+        "Fecha": pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.permutation(400)[:filas], unit="D") + pd.Timedelta(hours=9),
+        "Producto": rng.choice(np.array(["a1", "A2", "a3", "b4", "B5"], dtype=object), filas),
+        "Costo": rng.integers(10, 100, filas).astype(float),
+        "Cantidad": rng.integers(1, 20, filas),
+        consolidacion.COLUMNA_ARCHIVO_ORIGEN: archivo,
+    })
+
+
+def test_historial_incremental_igual_al_ordenamiento_completo(tmp_path):
+    rng = np.random.default_rng(3)
+    ruta = str(tmp_path / "ultimas_compras.parquet")
+    lotes = [_movimientos(rng, 30, f"Excel_Movimientos_{numero}.xlsx") for numero in range(3)]
+    # Los días no se repiten entre lotes
+    for numero, lote in enumerate(lotes):
+        lote["Fecha"] += pd.Timedelta(days=1000 * numero) * (-1) ** numero
+
+    integrados = {}
+    for numero, lote in enumerate(lotes):
+        dfUltimasCompras, integrados = consolidacion.cargar_ultimas_compras(ruta)
+        dfUltimasCompras = consolidacion.actualizar_ultimas_compras(dfUltimasCompras, lote)
+        integrados[f"huella{numero}"] = f"Excel_Movimientos_{numero}.xlsx"
+        consolidacion.guardar_ultimas_compras(dfUltimasCompras, integrados, ruta)
+
+    dfUltimasCompras, integrados = consolidacion.cargar_ultimas_compras(ruta)
+    assert list(integrados) == ["huella0", "huella1", "huella2"]
+
+    todas = consolidacion.convertir_columna_uppercase(pd.concat(lotes, ignore_index=True), "Producto")
+    esperado = consolidacion.creaDataFrameUltimasCompras(todas).reset_index(drop=True)
+    pd.testing.assert_frame_equal(dfUltimasCompras, esperado)
+    assert sorted(dfUltimasCompras["Producto"]) == ["A1", "A2", "A3", "B4", "B5"]
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import consolidacion
+
+
+def _reporte(existencia, ventas):
+    return pd.DataFrame({
+        "ProdConcat": ["P0", "P1"],
+        "Existencias en Abastos": [existencia, 0],
+        "Ventas de Abastos": [ventas, 0],
+        "Existencias en Reforma": [0, 4],
+        "Ventas de Reforma": [0, np.nan],
+    })
+
+
+def test_dias_de_la_ventana_segun_las_fechas_de_las_ejecuciones():
+    assert consolidacion.dias_ventana([None, None, None]) == 0
+    assert consolidacion.dias_ventana(["2026-04-01", None], dias_periodo=30) == 30
+    # Cuatro ejecuciones semanales: 21 días entre la primera y la última, más una semana
+    assert consolidacion.dias_ventana(["2026-04-15", "2026-04-22", "2026-04-01", "2026-04-08"]) == pytest.approx(28)
+
+
+def test_velocidad_con_ejecuciones_semanales(tmp_path):
+    ruta = str(tmp_path / "velocidad.parquet")
+    for fecha, ventas in (("2026-04-01", 7), ("2026-04-08", 7), ("2026-04-15", 14)):
+        df = consolidacion.creaReporteVelocidadInventario(_reporte(10, ventas), ruta=ruta, fecha=fecha, ventana=4)
+
+    fila = df.set_index("ProdConcat").loc["P0"]
+    # 28 unidades en 21 días
+    assert fila["Velocidad en Abastos"] == pytest.approx(28 / 21)
+    assert fila["Días de Cobertura en Abastos"] == pytest.approx(10 / (28 / 21))
+    assert bool(fila["Reordenar en Abastos"])
+    assert fila["Existencia Promedio Global"] == pytest.approx(10)
+
+    # Volver a ejecutar el mismo día reemplaza esa posición de la ventana
+    df = consolidacion.creaReporteVelocidadInventario(_reporte(10, 0), ruta=ruta, fecha="2026-04-15", ventana=4)
+    assert df.set_index("ProdConcat").loc["P0", "Velocidad en Abastos"] == pytest.approx(14 / 21)
+    # Sin ventas no hay cobertura ni reorden
+    assert np.isnan(df.set_index("ProdConcat").loc["P1", "Días de Cobertura Global"])
+    assert not df.set_index("ProdConcat").loc["P1", "Reordenar Global"]
@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+
+import report
+
+
+def _reportes(salida):
+    return sorted(archivo for archivo in os.listdir(salida) if archivo.startswith("BI-"))
+
+
+def test_vigilar_reconstruye_solo_los_reportes_afectados(exportaciones, tmp_path, monkeypatch):
+    salida = str(tmp_path / "salida")
+    os.makedirs(salida)
+    opciones = {"formato_salida": "csv", "procesos_escritura": 1, "directorio_instantaneas": None}
+    pipeline = report.PipelineReporte(entrada=exportaciones, salida=salida, opciones=opciones, archivar=False)
+    reconstruir = pipeline.reconstruir
+    llamadas = []
+
+    def reconstruir_con_falla(familias):
+        llamadas.append(sorted(familias))
+        if len(llamadas) == 2:
+            raise PermissionError("archivo bloqueado")
+        return reconstruir(familias)
+
+    def cambiar_ventas(segundos):
+        # Entre la primera y la segunda revisión cambian las ventas
+        if len(llamadas) == 1:
+            ventas = os.path.join(exportaciones, "Analisis de Ventas por Tickets 1.xlsx")
+            df = pd.read_excel(ventas)
+            df.assign(Cantidad=df["Cantidad"] * 10).to_excel(ventas, index=False)
+
+    monkeypatch.setattr(pipeline, "reconstruir", reconstruir_con_falla)
+    monkeypatch.setattr(report.time, "sleep", cambiar_ventas)
+    report.vigilar(pipeline, intervalo=0, espera=0, revisiones=3)
+
+    # La reconstrucción que falló se reintenta en la siguiente revisión
+    assert llamadas == [sorted(report.FAMILIAS), ["Ventas"], ["Ventas"]]
+    # Un archivo por reporte: el anterior de cada reporte reconstruido se elimina aunque tenga el mismo nombre
+    archivos = _reportes(salida)
+    assert [archivo.split("_")[0] for archivo in archivos] == sorted(report.REPORTES[reporte][0] for reporte in report.REPORTES)
+    (ventas,) = [archivo for archivo in archivos if archivo.startswith("BI-VENTAS-CC_")]
+    ventas = pd.read_csv(os.path.join(salida, ventas), encoding="utf-8-sig").set_index("ProdConcat")
+    assert ventas.loc["P0", "Ventas Totales"] == 30
+
+
+def test_escribir_devuelve_el_archivo_de_cada_reporte(exportaciones, tmp_path):
+    opciones = {"formato_salida": "csv", "procesos_escritura": 1, "libro_unico": "BI-CC"}
+    pipeline = report.PipelineReporte(entrada=exportaciones, salida=str(tmp_path), reportes=["ventas", "concentrado"], opciones=opciones, archivar=False)
+    pipeline.leer()
+
+    archivos = pipeline.escribir(["ventas"])
+    # Con libro único se escriben todos los reportes en el mismo archivo
+    assert list(archivos) == ["ventas", "concentrado"]
+    assert len(set(archivos.values())) == 1 and pipeline.archivos_generados == list(set(archivos.values()))